@@ -8,7 +8,10 @@ from app.blueprints.scopes import bp as scopes_bp
 from app.blueprints.desvinculaciones import bp as desv_bp
 from app.blueprints.docs import bp as docs_bp
 
-from .extensions import db, login_manager, csrf
+import os
+
+from .extensions import db, login_manager, csrf, migrate
+from .cli import register_cli
 
 def create_app():
     app = Flask(__name__)
@@ -19,6 +22,9 @@ def create_app():
     db.init_app(app)
     login_manager.init_app(app)
     csrf.init_app(app)
+    # migraciones de esquema en <repo>/migrations (`flask db upgrade`)
+    migrate.init_app(app, db, directory=os.path.join(os.path.dirname(app.root_path), "migrations"))
+    register_cli(app)
 
     # === Helpers para templates ===
     @app.context_processor
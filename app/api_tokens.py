@@ -0,0 +1,179 @@
+# app/api_tokens.py
+"""
+Tokens de API firmados (sin estado) para clientes máquina de /api/*.
+
+    Authorization: Bearer <token>
+
+- El token lleva firmado (itsdangerous, HMAC con API_TOKEN_SECRET o
+  SECRET_KEY) el id/email/rol del usuario, el tope de recintos pedido al
+  emitirlo (si hay) y la huella (AccessScope.fingerprint) de su alcance.
+  El alcance en sí NO viaja: el token mide lo mismo con 3 recintos que con 300.
+- Al verificarlo el alcance se arma con get_snapshot (caché de permisos del
+  worker, sin consulta mientras siga vigente) y se compara con la huella: si
+  los permisos cambiaron después de emitirlo, el token deja de servir.
+- Límite de requests por token (token bucket en memoria del worker).
+- Revocación: expiración corta (API_TOKEN_TTL), API_TOKEN_NOT_BEFORE (epoch;
+  invalida todo lo emitido antes), cambio de permisos del usuario o rotar
+  API_TOKEN_SECRET.
+"""
+from __future__ import annotations
+
+import secrets
+import threading
+import time
+
+from flask import abort, current_app, jsonify, make_response
+from itsdangerous import BadSignature, URLSafeSerializer
+
+from app.permissions import AccessScope, get_snapshot, _is_unrestricted
+from app.principal import Principal, fetch_principal
+
+_SALT = "api-token-v1"
+
+
+class TokenPrincipal(Principal):
+    """Principal reconstruido desde el token (sin cargar el usuario). Solo válido en /api/*."""
+
+    def __init__(self, payload: dict, scope: AccessScope):
+        super().__init__(
+            id=payload["uid"], email=payload.get("em"), name=payload.get("em"),
+            is_active=True, must_change_password=False,
+            role_code=payload.get("rc"), role_level=None, is_superadmin=False,
+        )
+        self.token_id = payload["jti"]
+        self.token_expires = int(payload["exp"])
+        self.rate_per_min = max(1, int(payload.get("rl") or 120))
+        self.access_scope = scope
+
+    def load_model(self):
+        # no se usa en /api/*; se deja explícito para no cargar el ORM por accidente
+        raise RuntimeError("TokenPrincipal no carga el modelo User")
+
+    def __repr__(self):
+        return f"<TokenPrincipal {self.email} jti={self.token_id}>"
+
+
+def _serializer() -> URLSafeSerializer:
+    cfg = current_app.config
+    return URLSafeSerializer(cfg.get("API_TOKEN_SECRET") or cfg["SECRET_KEY"], salt=_SALT)
+
+
+# ------------------------------ alcance ------------------------------
+def _scope_for(uid: int, unrestricted: bool, recintos=None) -> AccessScope:
+    """Alcance actual del usuario (mismo criterio que permissions._build_scope), opcionalmente acotado."""
+    snap = get_snapshot(uid)
+    if unrestricted and recintos is None:
+        return AccessScope(snap.user_id, None, None, None, snap.area_codes, source="token")
+    rids = set(snap.recinto_ids)
+    if recintos is not None:
+        rids &= {int(r) for r in recintos}
+    per = {rid: ctas for rid, ctas in snap.cuentas_por_recinto.items() if rid in rids and ctas}
+    flat = frozenset(c for ctas in per.values() for c in ctas)
+    return AccessScope(snap.user_id, frozenset(rids), per, flat, snap.area_codes, source="token")
+
+
+def token_scope(payload: dict) -> AccessScope:
+    """AccessScope que corresponde hoy al payload de un token (sin verificar la huella)."""
+    return _scope_for(int(payload["uid"]), bool(payload.get("u")), payload.get("r"))
+
+
+# ------------------------------ emisión ------------------------------
+def issue_token(user_id: int, ttl: int | None = None, recintos: set[int] | None = None,
+                rate_per_min: int | None = None) -> tuple[str, dict]:
+    """
+    Emite un token para user_id. recintos acota el alcance (nunca lo amplía).
+    Retorna (token, payload).
+    """
+    principal = fetch_principal(user_id)
+    if principal is None or not principal.is_active:
+        raise ValueError("Usuario inexistente o inactivo")
+
+    cfg = current_app.config
+    ttl = min(int(ttl or cfg.get("API_TOKEN_TTL", 3600)), int(cfg.get("API_TOKEN_MAX_TTL", 30 * 86400)))
+    now = int(time.time())
+    unrestricted = _is_unrestricted(principal)
+    scope = _scope_for(principal.id, unrestricted, recintos)
+    payload = {
+        "v": 2,
+        "jti": secrets.token_urlsafe(8),
+        "uid": principal.id,
+        "em": principal.email,
+        "rc": principal.role_code,
+        "iat": now,
+        "exp": now + ttl,
+        "rl": int(rate_per_min or cfg.get("API_TOKEN_RATE_PER_MIN", 120)),
+        "u": int(unrestricted),
+        "fp": scope.fingerprint,
+    }
+    if recintos is not None:
+        payload["r"] = sorted(int(r) for r in recintos)
+    return _serializer().dumps(payload), payload
+
+
+# ---------------------------- verificación ----------------------------
+def _reject(status: int, error: str, **headers):
+    resp = make_response(jsonify(error=error), status)
+    if status == 401:
+        resp.headers["WWW-Authenticate"] = f'Bearer error="invalid_token", error_description="{error}"'
+    for k, v in headers.items():
+        resp.headers[k.replace("_", "-")] = v
+    abort(resp)
+
+
+def verify_token(token: str) -> TokenPrincipal:
+    """Firma + expiración + corte de revocación + huella del alcance. Aborta con 401 JSON si no es válido."""
+    try:
+        payload = _serializer().loads(token)
+    except BadSignature:
+        _reject(401, "token inválido")
+
+    now = time.time()
+    if not isinstance(payload, dict) or payload.get("v") != 2:
+        _reject(401, "token inválido")
+    if payload.get("exp", 0) <= now:
+        _reject(401, "token expirado")
+    if payload.get("iat", 0) < int(current_app.config.get("API_TOKEN_NOT_BEFORE", 0)):
+        _reject(401, "token revocado")
+    scope = token_scope(payload)
+    if scope.fingerprint != payload.get("fp"):
+        _reject(401, "token revocado: cambiaron los permisos del usuario")
+    return TokenPrincipal(payload, scope)
+
+
+# --------------------------- límite por token ---------------------------
+_buckets: dict[str, tuple[float, float, float]] = {}  # jti -> (fichas, último ts, exp)
+_buckets_lock = threading.Lock()
+
+
+def _consume(jti: str, rate_per_min: int, exp: float) -> float:
+    """Token bucket (ráfaga = rate/min). Retorna 0 si pasa, o segundos a esperar."""
+    rate = rate_per_min / 60.0
+    now = time.monotonic()
+    with _buckets_lock:
+        tokens, last, _ = _buckets.get(jti, (float(rate_per_min), now, exp))
+        tokens = min(float(rate_per_min), tokens + (now - last) * rate)
+        if tokens < 1.0:
+            _buckets[jti] = (tokens, now, exp)
+            return (1.0 - tokens) / rate
+        _buckets[jti] = (tokens - 1.0, now, exp)
+
+        # limpieza ocasional de tokens expirados
+        if len(_buckets) > 4096:
+            wall = time.time()
+            for k in [k for k, v in _buckets.items() if v[2] <= wall]:
+                del _buckets[k]
+    return 0.0
+
+
+def load_user_from_bearer(request):
+    """request_loader de Flask-Login: solo en /api/* y solo con Authorization: Bearer."""
+    auth = request.headers.get("Authorization", "")
+    if not auth[:7].lower() == "bearer " or not request.path.startswith("/api/"):
+        return None
+
+    principal = verify_token(auth[7:].strip())
+    # el límite es por worker; con 3 workers de gunicorn el tope efectivo es hasta 3x
+    wait = _consume(principal.token_id, principal.rate_per_min, principal.token_expires)
+    if wait > 0:
+        _reject(429, "límite de requests del token excedido", Retry_After=str(int(wait) + 1))
+    return principal
@@ -6,11 +6,14 @@ from flask import render_template, request, redirect, url_for, flash, abort
 from flask_login import login_required, current_user
 from sqlalchemy import text
 
+from app import cache as result_cache, singleflight
 from app.extensions import db
 from app.models import (
     User, Role, Recinto, Cuenta,
-    UserRecinto, RecintoCuenta, SuperAdmin, UserCuenta
+    UserRecinto, RecintoCuenta, UserCuenta
 )
+from app.permissions import grants_changed, rebuild_effective_scope
+from app.provisioning import ProvisioningError, parse_payload, provision_users, summarize
 from . import bp  # blueprint definido en __init__.py
 
 
@@ -18,10 +21,8 @@ from . import bp  # blueprint definido en __init__.py
 def superadmin_required(view):
     @wraps(view)
     def wrapped(*args, **kwargs):
-        is_sa = False
-        if current_user and getattr(current_user, "id", None):
-            is_sa = db.session.query(SuperAdmin).filter_by(user_id=current_user.id).first() is not None
-        if not is_sa:
+        # flag cargado junto al principal (load_user), sin consulta extra por request
+        if not getattr(current_user, "is_superadmin", False):
             abort(403)
         return view(*args, **kwargs)
     return wrapped
@@ -165,6 +166,39 @@ def users_create():
     return render_template("admin/user_create.html", roles=roles)
 
 
+# ============================== CARGA MASIVA ==============================
+@bp.route("/users/bulk", methods=["GET", "POST"])
+@login_required
+@superadmin_required
+def users_bulk():
+    roles = _roles_from_db()
+    if request.method == "GET":
+        return render_template("admin/users_bulk.html", roles=roles, results=None, summary=None)
+
+    f = request.files.get("file")
+    raw = f.read() if f and f.filename else (request.form.get("payload") or "")
+    default_role = (request.form.get("default_role") or "").strip() or None
+    dry_run = request.form.get("dry_run") == "on"
+
+    try:
+        rows = parse_payload(raw, f.filename if f else None)
+        results = provision_users(rows, default_role=default_role,
+                                  granted_by=getattr(current_user, "id", None), dry_run=dry_run)
+    except ProvisioningError as e:
+        flash(str(e), "warning")
+        return redirect(url_for("admin.users_bulk"))
+
+    summary = summarize(results)
+    if dry_run:
+        flash("Simulación: no se guardó nada.", "info")
+    else:
+        flash(f"Carga procesada: {summary.get('created', 0)} creados, "
+              f"{summary.get('updated', 0)} actualizados, {summary.get('error', 0)} con error.",
+              "success" if not summary.get("error") else "warning")
+    return render_template("admin/users_bulk.html", roles=roles, results=results,
+                           summary=summary, dry_run=dry_run)
+
+
 # ============================== GESTIONAR (ÚNICA) ==============================
 @bp.get("/users/<int:uid>/manage")
 @login_required
@@ -261,7 +295,9 @@ def users_cuentas_save(uid):
             WHERE user_id=:uid AND cuenta_id IN :ids
         """), {"uid": uid, "ids": tuple(to_disable)})
 
+    rebuild_effective_scope(uid)
     db.session.commit()
+    grants_changed(uid)
     flash("Cuentas globales actualizadas.", "success")
     return _redirect_manage(uid)
 
@@ -287,7 +323,9 @@ def users_recintos_add(uid):
             updated_at = NOW()
     """), {"uid": uid, "rid": recinto_id, "nivel": nivel,
            "admin_id": getattr(current_user, "id", None)})
+    rebuild_effective_scope(uid)
     db.session.commit()
+    grants_changed(uid)
     flash("Recinto asignado al usuario.", "success")
     return _redirect_manage(uid)
 
@@ -300,7 +338,9 @@ def users_recintos_remove(uid, rid):
            SET is_active = 0, hasta = CURRENT_DATE, updated_at = NOW()
          WHERE user_id = :uid AND recinto_id = :rid AND is_active = 1
     """), {"uid": uid, "rid": rid})
+    rebuild_effective_scope(uid)
     db.session.commit()
+    grants_changed(uid)
     flash("Recinto quitado del usuario.", "info")
     return _redirect_manage(uid)
 
@@ -346,7 +386,9 @@ def users_perm_recinto_cuentas_save(uid, rid):
             WHERE user_id=:uid AND cuenta_id IN :ids
         """), {"uid": uid, "ids": tuple(to_disable)})
 
+    rebuild_effective_scope(uid)
     db.session.commit()
+    grants_changed(uid)
     flash("Permisos de cuentas actualizados.", "success")
     return _redirect_manage(uid)
 
@@ -373,7 +415,9 @@ def users_perm_recinto_cuentas_all(uid, rid):
         WHERE user_id=:uid AND cuenta_id IN :ids
     """), {"uid": uid, "ids": tuple(universo_ids)})
 
+    rebuild_effective_scope(uid)
     db.session.commit()
+    grants_changed(uid)
     flash("Se asignaron todas las cuentas del recinto.", "success")
     return _redirect_manage(uid)
 
@@ -395,7 +439,9 @@ def users_perm_recinto_cuentas_none(uid, rid):
         WHERE user_id=:uid AND cuenta_id IN :ids
     """), {"uid": uid, "ids": tuple(universo_ids)})
 
+    rebuild_effective_scope(uid)
     db.session.commit()
+    grants_changed(uid)
     flash("Se quitaron todas las cuentas del recinto.", "info")
     return _redirect_manage(uid)
 
@@ -408,3 +454,19 @@ def users_perm_recinto_cuentas_json(uid, rid):
     universo = list(_cuentas_universo_por_recinto(rid))
     marcadas = list(_cuentas_marcadas_por_recinto(uid).get(rid, set()))
     return {"ok": True, "universo": universo, "checked": marcadas}
+
+
+@bp.get("/singleflight")
+@login_required
+@superadmin_required
+def singleflight_stats():
+    # contadores del worker que atiende el request (cada worker de gunicorn lleva los suyos)
+    return {"ok": True, **singleflight.stats()}
+
+
+@bp.get("/cache")
+@login_required
+@superadmin_required
+def cache_stats():
+    # hits/misses del worker que atiende; tamaño del backend (compartido con sqlite/redis)
+    return {"ok": True, **result_cache.stats()}
@@ -1,22 +1,13 @@
-from flask import Blueprint, render_template, request, redirect, url_for, flash
-from flask_login import login_user, logout_user, current_user
-from werkzeug.security import check_password_hash
-from functools import wraps
-
-from app.extensions import db, login_manager, csrf
-from app.models import User
-from .forms import LoginForm
-
-
-from . import bp
-
-from flask import Blueprint, render_template, request, redirect, url_for, flash
+from flask import render_template, request, redirect, url_for, flash, jsonify
 from flask_login import login_user, logout_user, current_user, login_required
-from werkzeug.security import check_password_hash, generate_password_hash
+from werkzeug.security import generate_password_hash
 from functools import wraps
 
 from app.extensions import db, login_manager, csrf
 from app.models import User
+from app.principal import load_principal, forget_principal
+from app.security import check_password_bounded, PasswordPoolBusy
+from app.api_tokens import issue_token, load_user_from_bearer
 from .forms import LoginForm
 
 
@@ -26,12 +17,19 @@ from . import bp
 # ------------ Flask-Login ------------
 @login_manager.user_loader
 def load_user(user_id: str):
+    # Principal liviano (id, rol, must_change_password, superadmin), cacheado en la sesión
     try:
-        return db.session.get(User, int(user_id))
+        return load_principal(user_id)
     except Exception:
         return None
 
 
+@login_manager.request_loader
+def load_user_from_request(req):
+    # Authorization: Bearer <token> en /api/*: se verifica en memoria, sin BD
+    return load_user_from_bearer(req)
+
+
 # ------------ Decoradores de acceso ------------
 def nivel_requerido(nivel_minimo: int):
     def deco(view):
@@ -76,11 +74,21 @@ def login():
 
     form = LoginForm()
     if form.validate_on_submit():
-        user = User.query.filter_by(email=form.email.data.strip().lower()).first()
-        if not user or not check_password_hash(user.password_hash, form.password.data):
+        email = form.email.data.strip().lower()
+        user = User.query.filter_by(email=email).first()
+        try:
+            # PBKDF2 en el pool de procesos acotado (no bloquea los threads de reportes)
+            ok = bool(user) and check_password_bounded(
+                user.password_hash, form.password.data, ip=request.remote_addr, account=email
+            )
+        except PasswordPoolBusy:
+            flash("Hay muchos inicios de sesión en curso. Intenta nuevamente en unos segundos.", "warning")
+            return render_template("auth/login.html", form=form), 429
+        if not ok:
             flash("Usuario o contraseña inválidos", "danger")
             return render_template("auth/login.html", form=form)
 
+        forget_principal()
         login_user(user, remember=form.remember.data)
 
         # Si el usuario debe cambiar su contraseña al ingresar
@@ -92,11 +100,47 @@ def login():
     return render_template("auth/login.html", form=form)
 
 
+# ------------ Token de API (clientes máquina de /api/*) ------------
+@bp.route("/token", methods=["POST"])
+@csrf.exempt
+def api_token():
+    """
+    JSON {email, password, ttl?} -> {token, expires_at, token_type}.
+    Una verificación PBKDF2 por token; luego /api/* se usa con Authorization: Bearer.
+    """
+    data = request.get_json(silent=True) or request.form
+    email = (data.get("email") or "").strip().lower()
+    password = data.get("password") or ""
+    if not email or not password:
+        return jsonify(error="email y password son obligatorios"), 400
+
+    user = User.query.filter_by(email=email).first()
+    try:
+        ok = bool(user) and user.is_active and check_password_bounded(
+            user.password_hash, password, ip=request.remote_addr, account=email
+        )
+    except PasswordPoolBusy:
+        return jsonify(error="Demasiados intentos en curso, reintenta en unos segundos"), 429
+    if not ok:
+        return jsonify(error="Usuario o contraseña inválidos"), 401
+    if user.must_change_password:
+        return jsonify(error="Debe cambiar su contraseña en el sitio antes de emitir tokens"), 403
+
+    try:
+        ttl = int(data.get("ttl") or 0) or None
+    except (TypeError, ValueError):
+        return jsonify(error="ttl inválido"), 400
+    token, payload = issue_token(user.id, ttl=ttl)
+    return jsonify(token=token, token_type="Bearer", expires_at=payload["exp"],
+                   rate_per_min=payload["rl"])
+
+
 @bp.route("/logout", methods=["POST"])
 @csrf.exempt
 def logout():
     if current_user.is_authenticated:
         logout_user()
+    forget_principal()
     return redirect(url_for("auth.login"))
 
 
@@ -137,8 +181,7 @@ def force_password_change_gate():
 @bp.route("/first-password", methods=["GET", "POST"])
 @login_required
 def first_password():
-    user = current_user
-    if not getattr(user, "must_change_password", False):
+    if not getattr(current_user, "must_change_password", False):
         return redirect(url_for("dashboard.index"))
 
     if request.method == "POST":
@@ -153,10 +196,12 @@ def first_password():
             flash("Las contraseñas no coinciden.", "danger")
             return render_template("auth/first_password.html")
 
+        user = current_user.load_model()
         user.password_hash = generate_password_hash(new_pass)
         user.must_change_password = False
         user.password_changed_at = db.func.now()
         db.session.commit()
+        forget_principal()
 
         flash("Contraseña actualizada correctamente.", "success")
         return redirect(url_for("dashboard.index"))
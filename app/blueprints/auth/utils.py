@@ -1,12 +1,4 @@
 
-from functools import wraps
-from flask import abort
-from flask_login import current_user
-from sqlalchemy import text
-from app.extensions import db
-from functools import wraps
-from flask import abort
-from flask_login import current_user
 from functools import wraps
 from flask import redirect, url_for, flash, request, abort
 from flask_login import current_user, login_required as _flask_login_required
@@ -138,11 +130,7 @@ def superadmin_required(f):
     def wrapper(*args, **kwargs):
         if not current_user.is_authenticated:
             abort(401)  # no autenticado
-        row = db.session.execute(
-            text("SELECT 1 FROM superadmins WHERE user_id = :uid LIMIT 1"),
-            {"uid": int(current_user.id)}
-        ).first()
-        if not row:
+        if not getattr(current_user, "is_superadmin", False):
             abort(403)  # autenticado, pero sin permiso
         return f(*args, **kwargs)
     return wrapper
@@ -5,56 +5,42 @@ from __future__ import annotations
 from datetime import date as _date, timedelta as _timedelta
 from datetime import date, datetime, timedelta
 from calendar import monthrange
+from decimal import Decimal, ROUND_HALF_UP
 from io import BytesIO
 
+import numpy as np
 import pandas as pd
 from flask import (
     render_template, request, send_file,
-    redirect, url_for, jsonify, abort, flash
+    redirect, url_for, jsonify, abort, flash, current_app
 )
-from flask_login import login_required, current_user
+from flask_login import login_required
 from sqlalchemy import text, func, and_, or_
 from sqlalchemy.sql import bindparam
 
 from app.extensions import db
+from app import hll
+from app.fanout import fetch_many
+from app.watermark import conditional
+from app.cache import cached_json, remember, shareable
+from app.warmup import tracked
+from app import live
+from app.catalogs import get_catalog, recinto_label, recinto_order, obras_options, cargos_options, cuentas_options
 from app.blueprints.auth.routes import nivel_requerido
 from app.models import Desvinculacion
+from app.pagination import Keyset, text_key, window
+from app.permissions import current_scope
 from . import bp  # blueprint definido en __init__.py
 from sqlalchemy import and_, or_, func
 
 
 # ================= Helpers de acceso (recintos y cuentas) =================
 
-def _user_is_super() -> bool:
-    """Admin o nivel 1 (puede ver todo)."""
-    try:
-        return bool(current_user.is_authenticated and current_user.is_admin_or_level1())
-    except Exception:
-        return False
-
-
-def get_allowed_recintos_obra_ids(uid: int):
-    """
-    OBRA_ID visibles para el usuario, derivados de sus CUENTAS asignadas.
-    (user_cuentas -> recinto_cuentas -> recintos.code)
-    """
-    sql = text("""
-        SELECT DISTINCT CAST(r.code AS UNSIGNED) AS obra_id
-        FROM user_cuentas uc
-        JOIN recinto_cuentas rc ON rc.cuenta_id = uc.cuenta_id AND rc.is_active = 1
-        JOIN recintos r        ON r.id = rc.recinto_id
-        WHERE uc.user_id = :uid AND uc.is_active = 1
-    """)
-    with db.engine.begin() as conn:
-        return [int(row[0]) for row in conn.execute(sql, {"uid": uid}).all()]
-
-
-
 def enforce_rid_allowed(rid: int | None):
-    if _user_is_super() or not rid:
+    scope = current_scope()
+    if scope.unrestricted or not rid:
         return
-    allowed = set(get_allowed_recintos_obra_ids(current_user.id))
-    if rid not in allowed:
+    if rid not in scope.recinto_ids:
         abort(403)
 
 
@@ -73,70 +59,13 @@ def _sql_in_clause_text(col_name: str, allowed):
     return f" AND {col_name} IN :rids ", {"rids": list(allowed)}
 
 
-def _allowed_recinto_ids():
-    """
-    OBRA_ID visibles para el usuario actual:
-      - None  => admin/nivel1 (sin filtro)
-      - set() => sin acceso
-    """
-    if not current_user.is_authenticated:
-        return set()
-    try:
-        if current_user.is_admin_or_level1():
-            return None
-    except Exception:
-        pass
-
-    rows = db.session.execute(text("""
-        SELECT DISTINCT CAST(r.code AS UNSIGNED) AS obra_id
-        FROM user_cuentas uc
-        JOIN recinto_cuentas rc ON rc.cuenta_id = uc.cuenta_id AND rc.is_active = 1
-        JOIN recintos r        ON r.id = rc.recinto_id
-        WHERE uc.user_id = :uid AND uc.is_active = 1
-    """), {"uid": current_user.id}).fetchall()
-
-    ids = {int(r[0]) for r in rows}
-    return ids if ids else set()
-
-
-
 # ===== permisos por CUENTAS / ÁREAS (derivadas de recinto_cuentas + cuentas) =====
-
-def _allowed_cuentas(user_id: int, recinto_ids):
-    """
-    Devuelve:
-      - None  => sin restricción por cuentas (admin/nivel 1)
-      - {}    => sin acceso (no hay cuentas)
-      - dict{recinto_id(obra_id): set(cuenta_code)}
-    """
-    if recinto_ids is None:   # admin
-        return None
-    if recinto_ids == set():  # sin acceso
-        return {}
-
-    rows = db.session.execute(text("""
-        SELECT
-          CAST(r.code AS UNSIGNED) AS recinto_id,
-          c.code                    AS cuenta_code
-        FROM user_cuentas uc
-        JOIN cuentas c          ON c.id = uc.cuenta_id AND c.is_active = 1
-        JOIN recinto_cuentas rc ON rc.cuenta_id = uc.cuenta_id AND rc.is_active = 1
-        JOIN recintos r         ON r.id = rc.recinto_id
-        WHERE uc.user_id = :uid AND uc.is_active = 1
-    """), {"uid": user_id}).mappings().all()
-
-    per: dict[int, set[str]] = {}
-    for r in rows:
-        rid = int(r["recinto_id"])
-        if recinto_ids and rid not in recinto_ids:
-            continue
-        per.setdefault(rid, set()).add(r["cuenta_code"])
-
-    return per if any(per.values()) else {}
-
+# El alcance del usuario (recintos, pares recinto-cuenta y cuentas planas) viene de
+# app.permissions.current_scope(): una sola resolución por request.
 
 def _clause_cuentas(col_recinto: str, col_cta: str, per):
     """
+    (Legado: reemplazado por _scope_predicate; se mantiene como línea base de `flask bench`.)
     Construye cláusula para pares (recinto, cuenta) compatible con MySQL + text().
     - None  -> sin filtro
     - {}    -> AND 1=0
@@ -177,51 +106,101 @@ def _clause_cuentas(col_recinto: str, col_cta: str, per):
 
 
 
- # --- NUEVO: set plano de cuentas permitidas (a partir de recintos asignados) ---
-def _allowed_cuentas_flat_for_current_user():
+def _clause_scope(col_recinto: str, col_cta: str, per, uid: int):
     """
-    Devuelve:
-      - None     -> admin / nivel 1 (sin restricción)
-      - set()    -> usuario sin permisos (no verá nada)
-      - set{...} -> cuentas visibles (centro_costo_area)
+    Filtro por pares (recinto, cuenta) contra la tabla materializada
+    user_effective_scope: un único semi-join indexado por (user_id, obra_id, cuenta_code),
+    en vez del OR expandido de _clause_cuentas.
+    - None  -> sin filtro
+    - {}    -> AND 1=0
+    - dict  -> AND EXISTS (... user_effective_scope ...)
     """
-    recinto_ids = _allowed_recinto_ids()  # None / set()
-    per = _allowed_cuentas(current_user.id, recinto_ids)
     if per is None:
-        return None
+        return "", {}
     if not per:
-        return set()
-    s = set()
-    for cuentas in per.values():
-        s.update(cuentas or [])
-    return s
+        return " AND 1=0 ", {}
+    return (
+        f""" AND EXISTS (
+              SELECT 1 FROM user_effective_scope ues
+              WHERE ues.user_id = :scope_uid
+                AND ues.obra_id = {col_recinto}
+                AND ues.cuenta_code = {col_cta}) """,
+        {"scope_uid": int(uid)},
+    )
+
+
+
+def _scope_pairs(per) -> list[tuple[int, str]]:
+    """dict{obra_id: set(cuenta)} -> lista ordenada de pares (obra_id, cuenta)."""
+    return sorted((int(rid), cta) for rid, ctas in per.items() for cta in (ctas or ()))
+
+
+def _clause_tuple_in(col_recinto: str, col_cta: str, pairs):
+    """AND (rec, cta) IN ((..),(..)) con UN solo bind: el SQL no cambia de forma entre usuarios."""
+    return f" AND ({col_recinto}, {col_cta}) IN :scope_pairs ", {"scope_pairs": list(pairs)}
 
 
+def _clause_tmp_scope(col_recinto: str, col_cta: str, pairs, conn=None):
+    """
+    Carga los pares en una tabla TEMPORARY de la sesión MySQL (tmp_scope_pairs) y
+    retorna un semi-join contra ella. La consulta debe correr en la MISMA conexión
+    (conn, o db.session si conn=None).
+    """
+    ex = conn if conn is not None else db.session
+    ex.execute(text(f"""
+        CREATE TEMPORARY TABLE IF NOT EXISTS tmp_scope_pairs (
+          obra_id     INT          NOT NULL,
+          cuenta_code VARCHAR(120) NOT NULL COLLATE {current_app.config.get("MYSQL_COLLATION", "utf8mb4_unicode_ci")},
+          PRIMARY KEY (obra_id, cuenta_code)
+        ) ENGINE=MEMORY
+    """))
+    ex.execute(text("DELETE FROM tmp_scope_pairs"))
+    ex.execute(text("INSERT IGNORE INTO tmp_scope_pairs (obra_id, cuenta_code) VALUES (:rid, :cta)"),
+               [{"rid": rid, "cta": cta} for rid, cta in pairs])
+    return (
+        f""" AND EXISTS (
+              SELECT 1 FROM tmp_scope_pairs tsp
+              WHERE tsp.obra_id = {col_recinto}
+                AND tsp.cuenta_code = {col_cta}) """,
+        {},
+    )
+
+
+def _scope_predicate(col_recinto: str, col_cta: str, per, uid: int | None = None, conn=None):
+    """
+    Predicado de alcance por pares (recinto, cuenta), con forma de SQL estable.
+    Sirve para asistencia (a.id_recinto / a.cuenta_area) e inasistencias (i.obra_id / at.cuenta_area).
+    - None                         -> sin filtro
+    - {}                           -> AND 1=0
+    - <= SCOPE_INLINE_MAX pares    -> tuple-IN con un solo bind
+    - más pares y uid conocido     -> semi-join a user_effective_scope (materializada)
+    - más pares sin uid (ad-hoc)   -> semi-join a tabla temporaria de sesión
+    """
+    if per is None:
+        return "", {}
+    pairs = _scope_pairs(per)
+    if not pairs:
+        return " AND 1=0 ", {}
+    if len(pairs) <= current_app.config.get("SCOPE_INLINE_MAX", 64):
+        return _clause_tuple_in(col_recinto, col_cta, pairs)
+    if uid is not None:
+        return _clause_scope(col_recinto, col_cta, per, uid)
+    return _clause_tmp_scope(col_recinto, col_cta, pairs, conn)
+
 
 
 # =================== SQL base comunes ===================
 
+# Columnas crudas: el formato (rut con guion, fecha dd/mm/aaaa, nombre del recinto)
+# se aplica en Python solo a las filas que se devuelven (_inasistencia_row).
+# Los filtros van DENTRO del WHERE (sql_inasistencias), no sobre la tabla derivada.
 SQL_INASISTENCIAS_BASE = """
 SELECT DISTINCT
-  CONCAT(LEFT(i.DNI, LENGTH(i.DNI) - 1), '-', RIGHT(i.DNI, 1)) AS rut,
+  i.DNI AS DNI,
   AT.nombreTrabajador AS NombreTrabajador,
-
-  CASE i.obra_id
-    WHEN 14168 THEN 'PG CD'
-    WHEN 14184 THEN 'BAT LO BOZA'
-    WHEN 14186 THEN 'UL CD'
-    WHEN 14367 THEN 'PG VAS'
-    WHEN 14368 THEN 'BAT CASABLANCA'
-    WHEN 14369 THEN 'UL VAS'
-    WHEN 14370 THEN 'PG BMP'
-    WHEN 14818 THEN 'NOVICIADO'
-    WHEN 16256 THEN 'PANAMERICANA'
-    ELSE 'OTRO'
-  END AS recinto,
-
+  i.obra_id AS recinto,
   at.cuenta_area AS Cuenta,
   nc.cargo_normalizado AS Cargo,
-  DATE_FORMAT(i.fecha_inasistencia, '%d/%m/%Y ') AS FECHA,
 
   CASE
     WHEN i.motivo = '-'        THEN 'Ausente'
@@ -232,13 +211,12 @@ SELECT DISTINCT
     ELSE i.motivo
   END AS motivo,
 
-  -- Campos técnicos para filtro/orden
-  i.obra_id AS recinto_id,
   i.fecha_inasistencia AS fecha_real
 
 FROM inasistencias i
 JOIN asignacion_turnos at
-  ON i.uid_inasistencia = at.uid_rut_dia_obra
+  ON i.join_key = at.join_key
+ AND i.uid_inasistencia = at.uid_rut_dia_obra
 JOIN nomina_colaborador nc
   ON i.DNI = nc.DNI
 WHERE
@@ -246,6 +224,41 @@ WHERE
   AND i.obra_id = nc.obra_id
 """
 
+
+def sql_inasistencias(where: str = "") -> str:
+    """SQL_INASISTENCIAS_BASE con predicados extra (' AND ...') en su WHERE."""
+    return f"{SQL_INASISTENCIAS_BASE} {where}"
+
+
+def _inasistencias_where(start: str, end: str, scope) -> tuple[str, dict]:
+    """
+    Rango de fechas (semiabierto, sargable sobre ix_inas_fecha_obra_motivo),
+    recintos y cuentas del alcance, para el WHERE de SQL_INASISTENCIAS_BASE.
+    """
+    extra_rec, p_rec = _sql_in_clause_text("i.obra_id", scope.recinto_ids)
+    extra_cta, p_cta = _scope_predicate("i.obra_id", "at.cuenta_area", scope.cuentas_por_recinto,
+                                        uid=scope.materialized_uid)
+    where = f"""
+      AND i.fecha_inasistencia >= :start AND i.fecha_inasistencia < :end + INTERVAL 1 DAY
+      {extra_rec}
+      {extra_cta}
+    """
+    return where, {"start": start, "end": end, **p_rec, **p_cta}
+
+
+def _inasistencia_row(r, labels) -> dict:
+    """Fila cruda de SQL_INASISTENCIAS_BASE -> columnas del reporte (mismo formato que antes en SQL)."""
+    dni, fecha = r["DNI"], r["fecha_real"]
+    return {
+        "rut": None if dni is None else f"{dni[:-1]}-{dni[-1:]}",
+        "NombreTrabajador": r["NombreTrabajador"],
+        "recinto": recinto_label(r["recinto"], labels),
+        "Cuenta": r["Cuenta"],
+        "Cargo": r["Cargo"],
+        "FECHA": fecha.strftime("%d/%m/%Y ") if fecha else None,
+        "motivo": r["motivo"],
+    }
+
 SQL_HORAS_TRABAJADAS_BASE = """
 SELECT DISTINCT
   CONCAT_WS(' ', a.nombre, a.apellido_paterno, a.apellido_materno)  AS NombreTrabajador,
@@ -272,11 +285,72 @@ SELECT DISTINCT
   at.cuenta_area                                                    AS cuenta_area
 FROM asistencia a
 JOIN horas_extras_diario he
-  ON a.rut_fecha_recinto = he.dni_fecha_recinto
+  ON a.join_key = he.join_key
+ AND a.rut_fecha_recinto = he.dni_fecha_recinto
 LEFT JOIN asignacion_turnos at
-  ON a.rut_fecha_recinto = at.uid_rut_dia_obra
+  ON a.join_key = at.join_key
+ AND a.rut_fecha_recinto = at.uid_rut_dia_obra
 """
 
+# Orden de cada reporte paginado como clave de keyset (app.pagination).
+# La clave cubre TODAS las columnas del DISTINCT / GROUP BY: dos filas distintas
+# nunca empatan (si empataran, el cursor estricto saltaría una). Los textos
+# anulables van con text_key (NULL antes que '' y distinto de ''); fechas y
+# números anulables con un centinela fuera de rango, donde MySQL ya ponía el NULL.
+KEYSET_HORAS_TRABAJADAS = Keyset(
+    (text_key("t.recinto"), False),
+    (text_key("t.dni"), False),
+    ("COALESCE(t.entrada, TIMESTAMP('1000-01-01'))", False),
+    ("t.salida", False),
+    (text_key("t.DiaTurno"), False),
+    ("t.NombreTrabajador", False),                      # CONCAT_WS: nunca NULL
+    ("t.HorasExtras", False),                           # COALESCE en la base
+    ("COALESCE(t.HorasTrabajadas, -1)", False),
+    ("COALESCE(t.HorasTotal, -1)", False),
+    ("COALESCE(t.entradaProgramada, TIMESTAMP('1000-01-01'))", False),
+    ("COALESCE(t.SalidaProgramada, TIMESTAMP('1000-01-01'))", False),
+    (text_key("t.Cargo"), False),
+    (text_key("t.tipo_turno"), False),
+    (text_key("t.cuenta_area"), False),
+)
+
+
+def keyset_inasistencias(cat) -> Keyset:
+    """
+    Fecha desc. y luego recinto por NOMBRE (recinto_order, desde el catálogo), como
+    cuando la etiqueta salía en SQL; obra_id desempata obras fuera del catálogo.
+    """
+    return Keyset(
+        ("t.fecha_real", True),
+        (recinto_order("t.recinto", cat.labels, cat.obra_ids), False),
+        ("COALESCE(t.recinto, 0)", False),
+        (text_key("t.DNI"), False),
+        (text_key("t.Cuenta"), False),
+        (text_key("t.Cargo"), False),
+        (text_key("t.motivo"), False),
+        (text_key("t.NombreTrabajador"), False),
+    )
+
+
+# sobre columnas del GROUP BY: el predicado del cursor va en el WHERE (antes de agrupar)
+KEYSET_HORAS_EXTRAS = Keyset(
+    ("he.fecha", True),
+    (text_key("a.nombre_recinto"), False),
+    (text_key("a.rut_trabajador"), False),
+    (text_key("a.cuenta_area"), False),
+    (text_key("a.cargo_resumido"), False),
+    (text_key("a.nombre"), False),
+    (text_key("a.apellido_paterno"), False),
+    (text_key("a.apellido_materno"), False),
+)
+KEYSET_NOMINA = Keyset(
+    (text_key("recinto"), False),
+    (text_key("cuenta_area"), False),
+    ("nombre", False),                                  # CONCAT_WS: nunca NULL
+    (text_key("rut"), False),
+    (text_key("cargo"), False),
+)
+
 
 # ================= Rutas de navegación (HTML) =================
 
@@ -286,233 +360,249 @@ def index():
     return redirect(url_for("dashboard.dashboard"))
 
 
+# =================== Paneles del dashboard (desde una sola consulta) ===================
+
+_MOTIVOS = [
+    # (columna del rollup, etiqueta del gráfico)
+    ("aus_ausente", "Ausentes"),
+    ("aus_vacaciones", "Vacaciones"),
+    ("aus_licencia", "Licencias"),
+    ("aus_permiso", "Permisos"),
+    ("aus_compensado", "Compensado"),
+    ("aus_sin_registro", "Sin registro"),
+    ("aus_otros", "Otros"),
+]
+
+
+def _pct(part, total, nd: int):
+    """Igual que ROUND(part / NULLIF(total, 0) * 100, nd) de MySQL (HALF_UP, None si total=0)."""
+    if not total:
+        return None
+    q = Decimal(1).scaleb(-nd)
+    return float((Decimal(int(part)) / Decimal(int(total)) * 100).quantize(q, rounding=ROUND_HALF_UP))
+
+
+def _fanout_resumen(rows, unicos=None):
+    """
+    Filas por recinto (asist, registros, inasist, aus_*) -> kpis, motivos,
+    inasistencias por recinto y resumen por recinto, con la misma forma que
+    tenían las consultas separadas. El nombre del recinto sale del catálogo.
+    unicos = app.hll.merge_counts() (trabajadores únicos) o None.
+    """
+    labels = get_catalog().labels
+    rows = [{**r, "recinto": recinto_label(r["r_id"], labels)} for r in rows]
+    asist = sum(int(r["asist"] or 0) for r in rows)
+    inasist = sum(int(r["inasist"] or 0) for r in rows)
+    dot = asist + inasist
+    kpis = {
+        "asistencia": asist,
+        "inasistencia": inasist,
+        "dotacion": dot,
+        "pct_presentismo": _pct(asist, dot, 2) or 0.0,
+        "pct_ausencia": _pct(inasist, dot, 2) or 0.0,
+        "trabajadores": unicos["total"] if unicos is not None else None,
+    }
+    unicos_rid = unicos["por_recinto"] if unicos is not None else {}
+
+    tot_mot = {label: sum(int(r[col] or 0) for r in rows) for col, label in _MOTIVOS}
+    total_motivos = sum(tot_mot.values())
+    motivos = sorted(
+        ({"motivo": label, "cantidad": n, "pct": _pct(n, total_motivos, 1)}
+         for label, n in tot_mot.items() if n),
+        key=lambda r: r["cantidad"], reverse=True,
+    )
+
+    inas_por_recinto = sorted(
+        ({"rid": int(r["r_id"] or 0), "recinto": r["recinto"],
+          "cantidad": int(r["inasist"]), "pct": _pct(r["inasist"], inasist, 1)}
+         for r in rows if r["inasist"]),
+        key=lambda r: r["cantidad"], reverse=True,
+    )
+
+    resumen_recinto = []
+    for r in rows:
+        a, i = int(r["asist"] or 0), int(r["inasist"] or 0)
+        if not (r["registros"] or i):
+            continue
+        resumen_recinto.append({
+            "rid": int(r["r_id"] or 0),
+            "recinto": r["recinto"],
+            "asist": a,
+            "inasist": i,
+            "dotacion": a + i,
+            "pct_pres": _pct(a, a + i, 1),
+            "pct_aus": _pct(i, a + i, 1),
+            "licencias": int(r["aus_licencia"] or 0),
+            "permisos": int(r["aus_permiso"] or 0),
+            "vacaciones": int(r["aus_vacaciones"] or 0),
+            "trabajadores": unicos_rid.get(int(r["r_id"] or 0)) if unicos is not None else None,
+        })
+    resumen_recinto.sort(key=lambda r: (r["recinto"] is not None, (r["recinto"] or "").casefold()))
+    return kpis, motivos, inas_por_recinto, resumen_recinto
+
+
 # =================== DASHBOARD ===================
 
+def _dashboard_filtros() -> dict:
+    """Filtros del dashboard desde la query string (mismos nombres en la página y en /api/dashboard/*)."""
+    return {
+        "desde": (request.args.get("desde") or date.today().isoformat()),
+        "hasta": (request.args.get("hasta") or date.today().isoformat()),
+        "obra_id": (request.args.get("obra_id") or "").strip(),
+        "cargo": (request.args.get("cargo") or "").strip(),
+        "cuenta_area": (request.args.get("cuenta_area") or "").strip(),
+    }
+
+
+def _dashboard_resumen(filtros: dict):
+    """
+    KPIs y paneles salen del rollup diario (attendance_daily, `flask rollup refresh`):
+     - inasistencias: rango + recintos (+ obra)
+     - asistencia:    lo anterior + cargo / cuenta
+    UNA pasada agregada por recinto con SUM(CASE …); _fanout_resumen() arma cada panel.
+    """
+    # Acceso por recintos (obra_id): un solo AccessScope por request
+    allowed = current_scope().recinto_ids
+
+    extra_roll, p_roll = _sql_in_clause_text("d.id_recinto", allowed)
+    where_roll = ["d.fecha BETWEEN :desde AND :hasta" + extra_roll]
+    params = {"desde": filtros["desde"], "hasta": filtros["hasta"], **p_roll}
+    cond_asist = ["1=1"]
+
+    if filtros["obra_id"]:
+        where_roll.append("d.id_recinto = :obra_id")
+        params["obra_id"] = filtros["obra_id"]
+    if filtros["cargo"]:
+        params["cargo"] = filtros["cargo"]
+        cond_asist.append("d.cargo_resumido = :cargo")
+    if filtros["cuenta_area"]:
+        params["cuenta_area"] = filtros["cuenta_area"]
+        cond_asist.append("d.cuenta_area = :cuenta_area")
+
+    wr, ca = " AND ".join(where_roll), " AND ".join(cond_asist)
+
+    sql_resumen = text(f"""
+        SELECT
+            d.id_recinto AS r_id,
+            SUM(CASE WHEN {ca} THEN d.presentes ELSE 0 END) AS asist,
+            SUM(CASE WHEN {ca} THEN d.registros ELSE 0 END) AS registros,
+            SUM(d.ausentes)         AS inasist,
+            SUM(d.aus_ausente)      AS aus_ausente,
+            SUM(d.aus_vacaciones)   AS aus_vacaciones,
+            SUM(d.aus_licencia)     AS aus_licencia,
+            SUM(d.aus_permiso)      AS aus_permiso,
+            SUM(d.aus_compensado)   AS aus_compensado,
+            SUM(d.aus_sin_registro) AS aus_sin_registro,
+            SUM(d.aus_otros)        AS aus_otros
+        FROM attendance_daily d
+        WHERE {wr}
+        GROUP BY d.id_recinto;
+    """)
+
+    queries = {"resumen": (sql_resumen, params)}
+
+    # Trabajadores únicos: unión de los sketches HLL del rango (app.hll).
+    # attendance_hll no tiene cargo: con filtro de cargo el KPI queda en None.
+    if not filtros["cargo"]:
+        extra_hll, _ = _sql_in_clause_text("h.id_recinto", allowed)
+        where_hll = ["h.fecha BETWEEN :desde AND :hasta" + extra_hll]
+        if filtros["obra_id"]:
+            where_hll.append("h.id_recinto = :obra_id")
+        if filtros["cuenta_area"]:
+            where_hll.append("h.cuenta_area = :cuenta_area")
+        wh = " AND ".join(where_hll)
+        sql_hll = text(f"""
+            SELECT h.id_recinto, h.sketch
+            FROM attendance_hll h
+            WHERE {wh}
+        """)
+        queries["sketches"] = (sql_hll, params)
+
+    def compute():
+        res = fetch_many(queries)
+        # en caché solo quedan las estimaciones, no los sketches
+        unicos = hll.merge_counts(res["sketches"]) if "sketches" in res else None
+        return {"rows": res["resumen"], "unicos": unicos}
+
+    # caché por alcance (los 4 paneles comparten la entrada) y, al recalcular,
+    # vía fan-out: supervisores con el mismo rango y alcance comparten la ejecución (single-flight)
+    out = remember("dashboard.paneles", compute, tables=("asistencia", "inasistencias"))
+    return _fanout_resumen(out["rows"], out["unicos"])
+
+
 @bp.get("/dashboard")
 @login_required
 def dashboard():
-    # Filtros
-    f_desde = (request.args.get("desde") or date.today().isoformat())
-    f_hasta = (request.args.get("hasta") or date.today().isoformat())
-    obra_id = (request.args.get("obra_id") or "").strip()
-    cargo = (request.args.get("cargo") or "").strip()
-    cuenta_area = (request.args.get("cuenta_area") or "").strip()
+    # Solo el esqueleto: cada panel se pide en paralelo a /api/dashboard/<panel>
+    return render_template("dashboard/index.html", filtros=_dashboard_filtros())
 
-    # Acceso por recintos (obra_id)
-    allowed = None if _user_is_super() else set(get_allowed_recintos_obra_ids(current_user.id))
-    extra_asist, p_asist = _sql_in_clause_text("a.id_recinto", allowed)
-    extra_inas,  p_inas  = _sql_in_clause_text("i.obra_id",    allowed)
-    extra_combo, p_combo = _sql_in_clause_text("value",        allowed)
 
-    # Permisos por cuentas para combo (pares recinto-cuenta)
-    per_ctas = _allowed_cuentas(current_user.id, allowed)
-    extra_cta_combo, p_cta_combo = _clause_cuentas("a.id_recinto", "a.cuenta_area", per_ctas)
+# ---- Paneles del dashboard (JSON), mismos filtros que la página ----
+@bp.get("/api/dashboard/kpis")
+@login_required
+@tracked  # los paneles comparten "dashboard.paneles": basta con registrar uno
+@conditional("asistencia", "inasistencias")
+def api_dashboard_kpis():
+    kpis, *_ = _dashboard_resumen(_dashboard_filtros())
+    return jsonify(kpis)
 
-    where_asist = ["DATE(a.fecha_base) BETWEEN :desde AND :hasta" + extra_asist]
-    where_inas  = ["DATE(i.fecha_inasistencia) BETWEEN :desde AND :hasta" + extra_inas]
-    params = {"desde": f_desde, "hasta": f_hasta, **p_asist, **p_inas}
 
-    if obra_id:
-        where_asist.append("a.id_recinto = :obra_id")
-        where_inas.append("i.obra_id = :obra_id")
-        params["obra_id"] = obra_id
-    if cargo:
-        params["cargo"] = cargo
-        where_asist.append("a.cargo_resumido = :cargo")
-    if cuenta_area:
-        params["cuenta_area"] = cuenta_area
-        where_asist.append("a.cuenta_area = :cuenta_area")
+@bp.get("/api/dashboard/motivos")
+@login_required
+@conditional("asistencia", "inasistencias")
+def api_dashboard_motivos():
+    _, motivos, _, _ = _dashboard_resumen(_dashboard_filtros())
+    return jsonify(items=motivos)
 
-    wa, wi = " AND ".join(where_asist), " AND ".join(where_inas)
 
-    # KPIs
-    sql_kpis = text(f"""
-        SELECT
-          COALESCE(SUM(t.asistencias),0)   AS asistencia,
-          COALESCE(SUM(t.inasistencias),0) AS inasistencia,
-          COALESCE(SUM(t.asistencias)+SUM(t.inasistencias),0) AS dotacion,
-          ROUND(COALESCE(SUM(t.asistencias),0) / NULLIF(COALESCE(SUM(t.asistencias),0)+COALESCE(SUM(t.inasistencias),0),0) * 100, 2) AS pct_presentismo,
-          ROUND(COALESCE(SUM(t.inasistencias),0) / NULLIF(COALESCE(SUM(t.asistencias),0)+COALESCE(SUM(t.inasistencias),0),0) * 100, 2) AS pct_ausencia
-        FROM (
-          SELECT COUNT(*) AS asistencias, 0 AS inasistencias FROM asistencia a WHERE {wa} AND a.entrada IS NOT NULL
-          UNION ALL
-          SELECT 0 AS asistencias, COUNT(*) AS inasistencias FROM inasistencias i WHERE {wi}
-        ) t;
-    """)
+@bp.get("/api/dashboard/inasistencias-recinto")
+@login_required
+@conditional("asistencia", "inasistencias")
+def api_dashboard_inas_recinto():
+    _, _, inas_por_recinto, _ = _dashboard_resumen(_dashboard_filtros())
+    return jsonify(items=inas_por_recinto)
 
-    # Combos (obras, cargos y cuentas)
-    sql_obras = text(f"""
-        SELECT value, label
-        FROM (
-          SELECT DISTINCT a.id_recinto AS value,
-            CASE a.id_recinto
-              WHEN 14168 THEN 'PG CD' WHEN 14184 THEN 'BAT LO BOZA' WHEN 14186 THEN 'UL CD'
-              WHEN 14367 THEN 'PG VAS' WHEN 14368 THEN 'BAT CASABLANCA' WHEN 14369 THEN 'UL VAS'
-              WHEN 14370 THEN 'PG BMP' WHEN 14818 THEN 'NOVICIADO'     WHEN 16256 THEN 'PANAMERICANA'
-              ELSE CONCAT('OBRA ', a.id_recinto) END AS label
-          FROM asistencia a
-          UNION
-          SELECT DISTINCT i.obra_id AS value,
-            CASE i.obra_id
-              WHEN 14168 THEN 'PG CD' WHEN 14184 THEN 'BAT LO BOZA' WHEN 14186 THEN 'UL CD'
-              WHEN 14367 THEN 'PG VAS' WHEN 14368 THEN 'BAT CASABLANCA' WHEN 14369 THEN 'UL VAS'
-              WHEN 14370 THEN 'PG BMP' WHEN 14818 THEN 'NOVICIADO'     WHEN 16256 THEN 'PANAMERICANA'
-              ELSE CONCAT('OBRA ', i.obra_id) END AS label
-          FROM inasistencias i
-        ) x
-        WHERE 1=1 {extra_combo}
-        ORDER BY label;
-    """)
 
-    sql_cargos = text("""
-        SELECT DISTINCT a.cargo_resumido AS value
-        FROM asistencia a
-        WHERE a.cargo_resumido IS NOT NULL AND a.cargo_resumido <> ''
-        ORDER BY value;
-    """)
+@bp.get("/api/dashboard/resumen-recinto")
+@login_required
+@conditional("asistencia", "inasistencias")
+def api_dashboard_resumen_recinto():
+    *_, resumen_recinto = _dashboard_resumen(_dashboard_filtros())
+    return jsonify(items=resumen_recinto)
 
-    # Combo cuentas filtrado por recintos *y* por cuentas asignadas
-    sql_cuentas = text(f"""
-        SELECT DISTINCT a.cuenta_area AS value
-        FROM asistencia a
-        WHERE a.cuenta_area IS NOT NULL
-          AND a.cuenta_area <> ''
-          {extra_asist}
-          {extra_cta_combo}
-        ORDER BY value;
-    """)
 
-    # Otras consultas de tablero (motivos, inas por recinto, resumen por recinto)
-    sql_motivos = text(f"""
-        SELECT motivo, cantidad,
-               ROUND(cantidad / NULLIF(SUM(cantidad) OVER(), 0) * 100, 1) AS pct
-        FROM (
-            SELECT 
-                CASE
-                    WHEN i.motivo = '-'        THEN 'Ausentes'
-                    WHEN UPPER(i.motivo) = 'V' THEN 'Vacaciones'
-                    WHEN UPPER(i.motivo) = 'L' THEN 'Licencias'
-                    WHEN UPPER(i.motivo) = 'P' THEN 'Permisos'
-                    WHEN UPPER(i.motivo) = 'C' THEN 'Compensado'
-                    WHEN i.motivo IS NULL      THEN 'Sin registro'
-                    ELSE 'Otros'
-                END AS motivo,
-                COUNT(*) AS cantidad
-            FROM inasistencias i
-            WHERE {wi}
-            GROUP BY motivo
-        ) t
-        ORDER BY cantidad DESC;
-    """)
+@bp.get("/api/dashboard/combos")
+@login_required
+@conditional("asistencia", "inasistencias")
+def api_dashboard_combos():
+    # Desde el catálogo en caché (app.catalogs), acotados al alcance del usuario
+    scope = current_scope()
+    return jsonify(
+        obras=obras_options(scope.recinto_ids),
+        cargos=cargos_options(),
+        cuentas=cuentas_options(scope.recinto_ids, scope.cuentas_por_recinto),
+    )
 
-    sql_inas_por_recinto = text(f"""
-        SELECT recinto, cantidad,
-               ROUND(cantidad / NULLIF(SUM(cantidad) OVER(), 0) * 100, 1) AS pct
-        FROM (
-            SELECT 
-                CASE i.obra_id
-                    WHEN 14168 THEN 'PG CD' WHEN 14184 THEN 'BAT LO BOZA' WHEN 14186 THEN 'UL CD'
-                    WHEN 14367 THEN 'PG VAS' WHEN 14368 THEN 'BAT CASABLANCA' WHEN 14369 THEN 'UL VAS'
-                    WHEN 14370 THEN 'PG BMP' WHEN 14818 THEN 'NOVICIADO'     WHEN 16256 THEN 'PANAMERICANA'
-                    ELSE CONCAT('OBRA ', i.obra_id)
-                END AS recinto,
-                COUNT(*) AS cantidad
-            FROM inasistencias i
-            WHERE {wi}
-            GROUP BY i.obra_id
-        ) t
-        ORDER BY cantidad DESC;
-    """)
 
-    sql_resumen_recinto = text(f"""
-        WITH
-        asist AS (
-            SELECT a.id_recinto AS recinto_id, COUNT(*) AS asist
-            FROM asistencia a
-            WHERE {wa} AND a.entrada IS NOT NULL
-            GROUP BY a.id_recinto
-        ),
-        inas AS (
-            SELECT i.obra_id AS recinto_id, COUNT(*) AS inasist
-            FROM inasistencias i
-            WHERE {wi}
-            GROUP BY i.obra_id
-        ),
-        lic AS (
-            SELECT i.obra_id AS recinto_id, COUNT(*) AS licencias
-            FROM inasistencias i
-            WHERE {wi} AND UPPER(i.motivo) = 'L'
-            GROUP BY i.obra_id
-        ),
-        per AS (
-            SELECT i.obra_id AS recinto_id, COUNT(*) AS permisos
-            FROM inasistencias i
-            WHERE {wi} AND UPPER(i.motivo) = 'P'
-            GROUP BY i.obra_id
-        ),
-        vac AS (
-            SELECT i.obra_id AS recinto_id, COUNT(*) AS vacaciones
-            FROM inasistencias i
-            WHERE {wi} AND UPPER(i.motivo) = 'V'
-            GROUP BY i.obra_id
-        )
-        SELECT
-            CASE r_id
-                WHEN 14168 THEN 'PG CD' WHEN 14184 THEN 'BAT LO BOZA' WHEN 14186 THEN 'UL CD'
-                WHEN 14367 THEN 'PG VAS' WHEN 14368 THEN 'BAT CASABLANCA' WHEN 14369 THEN 'UL VAS'
-                WHEN 14370 THEN 'PG BMP' WHEN 14818 THEN 'NOVICIADO'     WHEN 16256 THEN 'PANAMERICANA'
-                ELSE CONCAT('OBRA ', r_id)
-            END AS recinto,
-            COALESCE(a.asist, 0)     AS asist,
-            COALESCE(i.inasist, 0)   AS inasist,
-            COALESCE(a.asist, 0) + COALESCE(i.inasist, 0) AS dotacion,
-            ROUND(COALESCE(a.asist,0) / NULLIF(COALESCE(a.asist,0) + COALESCE(i.inasist,0),0) * 100, 1) AS pct_pres,
-            ROUND(COALESCE(i.inasist,0) / NULLIF(COALESCE(a.asist,0) + COALESCE(i.inasist,0),0) * 100, 1) AS pct_aus,
-            COALESCE(l.licencias, 0) AS licencias,
-            COALESCE(p.permisos, 0)  AS permisos,
-            COALESCE(v.vacaciones, 0) AS vacaciones
-        FROM (
-            SELECT DISTINCT id_recinto AS r_id FROM asistencia a WHERE {wa}
-            UNION
-            SELECT DISTINCT obra_id   AS r_id FROM inasistencias i WHERE {wi}
-        ) r
-        LEFT JOIN asist a ON a.recinto_id = r.r_id
-        LEFT JOIN inas  i ON i.recinto_id = r.r_id
-        LEFT JOIN lic   l ON l.recinto_id = r.r_id
-        LEFT JOIN per   p ON p.recinto_id = r.r_id
-        LEFT JOIN vac   v ON v.recinto_id = r.r_id
-        ORDER BY recinto ASC;
-    """)
+@bp.get("/api/dashboard/stream")
+@login_required
+def api_dashboard_stream():
+    # SSE: cuando avanza la ingesta, solo los KPIs / filas por recinto que cambiaron (app.live)
+    filtros = _dashboard_filtros()
 
-    with db.engine.begin() as conn:
-        k = conn.execute(sql_kpis, params).mappings().first() or {}
-        obras = conn.execute(sql_obras, dict(p_combo)).mappings().all()
-        cargos = conn.execute(sql_cargos).mappings().all()
-        cuentas = conn.execute(sql_cuentas, {**p_asist, **p_cta_combo}).mappings().all()
-        motivos = conn.execute(sql_motivos, params).mappings().all()
-        inas_por_recinto = conn.execute(sql_inas_por_recinto, params).mappings().all()
-        resumen_recinto = conn.execute(sql_resumen_recinto, params).mappings().all()
+    def snapshot():
+        kpis, motivos, inas_por_recinto, resumen_recinto = _dashboard_resumen(filtros)
+        return {"kpis": kpis, "motivos": motivos,
+                "inas_por_recinto": inas_por_recinto, "resumen_recinto": resumen_recinto}
 
-    kpis = {
-        "asistencia": int(k.get("asistencia", 0)),
-        "inasistencia": int(k.get("inasistencia", 0)),
-        "dotacion": int(k.get("dotacion", 0)),
-        "pct_presentismo": float(k.get("pct_presentismo") or 0.0),
-        "pct_ausencia": float(k.get("pct_ausencia") or 0.0),
-    }
-    filtros = {"desde": f_desde, "hasta": f_hasta, "obra_id": obra_id, "cargo": cargo, "cuenta_area": cuenta_area}
-    opciones = {"obras": obras, "cargos": cargos, "cuentas": cuentas}
+    return live.stream_response(snapshot)
 
-    return render_template(
-        "dashboard/index.html",
-        kpis=kpis,
-        tabla=[],
-        filtros=filtros,
-        opciones=opciones,
-        motivos=motivos,
-        inas_por_recinto=inas_por_recinto,
-        resumen_recinto=resumen_recinto
-    )
+
+@bp.get("/api/ingest/stream")
+@login_required
+def api_ingest_stream():
+    # SSE sin datos: solo avisa que hubo ingesta (presentismo muestra "datos nuevos")
+    return live.stream_response()
 
 
 # =================== REPORTES ===================
@@ -532,35 +622,36 @@ def reporte_horas_trabajadas():
 
 @bp.get("/api/horas-trabajadas")
 @login_required
+@tracked
+@conditional("asistencia", "horas_extras_diario", "asignacion_turnos")
+@cached_json("asistencia", "horas_extras_diario", "asignacion_turnos")
 def api_horas_trabajadas():
     start = (request.args.get("start") or "").strip()
     end   = (request.args.get("end") or "").strip()
     if not start or not end:
         return jsonify({"error": "Parámetros 'start' y 'end' son obligatorios (YYYY-MM-DD)."}), 400
 
-    try: page = max(int(request.args.get("page", 1)), 1)
-    except: page = 1
     try: per_page = int(request.args.get("per_page", 30))
     except: per_page = 30
     per_page = max(1, min(per_page, 200))
-    offset = (page - 1) * per_page
 
-    allowed = _allowed_recinto_ids()
+    scope = current_scope()
+    allowed = scope.recinto_ids
     extra_asist, p_asist = _sql_in_clause_text("a.id_recinto", allowed)
     # filtro por cuentas
-    per_ctas = _allowed_cuentas(current_user.id, allowed)
-    extra_cta, p_cta = _clause_cuentas("a.id_recinto", "a.cuenta_area", per_ctas)
+    per_ctas = scope.cuentas_por_recinto
+    extra_cta, p_cta = _scope_predicate("a.id_recinto", "a.cuenta_area", per_ctas, uid=scope.materialized_uid)
 
     WHERE = f"""
-      WHERE DATE(a.fecha_base) BETWEEN :start AND :end
+      WHERE a.fecha_base >= :start AND a.fecha_base < :end + INTERVAL 1 DAY
         AND at.tipoTurno IS NOT NULL
         {extra_asist}
         {extra_cta}
     """
     params = {"start": start, "end": end, **p_asist, **p_cta}
-
-    sql_count = text(f"SELECT COUNT(*) FROM ({SQL_HORAS_TRABAJADAS_BASE} {WHERE}) AS q")
-    total = db.session.execute(sql_count, params).scalar() or 0
+    SET_SQL = f"{SQL_HORAS_TRABAJADAS_BASE} {WHERE}"  # mismo conjunto para la página y el total
+    w = window(KEYSET_HORAS_TRABAJADAS, per_page,
+               tables=("asistencia", "horas_extras_diario", "asignacion_turnos"))
 
     sql_page = text(f"""
       SELECT
@@ -571,23 +662,18 @@ def api_horas_trabajadas():
         t.HorasExtras, t.HorasTrabajadas, t.HorasTotal,
         DATE_FORMAT(t.entradaProgramada, '%d/%m/%Y %H:%i:%s') AS entradaProgramada,
         DATE_FORMAT(t.SalidaProgramada,  '%d/%m/%Y %H:%i:%s') AS SalidaProgramada,
-        t.Cargo, t.tipo_turno, t.cuenta_area
-      FROM (
-        {SQL_HORAS_TRABAJADAS_BASE}
-        {WHERE}
-      ) t
-      ORDER BY t.recinto, t.dni, t.entrada
+        t.Cargo, t.tipo_turno, t.cuenta_area,
+        {w.select()}
+      FROM ( {SET_SQL} ) t
+      WHERE 1=1 {w.where}
+      ORDER BY {w.order_by}
       LIMIT :limit OFFSET :offset
     """)
-    rows = db.session.execute(sql_page, {**params, "limit": per_page, "offset": offset}).mappings().all()
-    items = [dict(r) for r in rows]
+    rows = db.session.execute(sql_page, {**params, **w.params}).mappings().all()
+    items, nav = w.finish(rows)
+    total = w.total(SET_SQL, params)
 
-    pages = (total // per_page) + (1 if total % per_page else 0)
-    return jsonify({
-        "items": items, "page": page, "per_page": per_page,
-        "total": total, "pages": pages,
-        "has_prev": page > 1, "has_next": page < pages if pages else False
-    })
+    return jsonify({"items": items, **w.paging(total), **nav})
 
 
 @bp.get("/reporte/horas-trabajadas/export")
@@ -598,13 +684,14 @@ def export_horas_trabajadas():
     if not start or not end:
         return "Parámetros 'start' y 'end' son obligatorios (YYYY-MM-DD).", 400
 
-    allowed = _allowed_recinto_ids()
+    scope = current_scope()
+    allowed = scope.recinto_ids
     extra_asist, p_asist = _sql_in_clause_text("a.id_recinto", allowed)
-    per_ctas = _allowed_cuentas(current_user.id, allowed)
-    extra_cta, p_cta = _clause_cuentas("a.id_recinto", "a.cuenta_area", per_ctas)
+    per_ctas = scope.cuentas_por_recinto
+    extra_cta, p_cta = _scope_predicate("a.id_recinto", "a.cuenta_area", per_ctas, uid=scope.materialized_uid)
 
     WHERE = f"""
-      WHERE DATE(a.fecha_base) BETWEEN :start AND :end
+      WHERE a.fecha_base >= :start AND a.fecha_base < :end + INTERVAL 1 DAY
         AND at.tipoTurno IS NOT NULL
         {extra_asist}
         {extra_cta}
@@ -672,52 +759,40 @@ def reporte_inasistencias():
 
 @bp.get("/api/inasistencias")
 @login_required
+@tracked
+@conditional("inasistencias", "asignacion_turnos", "nomina_colaborador")
+@cached_json("inasistencias", "asignacion_turnos", "nomina_colaborador")
 def api_inasistencias():
     start = (request.args.get("start") or "").strip()
     end   = (request.args.get("end") or "").strip()
     if not start or not end:
         return jsonify({"error": "Parámetros 'start' y 'end' son obligatorios (YYYY-MM-DD)."}), 400
 
-    try: page = max(int(request.args.get("page", 1)), 1)
-    except: page = 1
     try: per_page = int(request.args.get("per_page", 30))
     except: per_page = 30
     per_page = max(1, min(per_page, 200))
-    offset = (page - 1) * per_page
-
-    allowed = _allowed_recinto_ids()
-    extra_sql, extra_params = _sql_in_clause_text("t.recinto_id", allowed)
 
-    # filtro por cuentas dentro del subquery base (i.obra_id + at.cuenta_area)
-    per_ctas = _allowed_cuentas(current_user.id, allowed)
-    extra_cta, p_cta = _clause_cuentas("i.obra_id", "at.cuenta_area", per_ctas)
-
-    WHERE = f"WHERE t.fecha_real BETWEEN :start AND :end{extra_sql}"
-    params = {"start": start, "end": end, **extra_params, **p_cta}
-
-    sql_count = text(f"SELECT COUNT(*) FROM ( {SQL_INASISTENCIAS_BASE} {extra_cta} ) t {WHERE}")
-    total = db.session.execute(sql_count, params).scalar() or 0
+    # fechas, recintos y cuentas dentro del WHERE de la base (no sobre la tabla derivada)
+    where, params = _inasistencias_where(start, end, current_scope())
+    base = sql_inasistencias(where)
+    cat = get_catalog()
+    w = window(keyset_inasistencias(cat), per_page,
+               tables=("inasistencias", "asignacion_turnos", "nomina_colaborador"))
 
+    # con cursor, la fecha del cursor también va adentro (ix_inas_fecha_obra_motivo)
     sql_page = text(f"""
-        SELECT * FROM ( {SQL_INASISTENCIAS_BASE} {extra_cta} ) t
-        {WHERE}
-        ORDER BY t.fecha_real DESC, t.recinto, t.rut
+        SELECT t.*, {w.select()} FROM ( {sql_inasistencias(where + w.inner("i.fecha_inasistencia"))} ) t
+        WHERE 1=1 {w.where}
+        ORDER BY {w.order_by}
         LIMIT :limit OFFSET :offset
     """)
-    rows = db.session.execute(sql_page, {**params, "limit": per_page, "offset": offset}).mappings().all()
+    rows = db.session.execute(sql_page, {**params, **w.params}).mappings().all()
+    rows, nav = w.finish(rows)
+    total = w.total(base, params)
 
-    items = []
-    for r in rows:
-        d = dict(r); d.pop("fecha_real", None); d.pop("recinto_id", None)
-        items.append(d)
+    items = [_inasistencia_row(r, cat.labels) for r in rows]
 
-    return jsonify({
-        "items": items,
-        "page": page,
-        "per_page": per_page,
-        "total": total,
-        "pages": (total // per_page) + (1 if total % per_page else 0)
-    })
+    return jsonify({"items": items, **w.paging(total), **nav})
 
 
 @bp.get("/reporte/inasistencias/export")
@@ -728,20 +803,15 @@ def export_inasistencias():
     if not start or not end:
         return "Parámetros 'start' y 'end' son obligatorios (YYYY-MM-DD).", 400
 
-    allowed = _allowed_recinto_ids()
-    extra_sql, extra_params = _sql_in_clause_text("t.recinto_id", allowed)
-
-    per_ctas = _allowed_cuentas(current_user.id, allowed)
-    extra_cta, p_cta = _clause_cuentas("i.obra_id", "at.cuenta_area", per_ctas)
-
+    where, params = _inasistencias_where(start, end, current_scope())
+    cat = get_catalog()
     sql = text(f"""
-        SELECT * FROM ( {SQL_INASISTENCIAS_BASE} {extra_cta} ) t
-        WHERE t.fecha_real BETWEEN :start AND :end{extra_sql}
-        ORDER BY t.fecha_real DESC, t.recinto, t.rut
+        SELECT t.* FROM ( {sql_inasistencias(where)} ) t
+        ORDER BY {keyset_inasistencias(cat).order_by()}
     """)
-    rows = db.session.execute(sql, {"start": start, "end": end, **extra_params, **p_cta}).mappings().all()
+    rows = db.session.execute(sql, params).mappings().all()
 
-    df = pd.DataFrame([dict(r) for r in rows]).drop(columns=["fecha_real", "recinto_id"], errors="ignore")
+    df = pd.DataFrame([_inasistencia_row(r, cat.labels) for r in rows])
     buf = BytesIO()
     fname = f"inasistencias_{start}_a_{end}"
 
@@ -776,45 +846,49 @@ def reporte_horas_extras():
 
 @bp.get("/api/horas-extras")
 @login_required
+@tracked
+@conditional("horas_extras_diario", "asistencia")
+@cached_json("horas_extras_diario", "asistencia")
 def api_horas_extras():
     start = (request.args.get("start") or "").strip()
     end   = (request.args.get("end") or "").strip()
     if not start or not end:
         return jsonify({"error": "Parámetros 'start' y 'end' son obligatorios (YYYY-MM-DD)."}), 400
 
-    try: page = max(int(request.args.get("page", 1)), 1)
-    except: page = 1
     try: per_page = int(request.args.get("per_page", 30))
     except: per_page = 30
     per_page = max(1, min(per_page, 200))
-    offset = (page - 1) * per_page
 
     # --- permisos por recintos
-    allowed = _allowed_recinto_ids()
+    scope = current_scope()
+    allowed = scope.recinto_ids
     extra_asist, p_asist = _sql_in_clause_text("a.id_recinto", allowed)
 
     # --- NUEVO: permisos por cuentas (pares recinto-cuenta)
-    per_ctas = _allowed_cuentas(current_user.id, allowed)
-    extra_cta, p_cta = _clause_cuentas("a.id_recinto", "a.cuenta_area", per_ctas)
+    per_ctas = scope.cuentas_por_recinto
+    extra_cta, p_cta = _scope_predicate("a.id_recinto", "a.cuenta_area", per_ctas, uid=scope.materialized_uid)
 
     WHERE = f"""
-      WHERE DATE(he.fecha) BETWEEN :start AND :end
+      WHERE he.fecha >= :start AND he.fecha < :end + INTERVAL 1 DAY
         {extra_asist}
         {extra_cta}
     """
     params = {"start": start, "end": end, **p_asist, **p_cta}
+    w = window(KEYSET_HORAS_EXTRAS, per_page, tables=("horas_extras_diario", "asistencia"))
 
-    sql_count = text(f"""
-      SELECT COUNT(*) FROM (
-        SELECT he.dni_fecha_recinto
-        FROM horas_extras_diario he
-        LEFT JOIN asistencia a
-          ON a.rut_fecha_recinto = he.dni_fecha_recinto
-        {WHERE}
-        GROUP BY he.dni_fecha_recinto, he.fecha
-      ) q
-    """)
-    total = db.session.execute(sql_count, params).scalar() or 0
+    # un solo conjunto (FROM / WHERE / GROUP BY) para la página y para el total;
+    # el predicado del cursor va antes del GROUP BY (la clave son columnas agrupadas)
+    FROM_WHERE = f"""
+      FROM horas_extras_diario he
+      LEFT JOIN asistencia a
+        ON a.join_key = he.join_key
+       AND a.rut_fecha_recinto = he.dni_fecha_recinto
+      {WHERE}
+    """
+    GROUP_BY = """
+      GROUP BY a.rut_trabajador, a.nombre, a.apellido_paterno, a.apellido_materno,
+               a.nombre_recinto, a.cargo_resumido, a.cuenta_area, he.fecha
+    """
 
     sql_page = text(f"""
       SELECT
@@ -824,23 +898,19 @@ def api_horas_extras():
         DATE_FORMAT(he.fecha, '%d/%m/%Y')                                 AS fecha,
         a.cargo_resumido                                                  AS cargo,
         a.cuenta_area                                                     AS cuenta_area,
-        ROUND(SUM(he.horas_total), 2)                                     AS horas_extras
-      FROM horas_extras_diario he
-      LEFT JOIN asistencia a
-        ON a.rut_fecha_recinto = he.dni_fecha_recinto
-      {WHERE}
-      GROUP BY a.rut_trabajador, a.nombre, a.apellido_paterno, a.apellido_materno,
-               a.nombre_recinto, a.cargo_resumido, a.cuenta_area, he.fecha
-      ORDER BY he.fecha DESC, recinto, dni
+        ROUND(SUM(he.horas_total), 2)                                     AS horas_extras,
+        {w.select()}
+      {FROM_WHERE}
+        {w.where}
+      {GROUP_BY}
+      ORDER BY {w.order_by}
       LIMIT :limit OFFSET :offset
     """)
-    rows = db.session.execute(sql_page, {**params, "limit": per_page, "offset": offset}).mappings().all()
+    rows = db.session.execute(sql_page, {**params, **w.params}).mappings().all()
+    items, nav = w.finish(rows)
+    total = w.total(f"SELECT 1 {FROM_WHERE} {GROUP_BY}", params)
 
-    return jsonify({
-        "items": [dict(r) for r in rows],
-        "page": page, "per_page": per_page, "total": total,
-        "pages": (total // per_page) + (1 if total % per_page else 0)
-    })
+    return jsonify({"items": items, **w.paging(total), **nav})
 
 
 @bp.get("/reporte/horas-extras/export")
@@ -852,15 +922,16 @@ def export_horas_extras():
         return "Parámetros 'start' y 'end' son obligatorios (YYYY-MM-DD).", 400
 
     # --- permisos por recintos
-    allowed = _allowed_recinto_ids()
+    scope = current_scope()
+    allowed = scope.recinto_ids
     extra_asist, p_asist = _sql_in_clause_text("a.id_recinto", allowed)
 
     # --- NUEVO: permisos por cuentas (pares recinto-cuenta)
-    per_ctas = _allowed_cuentas(current_user.id, allowed)
-    extra_cta, p_cta = _clause_cuentas("a.id_recinto", "a.cuenta_area", per_ctas)
+    per_ctas = scope.cuentas_por_recinto
+    extra_cta, p_cta = _scope_predicate("a.id_recinto", "a.cuenta_area", per_ctas, uid=scope.materialized_uid)
 
     WHERE = f"""
-      WHERE DATE(he.fecha) BETWEEN :start AND :end
+      WHERE he.fecha >= :start AND he.fecha < :end + INTERVAL 1 DAY
         {extra_asist}
         {extra_cta}
     """
@@ -876,7 +947,8 @@ def export_horas_extras():
         ROUND(SUM(he.horas_total), 2)                                     AS horas_extras
       FROM horas_extras_diario he
       LEFT JOIN asistencia a
-        ON a.rut_fecha_recinto = he.dni_fecha_recinto
+        ON a.join_key = he.join_key
+       AND a.rut_fecha_recinto = he.dni_fecha_recinto
       {WHERE}
       GROUP BY a.rut_trabajador, a.nombre, a.apellido_paterno, a.apellido_materno,
                a.nombre_recinto, a.cargo_resumido, a.cuenta_area, he.fecha
@@ -916,6 +988,8 @@ def export_horas_extras():
 
 @bp.get("/presentismo")
 @login_required
+@tracked
+@conditional("asistencia", "inasistencias")
 def presentismo():
     def _pct2(p, a):
         p = int(p or 0); a = int(a or 0); t = p + a
@@ -935,7 +1009,7 @@ def presentismo():
     week_start = (today - timedelta(days=weekday)).isoformat()
     week_end   = (today + timedelta(days=(6 - weekday))).isoformat()
 
-    allowed = None if _user_is_super() else set(get_allowed_recintos_obra_ids(current_user.id))
+    allowed = current_scope().recinto_ids
     if rid:
         enforce_rid_allowed(rid)
 
@@ -959,14 +1033,14 @@ def presentismo():
         FROM (
           SELECT COUNT(*) AS presentes, 0 AS ausentes
           FROM asistencia a
-          WHERE DATE(a.fecha_base) BETWEEN :mes_ini AND :mes_fin
+          WHERE a.fecha_base >= :mes_ini AND a.fecha_base < :mes_fin + INTERVAL 1 DAY
             AND a.entrada IS NOT NULL
             AND (:rid IS NULL OR a.id_recinto = :rid)
             {extraA}
           UNION ALL
           SELECT 0 AS presentes, COUNT(*) AS ausentes
           FROM inasistencias i
-          WHERE DATE(i.fecha_inasistencia) BETWEEN :mes_ini AND :mes_fin
+          WHERE i.fecha_inasistencia >= :mes_ini AND i.fecha_inasistencia < :mes_fin + INTERVAL 1 DAY
             AND (:rid IS NULL OR i.obra_id = :rid)
             {extraI}
         ) t
@@ -977,14 +1051,14 @@ def presentismo():
         FROM (
           SELECT COUNT(*) AS presentes, 0 AS ausentes
           FROM asistencia a
-          WHERE DATE(a.fecha_base) BETWEEN :sem_ini AND :sem_fin
+          WHERE a.fecha_base >= :sem_ini AND a.fecha_base < :sem_fin + INTERVAL 1 DAY
             AND a.entrada IS NOT NULL
             AND (:rid IS NULL OR a.id_recinto = :rid)
             {extraA}
           UNION ALL
           SELECT 0 AS presentes, COUNT(*) AS ausentes
           FROM inasistencias i
-          WHERE DATE(i.fecha_inasistencia) BETWEEN :sem_ini AND :sem_fin
+          WHERE i.fecha_inasistencia >= :sem_ini AND i.fecha_inasistencia < :sem_fin + INTERVAL 1 DAY
             AND (:rid IS NULL OR i.obra_id = :rid)
             {extraI}
         ) t
@@ -993,18 +1067,12 @@ def presentismo():
     sql_recinto_uno = text("""
         SELECT
           :rid AS rid,
-          CASE :rid
-            WHEN 14168 THEN 'PG CD' WHEN 14184 THEN 'BAT LO BOZA' WHEN 14186 THEN 'UL CD'
-            WHEN 14367 THEN 'PG VAS' WHEN 14368 THEN 'BAT CASABLANCA' WHEN 14369 THEN 'UL VAS'
-            WHEN 14370 THEN 'PG BMP' WHEN 14818 THEN 'NOVICIADO'     WHEN 16256 THEN 'PANAMERICANA'
-            ELSE CONCAT('OBRA ', :rid)
-          END AS recinto,
           (SELECT COUNT(*) FROM asistencia a
-            WHERE DATE(a.fecha_base) BETWEEN :desde AND :hasta
+            WHERE a.fecha_base >= :desde AND a.fecha_base < :hasta + INTERVAL 1 DAY
               AND a.entrada IS NOT NULL
               AND a.id_recinto = :rid) AS presentes,
           (SELECT COUNT(*) FROM inasistencias i
-            WHERE DATE(i.fecha_inasistencia) BETWEEN :desde AND :hasta
+            WHERE i.fecha_inasistencia >= :desde AND i.fecha_inasistencia < :hasta + INTERVAL 1 DAY
               AND i.obra_id = :rid) AS ausentes
     """)
 
@@ -1012,7 +1080,7 @@ def presentismo():
         WITH pres AS (
           SELECT a.id_recinto AS rid, COUNT(*) AS presentes
           FROM asistencia a
-          WHERE DATE(a.fecha_base) BETWEEN :desde AND :hasta
+          WHERE a.fecha_base >= :desde AND a.fecha_base < :hasta + INTERVAL 1 DAY
             AND a.entrada IS NOT NULL
             {extraA}
           GROUP BY a.id_recinto
@@ -1020,32 +1088,25 @@ def presentismo():
         aus AS (
           SELECT i.obra_id AS rid, COUNT(*) AS ausentes
           FROM inasistencias i
-          WHERE DATE(i.fecha_inasistencia) BETWEEN :desde AND :hasta
+          WHERE i.fecha_inasistencia >= :desde AND i.fecha_inasistencia < :hasta + INTERVAL 1 DAY
             {extraI}
           GROUP BY i.obra_id
         ),
         rids AS ( SELECT rid FROM pres UNION SELECT rid FROM aus )
         SELECT
           r.rid AS rid,
-          CASE r.rid
-            WHEN 14168 THEN 'PG CD' WHEN 14184 THEN 'BAT LO BOZA' WHEN 14186 THEN 'UL CD'
-            WHEN 14367 THEN 'PG VAS' WHEN 14368 THEN 'BAT CASABLANCA' WHEN 14369 THEN 'UL VAS'
-            WHEN 14370 THEN 'PG BMP' WHEN 14818 THEN 'NOVICIADO'     WHEN 16256 THEN 'PANAMERICANA'
-            ELSE CONCAT('OBRA ', r.rid)
-          END AS recinto,
           COALESCE(p.presentes,0) AS presentes,
           COALESCE(a.ausentes,0)  AS ausentes
         FROM rids r
         LEFT JOIN pres p ON p.rid = r.rid
         LEFT JOIN aus  a ON a.rid = r.rid
-        ORDER BY (COALESCE(p.presentes,0)+COALESCE(a.ausentes,0)) DESC, recinto
     """)
 
     sql_meses = text(f"""
         WITH m_presentes AS (
           SELECT MONTH(a.fecha_base) AS m, COUNT(*) AS presentes
           FROM asistencia a
-          WHERE YEAR(a.fecha_base)=:y AND a.entrada IS NOT NULL
+          WHERE a.fecha_base >= MAKEDATE(:y, 1) AND a.fecha_base < MAKEDATE(:y + 1, 1) AND a.entrada IS NOT NULL
             AND (:rid IS NULL OR a.id_recinto = :rid)
             {extraA}
           GROUP BY MONTH(a.fecha_base)
@@ -1053,7 +1114,7 @@ def presentismo():
         m_ausentes AS (
           SELECT MONTH(i.fecha_inasistencia) AS m, COUNT(*) AS ausentes
           FROM inasistencias i
-          WHERE YEAR(i.fecha_inasistencia)=:y
+          WHERE i.fecha_inasistencia >= MAKEDATE(:y, 1) AND i.fecha_inasistencia < MAKEDATE(:y + 1, 1)
             AND (:rid IS NULL OR i.obra_id = :rid)
             {extraI}
           GROUP BY MONTH(i.fecha_inasistencia)
@@ -1078,24 +1139,26 @@ def presentismo():
         ORDER BY cal.mn
     """)
 
-    with db.engine.begin() as conn:
-        r_mes = conn.execute(sql_mes, params_mes).mappings().first() or {"presentes":0,"ausentes":0}
-        r_sem = conn.execute(sql_sem, params_sem).mappings().first() or {"presentes":0,"ausentes":0}
-        if rid:
-            recs = conn.execute(sql_recinto_uno, params_rango).mappings().all()
-        else:
-            recs = conn.execute(sql_recintos_ranking, params_rango).mappings().all()
-        meses = conn.execute(sql_meses, params_year).mappings().all()
+    res = remember("presentismo", lambda: fetch_many({
+        "mes":   (sql_mes, params_mes, "first"),
+        "sem":   (sql_sem, params_sem, "first"),
+        "recs":  (sql_recinto_uno if rid else sql_recintos_ranking, params_rango),
+        "meses": (sql_meses, params_year),
+    }), tables=("asistencia", "inasistencias"))
+    r_mes = res["mes"] or {"presentes":0,"ausentes":0}
+    r_sem = res["sem"] or {"presentes":0,"ausentes":0}
+    recs, meses = res["recs"], res["meses"]
 
     mes_p = int(r_mes["presentes"] or 0); mes_a = int(r_mes["ausentes"] or 0)
     sem_p = int(r_sem["presentes"] or 0); sem_a = int(r_sem["ausentes"] or 0)
 
+    labels = get_catalog().labels
     recintos_py = []
     for r in recs:
         presentes = int(r.get("presentes") or 0)
         ausentes  = int(r.get("ausentes")  or 0)
         rid_val   = int(r.get("rid") or 0)
-        recinto_n = str(r.get("recinto") or "")
+        recinto_n = recinto_label(rid_val, labels) or ""
         total = presentes + ausentes
         pct_pres = round(presentes * 100.0 / total, 1) if total else 0.0
         pct_aus  = round(ausentes  * 100.0 / total, 1) if total else 0.0
@@ -1105,6 +1168,9 @@ def presentismo():
             "total": total, "pct_pres": pct_pres, "pct_aus": pct_aus
         })
 
+    # ranking: más dotación primero y luego por nombre (antes ORDER BY en SQL sobre el CASE)
+    recintos_py.sort(key=lambda x: (-x["total"], x["recinto"]))
+
     meses_py = [{"mes": str(m["mes"]), "presentes": int(m["presentes"] or 0), "ausentes": int(m["ausentes"] or 0)} for m in meses]
     selected_name = recintos_py[0]["recinto"] if rid and recintos_py else None
 
@@ -1120,6 +1186,72 @@ def presentismo():
     return render_template("dashboard/presentismo.html", **vm)
 
 
+@bp.get("/api/presentismo/heatmap")
+@login_required
+@conditional("asistencia", "inasistencias")
+@cached_json("asistencia", "inasistencias")
+def api_presentismo_heatmap():
+    """
+    % de presentismo por recinto x día del rango, en UNA pasada agrupada
+    (fecha, recinto) sobre el rollup diario, pivotada a matrices densas.
+    Celdas sin registros = null. Respeta recintos y pares recinto-cuenta del alcance.
+    """
+    try:
+        desde = date.fromisoformat((request.args.get("desde") or date.today().replace(day=1).isoformat()).strip())
+        hasta = date.fromisoformat((request.args.get("hasta") or date.today().isoformat()).strip())
+    except ValueError:
+        return jsonify({"error": "Parámetros 'desde' y 'hasta' deben ser YYYY-MM-DD."}), 400
+    n_dias = (hasta - desde).days + 1
+    max_dias = current_app.config.get("HEATMAP_MAX_DAYS", 366)
+    if n_dias < 1 or n_dias > max_dias:
+        return jsonify({"error": f"Rango inválido: entre 1 y {max_dias} días."}), 400
+    cuenta_area = (request.args.get("cuenta_area") or "").strip()
+
+    scope = current_scope()
+    extra_rec, p_rec = _sql_in_clause_text("d.id_recinto", scope.recinto_ids)
+    extra_cta, p_cta = _scope_predicate("d.id_recinto", "d.cuenta_area", scope.cuentas_por_recinto,
+                                        uid=scope.materialized_uid)
+    rows = db.session.execute(text(f"""
+        SELECT d.fecha, d.id_recinto AS rid,
+               SUM(d.presentes) AS presentes, SUM(d.ausentes) AS ausentes
+        FROM attendance_daily d
+        WHERE d.fecha BETWEEN :desde AND :hasta
+          {extra_rec}
+          {extra_cta}
+          AND (:cta = '' OR d.cuenta_area = :cta)
+        GROUP BY d.fecha, d.id_recinto
+    """), {"desde": desde, "hasta": hasta, "cta": cuenta_area, **p_rec, **p_cta}).all()
+
+    # filas: recintos por nombre (None al inicio, como el resumen); columnas: días del rango
+    labels = get_catalog().labels
+    rids = sorted({int(r.rid) for r in rows},
+                  key=lambda rid: (recinto_label(rid, labels) is not None, (recinto_label(rid, labels) or "").casefold()))
+    fila = {rid: i for i, rid in enumerate(rids)}
+
+    pres = np.zeros((len(rids), n_dias), dtype=np.int64)
+    aus = np.zeros_like(pres)
+    if rows:
+        ri = np.fromiter((fila[int(r.rid)] for r in rows), dtype=np.intp, count=len(rows))
+        di = np.fromiter(((r.fecha - desde).days for r in rows), dtype=np.intp, count=len(rows))
+        pres[ri, di] = np.fromiter((int(r.presentes or 0) for r in rows), dtype=np.int64, count=len(rows))
+        aus[ri, di] = np.fromiter((int(r.ausentes or 0) for r in rows), dtype=np.int64, count=len(rows))
+
+    total = pres + aus
+    pct = np.full(total.shape, np.nan)
+    np.divide(pres * 100.0, total, out=pct, where=total > 0)
+    pct = np.round(pct, 1)
+
+    return jsonify({
+        "desde": desde.isoformat(),
+        "hasta": hasta.isoformat(),
+        "dias": [(desde + timedelta(days=i)).isoformat() for i in range(n_dias)],
+        "recintos": [{"rid": rid, "recinto": recinto_label(rid, labels)} for rid in rids],
+        "pct": np.where(np.isnan(pct), None, pct).tolist(),
+        "presentes": pres.tolist(),
+        "ausentes": aus.tolist(),
+    })
+
+
 # ========= Vistas simples =========
 
 @bp.get("/reporte/movimientos")
@@ -1144,27 +1276,9 @@ def api_nomina_cuentas():
     if not end:
         end = today.isoformat()
 
-    allowed = _allowed_recinto_ids() or []
-    per_ctas = _allowed_cuentas(current_user.id, allowed) or []
-
-    cuentas_set = set()
-
-    # Normalizador para cualquier forma de (_allowed_cuentas)
-    def _extract_cta(item):
-        # tupla/lista (rid, cta)
-        if isinstance(item, (tuple, list)) and len(item) >= 2:
-            return item[1]
-        # dict {"recinto_id":..., "cuenta_area":...} o {"rid":..., "cta":...}
-        if isinstance(item, dict):
-            return item.get("cuenta_area") or item.get("cta") or item.get("account") or item.get("cuenta")
-        # objeto con atributos
-        c = getattr(item, "cuenta_area", None) or getattr(item, "cta", None) or getattr(item, "account", None)
-        return c
-
-    for it in per_ctas:
-        cta = _extract_cta(it)
-        if cta:
-            cuentas_set.add(str(cta).strip())
+    scope = current_scope()
+    allowed = scope.recinto_ids
+    cuentas_set = set(scope.cuentas_flat or ())
 
     # Fallback: si no obtuvimos nada de permisos, miramos asistencia
     if not cuentas_set:
@@ -1173,7 +1287,7 @@ def api_nomina_cuentas():
             SELECT DISTINCT a.cuenta_area
             FROM asistencia a
             WHERE a.cuenta_area IS NOT NULL AND a.cuenta_area <> ''
-              AND DATE(a.fecha_base) BETWEEN :start AND :end
+              AND a.fecha_base >= :start AND a.fecha_base < :end + INTERVAL 1 DAY
               {extra_asist}
             ORDER BY a.cuenta_area
         """
@@ -1199,6 +1313,9 @@ def nomina():
 
 @bp.get("/api/nomina")
 @login_required
+@tracked
+@conditional("asistencia", "inasistencias", "asignacion_turnos")
+@cached_json("asistencia", "inasistencias", "asignacion_turnos")
 def api_nomina():
     start = (request.args.get("start") or "").strip()
     end   = (request.args.get("end") or "").strip()
@@ -1207,21 +1324,21 @@ def api_nomina():
 
     cuenta_area = (request.args.get("cuenta_area") or "").strip()
 
-    # paginación
-    page = max(1, request.args.get("page", type=int) or 1)
+    # paginación (?page= o ?cursor=, ver app.pagination)
     per_page = request.args.get("per_page", type=int) or 100
     per_page = min(max(per_page, 10), 500)  # clamp 10..500
-    offset = (page - 1) * per_page
+    w = window(KEYSET_NOMINA, per_page, tables=("asistencia", "inasistencias", "asignacion_turnos"))
 
     # permisos (igual que antes)
-    allowed = _allowed_recinto_ids()
+    scope = current_scope()
+    allowed = scope.recinto_ids
     extra_asist, p_asist = _sql_in_clause_text("a.id_recinto", allowed)
     extra_inas,  p_inas  = _sql_in_clause_text("i.obra_id", allowed)
-    per_ctas = _allowed_cuentas(current_user.id, allowed)
-    extra_cta_asist, p_cta_asist = _clause_cuentas("a.id_recinto", "a.cuenta_area", per_ctas)
-    extra_cta_inas,  p_cta_inas  = _clause_cuentas("i.obra_id", "at.cuenta_area",  per_ctas)
+    per_ctas = scope.cuentas_por_recinto
+    extra_cta_asist, p_cta_asist = _scope_predicate("a.id_recinto", "a.cuenta_area", per_ctas, uid=scope.materialized_uid)
+    extra_cta_inas,  p_cta_inas  = _scope_predicate("i.obra_id", "at.cuenta_area", per_ctas, uid=scope.materialized_uid)
 
-    # CTE base (reutilizable para COUNT y PAGE)
+    # CTE base (página y, si hace falta, COUNT)
     BASE = f"""
     WITH asist AS (
         SELECT
@@ -1232,7 +1349,7 @@ def api_nomina():
             a.cargo_resumido AS cargo,
             COUNT(*) AS dias_asistidos
         FROM asistencia a
-        WHERE DATE(a.fecha_base) BETWEEN :start AND :end
+        WHERE a.fecha_base >= :start AND a.fecha_base < :end + INTERVAL 1 DAY
           AND a.entrada IS NOT NULL
           {extra_asist}
           {extra_cta_asist}
@@ -1247,8 +1364,9 @@ def api_nomina():
             COUNT(*) AS dias_inasistentes
         FROM inasistencias i
         JOIN asignacion_turnos at
-          ON i.uid_inasistencia = at.uid_rut_dia_obra
-        WHERE DATE(i.fecha_inasistencia) BETWEEN :start AND :end
+          ON i.join_key = at.join_key
+         AND i.uid_inasistencia = at.uid_rut_dia_obra
+        WHERE i.fecha_inasistencia >= :start AND i.fecha_inasistencia < :end + INTERVAL 1 DAY
           {extra_inas}
           {extra_cta_inas}
           AND (:cta = '' OR at.cuenta_area = :cta)
@@ -1272,30 +1390,29 @@ def api_nomina():
     )
     """
 
-    # total
-    COUNT_SQL = BASE + "SELECT COUNT(*) AS total FROM final;"
     params = {"start": start, "end": end, "cta": cuenta_area,
               **p_asist, **p_inas, **p_cta_asist, **p_cta_inas}
-    total = db.session.execute(text(COUNT_SQL), params).scalar() or 0
-    pages = (total + per_page - 1) // per_page if total else 0
 
-    # página
-    PAGE_SQL = BASE + """
-    SELECT * FROM final
-    ORDER BY recinto, cuenta_area, nombre
+    # página (con COUNT(*) OVER() si el total no está guardado)
+    PAGE_SQL = BASE + f"""
+    SELECT final.*, {w.select()} FROM final
+    WHERE 1=1 {w.where}
+    ORDER BY {w.order_by}
     LIMIT :limit OFFSET :offset;
     """
-    rows = db.session.execute(text(PAGE_SQL), {**params, "limit": per_page, "offset": offset}).mappings().all()
+    rows = db.session.execute(text(PAGE_SQL), {**params, **w.params}).mappings().all()
+    items, nav = w.finish(rows)
+    total = w.total(BASE + "SELECT rut FROM final", params)
 
     return jsonify({
-        "items": [dict(r) for r in rows],
-        "page": page, "per_page": per_page, "pages": pages,
-        "total": total, "start": start, "end": end
+        "items": items, **w.paging(total), **nav,
+        "start": start, "end": end
     })
 
 
 @bp.get("/nomina/export")
 @login_required
+@tracked
 def export_nomina():
     """
     Exporta la nómina consolidada a XLSX o CSV.
@@ -1307,12 +1424,13 @@ def export_nomina():
 
     cuenta_area = (request.args.get("cuenta_area") or "").strip()
 
-    allowed = _allowed_recinto_ids()
+    scope = current_scope()
+    allowed = scope.recinto_ids
     extra_asist, p_asist = _sql_in_clause_text("a.id_recinto", allowed)
     extra_inas,  p_inas  = _sql_in_clause_text("i.obra_id", allowed)
-    per_ctas = _allowed_cuentas(current_user.id, allowed)
-    extra_cta_asist, p_cta_asist = _clause_cuentas("a.id_recinto", "a.cuenta_area", per_ctas)
-    extra_cta_inas,  p_cta_inas  = _clause_cuentas("i.obra_id", "at.cuenta_area", per_ctas)
+    per_ctas = scope.cuentas_por_recinto
+    extra_cta_asist, p_cta_asist = _scope_predicate("a.id_recinto", "a.cuenta_area", per_ctas, uid=scope.materialized_uid)
+    extra_cta_inas,  p_cta_inas  = _scope_predicate("i.obra_id", "at.cuenta_area", per_ctas, uid=scope.materialized_uid)
 
     sql = f"""
     WITH asist AS (
@@ -1324,7 +1442,7 @@ def export_nomina():
             a.cargo_resumido AS cargo,
             COUNT(*) AS dias_asistidos
         FROM asistencia a
-        WHERE DATE(a.fecha_base) BETWEEN :start AND :end
+        WHERE a.fecha_base >= :start AND a.fecha_base < :end + INTERVAL 1 DAY
           AND a.entrada IS NOT NULL
           {extra_asist}
           {extra_cta_asist}
@@ -1339,8 +1457,9 @@ def export_nomina():
             COUNT(*) AS dias_inasistentes
         FROM inasistencias i
         JOIN asignacion_turnos at
-          ON i.uid_inasistencia = at.uid_rut_dia_obra
-        WHERE DATE(i.fecha_inasistencia) BETWEEN :start AND :end
+          ON i.join_key = at.join_key
+         AND i.uid_inasistencia = at.uid_rut_dia_obra
+        WHERE i.fecha_inasistencia >= :start AND i.fecha_inasistencia < :end + INTERVAL 1 DAY
           {extra_inas}
           {extra_cta_inas}
           AND (:cta = '' OR at.cuenta_area = :cta)
@@ -1366,8 +1485,14 @@ def export_nomina():
     params = {"start": start, "end": end, "cta": cuenta_area,
               **p_asist, **p_inas, **p_cta_asist, **p_cta_inas}
 
-    rows = db.session.execute(text(sql), params).mappings().all()
-    df = pd.DataFrame([dict(r) for r in rows])
+    # cacheado por alcance: a fin de mes todos exportan el mismo período (y `flask cache warm` lo precalcula);
+    # son filas crudas de todo el período: solo en caché compartida y bajo CACHE_EXPORT_MAX_BYTES
+    def fetch():
+        rows = [dict(r) for r in db.session.execute(text(sql), params).mappings().all()]
+        return shareable(rows, current_app.config.get("CACHE_EXPORT_MAX_BYTES", 32 * 1024 * 1024))
+
+    rows = remember("nomina.export", fetch, tables=("asistencia", "inasistencias", "asignacion_turnos"))
+    df = pd.DataFrame(rows)
 
     buf = BytesIO()
     fname = f"nomina_{start}_a_{end}"
@@ -1439,29 +1564,9 @@ def headcount_on(when: date, cuenta: str | None = None, cargo: str | None = None
     return q.scalar() or 0
 
 
-@bp.route("/rotacion", methods=["GET"])
-@login_required
-def rotacion_filtros():
-    # -- Rango por defecto: mes en curso --
-    today = date.today()
-    ini_def = date(today.year, today.month, 1)
-    fin_def = (date(today.year + (today.month // 12), (today.month % 12) + 1, 1)
-               - timedelta(days=1))
-
-    ini = parse_ddmmyyyy(request.args.get("desde")) or ini_def
-    fin = parse_ddmmyyyy(request.args.get("hasta")) or fin_def
-
-    # ahora 'cuenta' = centro_costo_area
-    cuenta = (request.args.get("cuenta") or "").strip() or None
-    cargo  = (request.args.get("cargo") or "").strip() or None
-
-    # --- PERMISOS: set de cuentas visibles para el usuario ---
-    allowed_ctas = _allowed_cuentas_flat_for_current_user()  # None / set() / {'PGC','BRF',...}
-
-    # Si el usuario seleccionó una cuenta explícita, validar que tenga acceso
-    if cuenta and (allowed_ctas is not None) and (cuenta not in allowed_ctas):
-        abort(403)
-
+def _rotacion_datos(ini: date, fin: date, cuenta: str | None, cargo: str | None,
+                    allowed_ctas) -> dict:
+    """Opciones de filtros, KPIs y series de /rotacion (valores planos, cacheables)."""
     # ---------- Opciones de SELECTS (cuentas y cargos) ----------
     # Cuentas visibles (desde centro_costo_area)
     cq = (db.session.query(Desvinculacion.centro_costo_area)
@@ -1621,12 +1726,47 @@ def rotacion_filtros():
         desv_cuenta.append(int(d_cnt))
         rot_cuenta.append(round(urot, 2))
 
-    return render_template(
-        "dashboard/rotacion_filtros.html",
-        ini=ini, fin=fin, cuenta=cuenta, cargo=cargo,
+    return dict(
         cuentas_opts=cuentas_opts, cargos_opts=cargos_opts,
         d=d, Ai=Ai, Af=Af, avg_dot=avg_dot, rotacion=rotacion,
         labels_m=labels_m, activos_m=activos_m, desv_m=desv_m, rot_m=rot_m,
         labels_cargo=labels_cargo, desv_cargo=desv_cargo, rot_cargo=rot_cargo,
         labels_cuenta=labels_cuenta, desv_cuenta=desv_cuenta, rot_cuenta=rot_cuenta,
+    )
+
+
+@bp.route("/rotacion", methods=["GET"])
+@login_required
+@tracked
+def rotacion_filtros():
+    # -- Rango por defecto: mes en curso --
+    today = date.today()
+    ini_def = date(today.year, today.month, 1)
+    fin_def = (date(today.year + (today.month // 12), (today.month % 12) + 1, 1)
+               - timedelta(days=1))
+
+    ini = parse_ddmmyyyy(request.args.get("desde")) or ini_def
+    fin = parse_ddmmyyyy(request.args.get("hasta")) or fin_def
+
+    # ahora 'cuenta' = centro_costo_area
+    cuenta = (request.args.get("cuenta") or "").strip() or None
+    cargo  = (request.args.get("cargo") or "").strip() or None
+
+    # --- PERMISOS: set de cuentas visibles para el usuario ---
+    allowed_ctas = current_scope().cuentas_flat  # None / set() / {'PGC','BRF',...}
+
+    # Si el usuario seleccionó una cuenta explícita, validar que tenga acceso
+    if cuenta and (allowed_ctas is not None) and (cuenta not in allowed_ctas):
+        abort(403)
+
+    # cacheado por alcance: las consultas de headcount son muchas y a fin de mes
+    # todos miran el mismo período (`flask cache warm` lo precalcula)
+    datos = remember("rotacion",
+                     lambda: _rotacion_datos(ini, fin, cuenta, cargo, allowed_ctas),
+                     tables=("desvinculaciones",))
+
+    return render_template(
+        "dashboard/rotacion_filtros.html",
+        ini=ini, fin=fin, cuenta=cuenta, cargo=cargo,
+        **datos,
     )
\ No newline at end of file
@@ -9,8 +9,9 @@ from werkzeug.utils import secure_filename
 
 from . import bp
 from app.extensions import db
-from app.models import Desvinculacion, Cuenta, UserRecintoCuenta, UserCuenta  # <-- UserCuenta = user_cuentas
-from flask_login import login_required, current_user
+from app.models import Desvinculacion
+from app.permissions import current_scope
+from flask_login import login_required
 
 
 # ========================== Utilitarios ==========================
@@ -61,34 +62,6 @@ def _parse_date(s: str | None):
     return None
 
 
-# ========================== Permisos ==========================
-def _allowed_area_codes_for_user(user) -> set[str]:
-    """
-    Retorna SIEMPRE un set con los CÓDIGOS de área/cuenta (BAT, BRF, VAS, ...).
-    Fuente: user_cuentas (globales). Si no tiene, devuelve set() -> no ve nada.
-    """
-    rows = (
-        db.session.query(Cuenta.code)
-        .join(UserCuenta, UserCuenta.cuenta_id == Cuenta.id)
-        .filter(UserCuenta.user_id == user.id, UserCuenta.is_active.is_(True))
-        .distinct()
-        .all()
-    )
-    codes = {r[0] for r in rows}
-
-    # (Opcional) Si además quieres sumar permisos por recinto-cuenta, descomenta:
-    # rc_rows = (
-    #     db.session.query(Cuenta.code)
-    #     .join(UserRecintoCuenta, UserRecintoCuenta.cuenta_id == Cuenta.id)
-    #     .filter(UserRecintoCuenta.user_id == user.id, UserRecintoCuenta.is_active.is_(True))
-    #     .distinct()
-    #     .all()
-    # )
-    # codes |= {r[0] for r in rc_rows}
-
-    return codes
-
-
 # ======================== LISTADO ========================
 @bp.get("/")
 @login_required
@@ -105,8 +78,8 @@ def index():
     f_desde = _parse_date(desde_raw)
     f_hasta = _parse_date(hasta_raw)
 
-    # === Áreas permitidas para el usuario (códigos tipo BAT/PGC/...) ===
-    allowed_areas = _allowed_area_codes_for_user(current_user)
+    # === Áreas permitidas para el usuario (códigos tipo BAT/PGC/...; user_cuentas) ===
+    allowed_areas = set(current_scope().area_codes)
     areas_select = sorted(allowed_areas)  # combo se llena solo con estas
 
     # Si el usuario no tiene cuentas, devolvemos la página vacía
@@ -187,7 +160,7 @@ def export_excel():
     f_hasta = _parse_date(hasta_raw)
 
     # Alcance: cuentas permitidas
-    allowed_areas = _allowed_area_codes_for_user(current_user)
+    allowed_areas = set(current_scope().area_codes)
     if not allowed_areas:
         # Export vacío pero válido
         buf = BytesIO()
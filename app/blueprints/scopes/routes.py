@@ -6,6 +6,7 @@ from sqlalchemy import or_
 
 from app.extensions import db
 from app.models import User, Recinto, Cuenta, UserRecinto, RecintoCuenta
+from app.permissions import grants_changed, rebuild_effective_scope
 
 from . import bp
 
@@ -97,16 +98,22 @@ def create():
         if not ur.is_active:
             ur.is_active = True
             ur.nivel = nivel
+            rebuild_effective_scope(user_id)
             db.session.commit()
+            grants_changed(user_id)
             flash("Asignación reactivada.", "success")
         else:
             ur.nivel = nivel
+            rebuild_effective_scope(user_id)
             db.session.commit()
+            grants_changed(user_id)
             flash("La asignación ya existía; nivel actualizado.", "info")
         return redirect(url_for("scopes.index"))
 
     db.session.add(UserRecinto(user_id=user_id, recinto_id=recinto_id, nivel=nivel, is_active=True))
+    rebuild_effective_scope(user_id)
     db.session.commit()
+    grants_changed(user_id)
     flash("Asignación creada.", "success")
     return redirect(url_for("scopes.index"))
 
@@ -122,7 +129,9 @@ def toggle():
         flash("Asignación no encontrada.", "warning")
     else:
         ur.is_active = not bool(ur.is_active)
+        rebuild_effective_scope(user_id)
         db.session.commit()
+        grants_changed(user_id)
         flash("Estado actualizado.", "success")
     return redirect(url_for("scopes.index"))
 
@@ -136,7 +145,9 @@ def delete():
     ur = db.session.get(UserRecinto, {"user_id": user_id, "recinto_id": recinto_id})
     if ur:
         db.session.delete(ur)
+        rebuild_effective_scope(user_id)
         db.session.commit()
+        grants_changed(user_id)
         flash("Asignación eliminada.", "success")
     else:
         flash("Asignación no encontrada.", "warning")
@@ -0,0 +1,432 @@
+# app/cache.py
+"""
+Caché de resultados de reportes, compartida por alcance (no por usuario).
+
+Muchos usuarios tienen exactamente las mismas cuentas en user_cuentas: la
+clave usa la huella del AccessScope (AccessScope.fingerprint), así todos
+ellos reutilizan el mismo resultado.
+
+    rows = remember("dashboard.resumen", lambda: fetch_many(...),
+                    tables=("asistencia", "inasistencias"))
+
+    @bp.get("/api/inasistencias")
+    @login_required
+    @conditional(...)
+    @cached_json("inasistencias", "asignacion_turnos")
+    def api_inasistencias(): ...
+
+- Clave: namespace + query string normalizada + huella del alcance + día.
+- Cada entrada guarda la marca de agua de datos (app.watermark): si la ingesta
+  avanzó, la entrada no sirve (miss), sin esperar al TTL.
+- TTL (CACHE_TTL) + stale-while-revalidate (CACHE_STALE_TTL): vencida pero
+  dentro de la ventana se sirve igual y se recalcula en segundo plano.
+- Backends (CACHE_BACKEND):
+    lru     memoria del worker, CACHE_LRU_MAX_BYTES y CACHE_MAX_ENTRIES (por defecto)
+    sqlite  archivo local compartido por los workers, CACHE_MAX_BYTES (en un
+            directorio 0700 del usuario del proceso: se lee con pickle)
+    redis   servidor compatible Redis (CACHE_REDIS_URL; requiere `pip install redis`),
+            el tope de tamaño lo pone maxmemory + allkeys-lru del servidor
+    none    sin caché
+- stats(): hits / stale / misses / stores / refreshes / errors del worker,
+  expuestos en /admin/cache y `flask cache stats`.
+"""
+from __future__ import annotations
+
+import hashlib
+import os
+import pickle
+import sqlite3
+import stat
+import threading
+import time
+from collections import Counter, OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date
+from functools import wraps
+
+from flask import copy_current_request_context, current_app, g, make_response, request
+
+from app.permissions import current_scope
+from app.singleflight import private_dir
+from app.watermark import data_watermark, normalized_args
+
+
+# ------------------------------ backends ------------------------------
+class LRUBackend:
+    """
+    En memoria del worker, acotado por bytes (tamaño pickle, igual que SQLiteBackend)
+    y por cantidad de entradas. Las vencidas se descartan al leerlas y al guardar.
+    Guarda el pickle, no el objeto: quien lee recibe una copia que puede modificar.
+    """
+    name = "lru"
+
+    def __init__(self, max_bytes: int = 64 * 1024 * 1024, max_entries: int = 512):
+        self.max_bytes = max(1, int(max_bytes))
+        self.max_entries = max(1, int(max_entries))
+        self._data: OrderedDict[str, tuple[float, bytes]] = OrderedDict()  # key -> (vence, pickle)
+        self._bytes = 0
+        self._lock = threading.Lock()
+
+    def _drop(self, key: str) -> None:
+        item = self._data.pop(key, None)
+        if item is not None:
+            self._bytes -= len(item[1])
+
+    def get(self, key: str):
+        with self._lock:
+            item = self._data.get(key)
+            if item is None:
+                return None
+            if item[0] <= time.time():
+                self._drop(key)
+                return None
+            self._data.move_to_end(key)
+        return pickle.loads(item[1])
+
+    def set(self, key: str, entry: tuple, expire_in: float) -> None:
+        blob = pickle.dumps(entry, protocol=pickle.HIGHEST_PROTOCOL)
+        now = time.time()
+        with self._lock:
+            self._drop(key)
+            if len(blob) > self.max_bytes:
+                return  # más grande que todo el tope: no se guarda
+            self._data[key] = (now + expire_in, blob)
+            self._bytes += len(blob)
+            for k in [k for k, (expires, _) in self._data.items() if expires <= now]:
+                self._drop(k)
+            # luego las menos usadas recientemente
+            while self._bytes > self.max_bytes or len(self._data) > self.max_entries:
+                self._drop(next(iter(self._data)))
+
+    def clear(self) -> int:
+        with self._lock:
+            n = len(self._data)
+            self._data.clear()
+            self._bytes = 0
+        return n
+
+    def info(self) -> dict:
+        with self._lock:
+            return {"entries": len(self._data), "bytes": self._bytes,
+                    "max_bytes": self.max_bytes, "max_entries": self.max_entries}
+
+
+class SQLiteBackend:
+    """Archivo SQLite local (WAL) compartido por los workers, acotado por bytes."""
+    name = "sqlite"
+
+    def __init__(self, path: str, max_bytes: int = 256 * 1024 * 1024):
+        # los valores se leen con pickle: directorio 0700 del uid del proceso y
+        # archivo propio (si no, get_backend() vuelve al LRU en memoria)
+        if not private_dir(os.path.dirname(os.path.abspath(path))):
+            raise PermissionError(f"{os.path.dirname(path)!r} no es un directorio 0700 de este usuario")
+        if os.path.lexists(path):
+            st = os.lstat(path)
+            if not stat.S_ISREG(st.st_mode) or st.st_uid != os.geteuid():
+                raise PermissionError(f"{path!r} no es un archivo de este usuario")
+        self.path = path
+        self.max_bytes = int(max_bytes)
+        self._local = threading.local()
+        self._writes = 0
+        with self._conn() as c:
+            c.execute("""
+                CREATE TABLE IF NOT EXISTS cache (
+                  key     TEXT PRIMARY KEY,
+                  expires REAL NOT NULL,
+                  size    INTEGER NOT NULL,
+                  value   BLOB NOT NULL
+                )
+            """)
+            c.execute("CREATE INDEX IF NOT EXISTS ix_cache_expires ON cache (expires)")
+
+    def _conn(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=5, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    def get(self, key: str):
+        row = self._conn().execute(
+            "SELECT value FROM cache WHERE key = ? AND expires > ?", (key, time.time())
+        ).fetchone()
+        return pickle.loads(row[0]) if row else None
+
+    def set(self, key: str, entry: tuple, expire_in: float) -> None:
+        blob = pickle.dumps(entry, protocol=pickle.HIGHEST_PROTOCOL)
+        c = self._conn()
+        c.execute("INSERT OR REPLACE INTO cache (key, expires, size, value) VALUES (?, ?, ?, ?)",
+                  (key, time.time() + expire_in, len(blob), blob))
+        self._writes += 1
+        if self._writes % 50 == 0:
+            self._evict(c)
+
+    def _evict(self, c: sqlite3.Connection) -> None:
+        c.execute("DELETE FROM cache WHERE expires <= ?", (time.time(),))
+        total = c.execute("SELECT COALESCE(SUM(size), 0) FROM cache").fetchone()[0]
+        if total <= self.max_bytes:
+            return
+        # primero las que vencen antes, hasta quedar en 90% del tope
+        excess = total - int(self.max_bytes * 0.9)
+        for key, size in c.execute("SELECT key, size FROM cache ORDER BY expires").fetchall():
+            if excess <= 0:
+                break
+            c.execute("DELETE FROM cache WHERE key = ?", (key,))
+            excess -= size
+
+    def clear(self) -> int:
+        return self._conn().execute("DELETE FROM cache").rowcount
+
+    def info(self) -> dict:
+        n, size = self._conn().execute("SELECT COUNT(*), COALESCE(SUM(size), 0) FROM cache").fetchone()
+        return {"entries": n, "bytes": size, "max_bytes": self.max_bytes, "path": self.path}
+
+
+class RedisBackend:
+    """Servidor compatible Redis; el TTL lo aplica el servidor (EX)."""
+    name = "redis"
+
+    def __init__(self, url: str, prefix: str = "intranet:cache:"):
+        import redis  # dependencia opcional
+        self._r = redis.Redis.from_url(url)
+        self.prefix = prefix
+
+    def get(self, key: str):
+        raw = self._r.get(self.prefix + key)
+        return pickle.loads(raw) if raw is not None else None
+
+    def set(self, key: str, entry: tuple, expire_in: float) -> None:
+        self._r.set(self.prefix + key, pickle.dumps(entry, protocol=pickle.HIGHEST_PROTOCOL),
+                    ex=max(1, int(expire_in)))
+
+    def clear(self) -> int:
+        n = 0
+        for k in self._r.scan_iter(match=self.prefix + "*", count=500):
+            n += self._r.delete(k)
+        return n
+
+    def info(self) -> dict:
+        mem = self._r.info("memory")
+        return {"used_memory": mem.get("used_memory"), "maxmemory": mem.get("maxmemory"),
+                "policy": mem.get("maxmemory_policy")}
+
+
+# ------------------------------ estado ------------------------------
+_backend = None
+_backend_lock = threading.Lock()
+_stats: Counter = Counter()
+_stats_lock = threading.Lock()
+_refreshing: set[str] = set()
+_refresher: ThreadPoolExecutor | None = None
+
+
+def _bump(name: str) -> None:
+    with _stats_lock:
+        _stats[name] += 1
+
+
+def get_backend():
+    """Backend del proceso según CACHE_BACKEND (None = desactivada)."""
+    global _backend
+    if _backend is not None:
+        return _backend or None
+    cfg = current_app.config
+    kind = (cfg.get("CACHE_BACKEND") or "lru").lower()
+    with _backend_lock:
+        if _backend is None:
+            try:
+                if kind == "none":
+                    _backend = False
+                elif kind == "sqlite":
+                    _backend = SQLiteBackend(cfg["CACHE_SQLITE_PATH"], cfg.get("CACHE_MAX_BYTES", 256 * 1024 * 1024))
+                elif kind == "redis":
+                    _backend = RedisBackend(cfg["CACHE_REDIS_URL"], cfg.get("CACHE_REDIS_PREFIX", "intranet:cache:"))
+                else:
+                    _backend = LRUBackend(cfg.get("CACHE_LRU_MAX_BYTES", 64 * 1024 * 1024),
+                                          cfg.get("CACHE_MAX_ENTRIES", 512))
+            except Exception:
+                current_app.logger.exception("Caché %s no disponible; se usa LRU en memoria", kind)
+                _backend = LRUBackend(cfg.get("CACHE_LRU_MAX_BYTES", 64 * 1024 * 1024),
+                                          cfg.get("CACHE_MAX_ENTRIES", 512))
+    return _backend or None
+
+
+def cache_key(namespace: str, extra: str = "", exclude_args=()) -> str:
+    parts = (namespace, normalized_args(exclude_args), current_scope().fingerprint,
+             date.today().isoformat(), extra)
+    return hashlib.sha1("\x1f".join(parts).encode("utf-8")).hexdigest()
+
+
+class NoStore:
+    """Resultado que no debe guardarse (p.ej. una respuesta de error)."""
+    __slots__ = ("value",)
+
+    def __init__(self, value):
+        self.value = value
+
+
+def shareable(value, max_bytes: int):
+    """
+    value si puede guardarse en una caché compartida (sqlite / redis) y su pickle
+    no pasa max_bytes; si no, NoStore(value). Para resultados grandes (filas de
+    exportaciones) que no conviene duplicar en la memoria de cada worker.
+    """
+    backend = get_backend()
+    if backend is None or isinstance(backend, LRUBackend):
+        return NoStore(value)
+    if len(pickle.dumps(value, protocol=pickle.HIGHEST_PROTOCOL)) > max_bytes:
+        return NoStore(value)
+    return value
+
+
+def _store(backend, key: str, wm: tuple, value, ttl: float, stale: float) -> None:
+    try:
+        backend.set(key, (time.time(), wm, value), ttl + stale)
+        _bump("stores")
+    except Exception:
+        _bump("errors")
+        current_app.logger.exception("No se pudo guardar en caché (%s)", backend.name)
+
+
+def _revalidate(backend, key: str, compute, tables, ttl: float, stale: float) -> None:
+    """Recalcula en segundo plano (una vez por clave y worker) con una copia del request."""
+    global _refresher
+    with _stats_lock:
+        if key in _refreshing:
+            return
+        _refreshing.add(key)
+        if _refresher is None:
+            _refresher = ThreadPoolExecutor(max_workers=2, thread_name_prefix="cache-swr")
+
+    @copy_current_request_context
+    def job():
+        try:
+            value = compute()
+            if not isinstance(value, NoStore):
+                _store(backend, key, data_watermark(*tables), value, ttl, stale)
+                _bump("refreshes")
+        except Exception:
+            _bump("errors")
+            current_app.logger.exception("Falló la revalidación en segundo plano")
+        finally:
+            with _stats_lock:
+                _refreshing.discard(key)
+
+    _refresher.submit(job)
+
+
+def remember(namespace: str, compute, *, tables=(), ttl: float | None = None, extra: str = "",
+             exclude_args=()):
+    """
+    Valor cacheado para (namespace, args, alcance); si no hay, compute().
+    compute() puede retornar NoStore(valor) para no guardar el resultado.
+    exclude_args: parámetros del query string que no cambian el valor (p.ej. page).
+    """
+    backend = get_backend()
+    if backend is None:
+        value = compute()
+        return value.value if isinstance(value, NoStore) else value
+
+    cfg = current_app.config
+    ttl = float(cfg.get("CACHE_TTL", 300) if ttl is None else ttl)
+    stale = float(cfg.get("CACHE_STALE_TTL", 600))
+    key = cache_key(namespace, extra, exclude_args)
+    wm = data_watermark(*tables)
+
+    try:
+        entry = backend.get(key)
+    except Exception:
+        _bump("errors")
+        current_app.logger.exception("Lectura de caché falló (%s)", backend.name)
+        entry = None
+
+    if entry is not None and entry[1] == wm:
+        age = time.time() - entry[0]
+        if age < ttl:
+            _bump("hits")
+            return entry[2]
+        # el precalentamiento (app.warmup) recalcula en línea: su proceso termina enseguida
+        if age < ttl + stale and not g.get("_warmup"):
+            _bump("stale")
+            _revalidate(backend, key, compute, tables, ttl, stale)
+            return entry[2]
+
+    _bump("misses")
+    value = compute()
+    if isinstance(value, NoStore):
+        return value.value
+    _store(backend, key, wm, value, ttl, stale)
+    return value
+
+
+def peek(namespace: str, *, tables=(), extra: str = "", exclude_args=()):
+    """Valor guardado y vigente (misma marca de agua, dentro de TTL + stale) sin calcular nada; None si no hay."""
+    backend = get_backend()
+    if backend is None:
+        return None
+    cfg = current_app.config
+    try:
+        entry = backend.get(cache_key(namespace, extra, exclude_args))
+    except Exception:
+        _bump("errors")
+        return None
+    if entry is None or entry[1] != data_watermark(*tables):
+        return None
+    if time.time() - entry[0] >= float(cfg.get("CACHE_TTL", 300)) + float(cfg.get("CACHE_STALE_TTL", 600)):
+        return None
+    _bump("hits")
+    return entry[2]
+
+
+def cached_json(*tables: str, ttl: float | None = None):
+    """
+    Decorador para vistas JSON: guarda el cuerpo de las respuestas 200 por alcance.
+    Va DEBAJO de @conditional (el 304 se resuelve antes de mirar la caché).
+    """
+    def deco(view):
+        @wraps(view)
+        def wrapper(*args, **kwargs):
+            def compute():
+                resp = make_response(view(*args, **kwargs))
+                frozen = (resp.get_data(), resp.status_code, resp.mimetype)
+                return frozen if resp.status_code == 200 else NoStore(resp)
+
+            out = remember(f"view:{request.endpoint}", compute, tables=tables, ttl=ttl)
+            if not isinstance(out, tuple):
+                return out  # respuesta sin guardar (error), tal cual
+            body, status, mimetype = out
+            return current_app.response_class(body, status=status, mimetype=mimetype)
+        return wrapper
+    return deco
+
+
+def stats() -> dict:
+    with _stats_lock:
+        s = dict(_stats)
+    backend = get_backend()
+    lookups = s.get("hits", 0) + s.get("stale", 0) + s.get("misses", 0)
+    info = {}
+    if backend is not None:
+        try:
+            info = backend.info()
+        except Exception:
+            info = {"error": "sin información del backend"}
+    return {
+        "pid": os.getpid(),
+        "backend": backend.name if backend is not None else "none",
+        "hits": s.get("hits", 0),
+        "stale": s.get("stale", 0),
+        "misses": s.get("misses", 0),
+        "stores": s.get("stores", 0),
+        "refreshes": s.get("refreshes", 0),
+        "errors": s.get("errors", 0),
+        "hit_ratio": round((s.get("hits", 0) + s.get("stale", 0)) / lookups, 3) if lookups else 0.0,
+        **info,
+    }
+
+
+def clear() -> int:
+    backend = get_backend()
+    return backend.clear() if backend is not None else 0
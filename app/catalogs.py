@@ -0,0 +1,194 @@
+# app/catalogs.py
+"""
+Catálogos de filtros (obras, cargos, cuentas) y nombres de recinto, en caché.
+
+- Los combos del dashboard salían de SELECT DISTINCT sobre asistencia e
+  inasistencias completas en cada carga. Ahora salen del rollup diario
+  (attendance_daily, chico e indexado por id_recinto) y se guardan en memoria
+  del worker CATALOG_TTL segundos.
+- El alcance del usuario se aplica en Python sobre el catálogo común, así
+  todos los usuarios comparten la misma entrada de caché.
+- Nombres de recinto: tabla recintos (obra_id = CAST(code AS UNSIGNED)),
+  luego el mapa histórico que estaba en los CASE, y si no 'OBRA <id>'.
+  Las consultas agrupan por el obra_id crudo y la etiqueta se pone acá.
+- refresh_rollup() llama a catalogs_changed(): sube una versión compartida
+  (archivo en disco, como grants_changed) y los workers recargan.
+"""
+from __future__ import annotations
+
+import os
+import threading
+import time
+from dataclasses import dataclass, field
+
+from flask import current_app
+from sqlalchemy import text
+
+from app.extensions import db
+
+# Etiquetas que estaban fijas en los CASE de los reportes (respaldo si recintos no las tiene)
+LEGACY_LABELS = {
+    14168: "PG CD",
+    14184: "BAT LO BOZA",
+    14186: "UL CD",
+    14367: "PG VAS",
+    14368: "BAT CASABLANCA",
+    14369: "UL VAS",
+    14370: "PG BMP",
+    14818: "NOVICIADO",
+    16256: "PANAMERICANA",
+}
+
+
+@dataclass(frozen=True)
+class Catalog:
+    labels: dict = field(default_factory=dict)           # {obra_id: nombre}
+    obra_ids: tuple = ()                                  # obras con datos en el rollup
+    cargos: tuple = ()                                    # cargo_resumido distintos
+    cuentas_por_recinto: dict = field(default_factory=dict)  # {obra_id: frozenset(cuenta_area)}
+
+
+_SQL_LABELS = text("""
+    SELECT CAST(code AS UNSIGNED) AS obra_id, name
+    FROM recintos
+    WHERE code REGEXP '^[0-9]+$'
+""")
+
+_SQL_OBRAS = text("""
+    SELECT DISTINCT id_recinto FROM attendance_daily WHERE id_recinto <> 0
+""")
+
+_SQL_CARGOS = text("""
+    SELECT DISTINCT cargo_resumido FROM attendance_daily WHERE cargo_resumido <> ''
+""")
+
+# Solo filas de asistencia (registros > 0): el combo de cuentas siempre salió de asistencia
+_SQL_CUENTAS = text("""
+    SELECT DISTINCT id_recinto, cuenta_area
+    FROM attendance_daily
+    WHERE registros > 0 AND cuenta_area <> ''
+""")
+
+_lock = threading.Lock()
+_cached: tuple[int, float, Catalog] | None = None
+
+
+# ------------------------- versión compartida -------------------------
+def _version_path() -> str:
+    return current_app.config["CATALOG_VERSION_FILE"]
+
+
+def catalog_version() -> int:
+    try:
+        return os.stat(_version_path()).st_mtime_ns
+    except OSError:
+        return 0
+
+
+def catalogs_changed() -> None:
+    """Llamar después de refrescar el rollup o de cambiar la tabla recintos."""
+    global _cached
+    with _lock:
+        _cached = None
+    path = _version_path()
+    new = max(time.time_ns(), catalog_version() + 1)
+    try:
+        with open(path, "a"):
+            pass
+        os.utime(path, ns=(new, new))
+    except OSError:
+        current_app.logger.exception("No se pudo actualizar la versión de catálogos (%s)", path)
+
+
+# ------------------------------ carga ------------------------------
+def _load_catalog() -> Catalog:
+    labels = dict(LEGACY_LABELS)
+    for obra_id, name in db.session.execute(_SQL_LABELS).all():
+        if obra_id and name:
+            labels[int(obra_id)] = name
+
+    obra_ids = tuple(sorted(int(r) for r in db.session.execute(_SQL_OBRAS).scalars()))
+    cargos = tuple(sorted(c for c in db.session.execute(_SQL_CARGOS).scalars() if c))
+
+    per: dict[int, set[str]] = {}
+    for rid, cta in db.session.execute(_SQL_CUENTAS).all():
+        per.setdefault(int(rid), set()).add(cta)
+
+    return Catalog(
+        labels=labels,
+        obra_ids=obra_ids,
+        cargos=cargos,
+        cuentas_por_recinto={rid: frozenset(ctas) for rid, ctas in per.items()},
+    )
+
+
+def get_catalog() -> Catalog:
+    """Catálogo común (desde caché si sigue vigente)."""
+    global _cached
+    version = catalog_version()
+    now = time.monotonic()
+    with _lock:
+        hit = _cached
+    if hit and hit[0] == version and hit[1] > now:
+        return hit[2]
+
+    cat = _load_catalog()
+    ttl = current_app.config.get("CATALOG_TTL", 300)
+    with _lock:
+        _cached = (version, now + ttl, cat)
+    return cat
+
+
+# ------------------------------ helpers ------------------------------
+def recinto_label(obra_id, labels: dict | None = None) -> str | None:
+    """Nombre del recinto; None/0 (sin recinto) -> None."""
+    if not obra_id:
+        return None
+    obra_id = int(obra_id)
+    labels = get_catalog().labels if labels is None else labels
+    return labels.get(obra_id) or f"OBRA {obra_id}"
+
+
+def recinto_order(col: str, labels: dict | None = None, obra_ids=()) -> str:
+    """
+    Expresión SQL entera que ordena la columna obra_id `col` por nombre de
+    recinto (como cuando el nombre salía del CASE en SQL): sin recinto (NULL/0)
+    primero, luego por nombre, y al final las obras que el catálogo no conoce.
+    En el SQL solo van enteros (ids y posiciones), nunca los nombres.
+    """
+    if labels is None:
+        cat = get_catalog()
+        labels, obra_ids = cat.labels, cat.obra_ids
+    ids = sorted(set(labels) | set(obra_ids),
+                 key=lambda rid: (recinto_label(rid, labels).casefold(), rid))
+    whens = " ".join(f"WHEN {int(rid)} THEN {n}" for n, rid in enumerate(ids, 1))
+    return f"(CASE COALESCE({col}, 0) WHEN 0 THEN 0 {whens} ELSE {len(ids) + 1} END)"
+
+
+def obras_options(allowed) -> list[dict]:
+    """Combo de obras [{value, label}] ordenado por nombre, acotado a allowed (None = todas)."""
+    cat = get_catalog()
+    ids = cat.obra_ids if allowed is None else [r for r in cat.obra_ids if r in allowed]
+    opts = [{"value": rid, "label": recinto_label(rid, cat.labels)} for rid in ids]
+    return sorted(opts, key=lambda o: o["label"])
+
+
+def cargos_options() -> list[dict]:
+    return [{"value": c} for c in get_catalog().cargos]
+
+
+def cuentas_options(allowed, per=None) -> list[dict]:
+    """
+    Combo de cuentas [{value}]: cuentas con asistencia en los recintos permitidos
+    y, si per no es None, solo los pares (recinto, cuenta) asignados (mismo
+    criterio que _scope_predicate).
+    """
+    cat = get_catalog()
+    out: set[str] = set()
+    for rid, ctas in cat.cuentas_por_recinto.items():
+        if allowed is not None and rid not in allowed:
+            continue
+        if per is not None:
+            ctas = ctas & per.get(rid, frozenset())
+        out.update(ctas)
+    return [{"value": c} for c in sorted(out)]
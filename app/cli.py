@@ -0,0 +1,453 @@
+# app/cli.py
+"""
+Comandos `flask ...` de mantenimiento y benchmarks.
+
+    flask --app wsgi scope rebuild [--user-id N]
+    flask --app wsgi users import usuarios.csv [--role viewer] [--dry-run] [--workers 4]
+    flask --app wsgi rollup refresh [--full | --since YYYY-MM-DD] [--recent-days 2] [--warm]
+    flask --app wsgi tokens issue --email bi@x.cl [--ttl 86400] [--recinto 14168 ...]
+    flask --app wsgi cache stats | clear
+    flask --app wsgi cache warm [--top 20] [--ahead 15] [--if-peak | --after-ingest]
+    flask --app wsgi bench scope-join --user-id N [--start ... --end ... --runs 5]
+    flask --app wsgi bench scope-predicate [--sizes 10,50,100,250,500]
+    flask --app wsgi bench explain [--start ... --end ...] [--analyze]
+    flask --app wsgi bench login-storm --email u@x.cl --password ... [--storm 40]
+"""
+from __future__ import annotations
+
+import statistics
+import threading
+import time
+from datetime import date, timedelta
+
+import click
+from flask import current_app
+from flask.cli import AppGroup
+from sqlalchemy import text
+
+from app.extensions import db
+
+scope_cli = AppGroup("scope", help="Alcance efectivo materializado (user_effective_scope).")
+users_cli = AppGroup("users", help="Aprovisionamiento de usuarios.")
+rollup_cli = AppGroup("rollup", help="Rollup diario de asistencia (attendance_daily).")
+tokens_cli = AppGroup("tokens", help="Tokens de API firmados para /api/*.")
+cache_cli = AppGroup("cache", help="Caché de resultados de reportes (app.cache).")
+bench_cli = AppGroup("bench", help="Benchmarks contra la BD configurada.")
+
+
+# ============================== helpers ==============================
+def _timed(sql, params, runs: int) -> tuple[float, object]:
+    """Ejecuta `runs` veces y retorna (mediana en ms, último resultado escalar)."""
+    samples, result = [], None
+    for _ in range(runs):
+        t0 = time.perf_counter()
+        result = db.session.execute(sql, params).scalar()
+        samples.append((time.perf_counter() - t0) * 1000.0)
+    return statistics.median(samples), result
+
+
+def _default_range(start: str | None, end: str | None) -> tuple[str, str]:
+    end = end or date.today().isoformat()
+    start = start or (date.fromisoformat(end) - timedelta(days=30)).isoformat()
+    return start, end
+
+
+# ============================== scope ==============================
+@scope_cli.command("rebuild")
+@click.option("--user-id", type=int, default=None, help="Solo este usuario (por defecto: todos).")
+def scope_rebuild(user_id):
+    """Crea (si falta) y reconstruye user_effective_scope."""
+    from app.models import UserEffectiveScope
+    from app.permissions import grants_changed, rebuild_effective_scope
+
+    UserEffectiveScope.__table__.create(bind=db.engine, checkfirst=True)
+    n = rebuild_effective_scope(user_id)
+    db.session.commit()
+    grants_changed(user_id)
+    click.echo(f"user_effective_scope: {n} fila(s) para {'user ' + str(user_id) if user_id else 'todos'}.")
+
+
+# ============================== users ==============================
+@users_cli.command("import")
+@click.argument("path", type=click.Path(exists=True, dir_okay=False))
+@click.option("--role", default=None, help="Código de rol para filas sin columna role.")
+@click.option("--dry-run", is_flag=True, help="Valida y reporta sin escribir.")
+@click.option("--workers", type=int, default=None, help="Procesos para hashear (por defecto: CPUs-1).")
+@click.option("--report", type=click.Path(dir_okay=False, writable=True), default=None,
+              help="Guarda el reporte por fila como JSON.")
+def users_import(path, role, dry_run, workers, report):
+    """Crea/actualiza usuarios, recintos y cuentas desde un CSV o JSON."""
+    import json
+
+    from app.provisioning import ProvisioningError, parse_payload, provision_users, summarize
+
+    with open(path, "rb") as fh:
+        raw = fh.read()
+    t0 = time.perf_counter()
+    try:
+        results = provision_users(parse_payload(raw, path), default_role=role,
+                                  dry_run=dry_run, workers=workers)
+    except ProvisioningError as e:
+        raise click.ClickException(str(e))
+    elapsed = time.perf_counter() - t0
+
+    for r in results:
+        line = f"  fila {r.line:<5} {r.status:<16} {r.email}"
+        if r.temp_password and not dry_run:
+            line += f"  temporal={r.temp_password}"
+        if r.errors:
+            line += "  (" + "; ".join(r.errors) + ")"
+        click.echo(line)
+    if report:
+        with open(report, "w", encoding="utf-8") as fh:
+            json.dump([r.to_dict() for r in results], fh, ensure_ascii=False, indent=2)
+    summary = ", ".join(f"{k}={v}" for k, v in sorted(summarize(results).items()))
+    click.echo(f"{'simulación' if dry_run else 'listo'}: {summary} en {elapsed:.1f} s")
+
+
+# ============================== rollup ==============================
+@rollup_cli.command("refresh")
+@click.option("--full", is_flag=True, help="Re-agrega toda la historia.")
+@click.option("--since", default=None, help="YYYY-MM-DD: re-agrega desde esa fecha hasta hoy.")
+@click.option("--recent-days", type=int, default=None,
+              help="Días recientes a re-agregar siempre (por defecto ROLLUP_RECENT_DAYS).")
+@click.option("--warm", is_flag=True, help="Luego precalienta la caché con lo más pedido del resto del día.")
+def rollup_refresh(full, since, recent_days, warm):
+    """Re-agrega solo los días tocados desde la última corrida (correr tras cada ingesta)."""
+    from app.rollup import refresh_rollup
+    from app.schema import SchemaOutdated, require_schema
+
+    try:
+        require_schema()
+    except SchemaOutdated as e:
+        raise click.ClickException(str(e))
+
+    t0 = time.perf_counter()
+    out = refresh_rollup(full=full, since=date.fromisoformat(since) if since else None,
+                         recent_days=recent_days)
+    tramos = ", ".join(f"{a}..{b}" if a != b else str(a) for a, b in out["ranges"][:8])
+    if len(out["ranges"]) > 8:
+        tramos += f", … (+{len(out['ranges']) - 8})"
+    click.echo(f"attendance_daily: {out['days']} día(s) [{tramos}] -> {out['rows']} fila(s), "
+               f"{out['sketches']} sketch(es) HLL en {time.perf_counter() - t0:.1f} s; "
+               f"marcas={out['watermarks']}")
+    if warm:
+        _echo_warm(after_ingest=True)
+
+
+# ============================== tokens ==============================
+@tokens_cli.command("issue")
+@click.option("--email", required=True)
+@click.option("--ttl", type=int, default=None, help="Segundos (por defecto API_TOKEN_TTL).")
+@click.option("--recinto", "recintos", type=int, multiple=True,
+              help="Acota el token a estos OBRA_ID (repetible). Nunca amplía el alcance del usuario.")
+@click.option("--rate", type=int, default=None, help="Requests por minuto (por defecto API_TOKEN_RATE_PER_MIN).")
+def tokens_issue(email, ttl, recintos, rate):
+    """Emite un token Bearer para un usuario (sin pedir su contraseña)."""
+    from datetime import datetime
+
+    from app.api_tokens import issue_token, token_scope
+
+    uid = db.session.execute(text("SELECT id FROM users WHERE email = :e"),
+                             {"e": email.strip().lower()}).scalar()
+    if uid is None:
+        raise click.ClickException(f"No existe el usuario {email}.")
+    try:
+        token, payload = issue_token(uid, ttl=ttl, recintos=set(recintos) or None, rate_per_min=rate)
+    except ValueError as e:
+        raise click.ClickException(str(e))
+    scope = token_scope(payload)
+    alcance = "sin restricción" if scope.unrestricted else \
+        f"{len(scope.recinto_ids)} recinto(s), {sum(len(c) for c in scope.cuentas_por_recinto.values())} par(es)"
+    click.echo(f"# {email} · {alcance} · {payload['rl']}/min · "
+               f"expira {datetime.fromtimestamp(payload['exp']).isoformat(timespec='seconds')}")
+    click.echo(token)
+
+
+# ============================== cache ==============================
+@cache_cli.command("stats")
+def cache_stats():
+    """Backend y contadores (los de hits/misses son de este proceso; el tamaño es del backend)."""
+    from app.cache import stats
+
+    for k, v in stats().items():
+        click.echo(f"{k}: {v}")
+
+
+@cache_cli.command("clear")
+def cache_clear():
+    """Vacía la caché (con lru solo afecta a este proceso; usar con sqlite/redis)."""
+    from app.cache import clear
+
+    click.echo(f"{clear()} entrada(s) eliminada(s)")
+
+
+def _echo_warm(**kwargs) -> None:
+    from app.warmup import warm
+
+    if (current_app.config.get("CACHE_BACKEND") or "lru").lower() in ("lru", "none"):
+        click.echo("aviso: CACHE_BACKEND sin compartir entre procesos; solo se calienta el buffer pool de MySQL.")
+    out = warm(**kwargs)
+    click.echo(" ".join(f"{k}={v}" for k, v in out.items()))
+
+
+@cache_cli.command("warm")
+@click.option("--top", type=int, default=None, help="Combinaciones a precalcular (por defecto WARMUP_TOP).")
+@click.option("--ahead", type=int, default=None,
+              help="Minutos hacia adelante para elegir la hora (por defecto WARMUP_AHEAD_MINUTES).")
+@click.option("--if-peak", is_flag=True,
+              help="Solo si esa hora es de las WARMUP_PEAK_HOURS más concurridas (para cron cada 15 min).")
+@click.option("--after-ingest", is_flag=True, help="Lo más pedido del resto del día (tras la ingesta).")
+def cache_warm(top, ahead, if_peak, after_ingest):
+    """Precalcula las combinaciones (vista, filtros, alcance) más pedidas según access_stats."""
+    _echo_warm(top=top, ahead_minutes=ahead, after_ingest=after_ingest, only_peaks=if_peak)
+
+
+# ============================== bench ==============================
+@bench_cli.command("scope-join")
+@click.option("--user-id", type=int, required=True)
+@click.option("--start", default=None, help="YYYY-MM-DD (por defecto: hace 30 días).")
+@click.option("--end", default=None, help="YYYY-MM-DD (por defecto: hoy).")
+@click.option("--runs", type=int, default=5, show_default=True)
+def bench_scope_join(user_id, start, end, runs):
+    """OR expandido (_clause_cuentas) vs join a user_effective_scope (_clause_scope)."""
+    from app.blueprints.dashboard.routes import (
+        SQL_HORAS_TRABAJADAS_BASE, SQL_INASISTENCIAS_BASE,
+        _clause_cuentas, _clause_scope,
+    )
+    from app.permissions import get_snapshot
+
+    start, end = _default_range(start, end)
+    per = {rid: set(ctas) for rid, ctas in get_snapshot(user_id).cuentas_por_recinto.items()}
+    n_pairs = sum(len(c) for c in per.values())
+    click.echo(f"user={user_id} recintos={len(per)} pares(recinto,cuenta)={n_pairs} rango={start}..{end}")
+    if n_pairs < 100:
+        click.echo("  (aviso: el usuario tiene menos de 100 cuentas; el beneficio será menor)")
+    if not per:
+        raise click.ClickException("El usuario no tiene cuentas asignadas.")
+
+    cases = [
+        ("horas_trabajadas", SQL_HORAS_TRABAJADAS_BASE,
+         "WHERE a.fecha_base >= :start AND a.fecha_base < :end + INTERVAL 1 DAY AND at.tipoTurno IS NOT NULL {cta}", "",
+         ("a.id_recinto", "a.cuenta_area")),
+        ("inasistencias", SQL_INASISTENCIAS_BASE,
+         "AND i.fecha_inasistencia >= :start AND i.fecha_inasistencia < :end + INTERVAL 1 DAY {cta}", "",
+         ("i.obra_id", "at.cuenta_area")),
+    ]
+    for name, base, where, outer, cols in cases:
+        for label, (extra, p) in (
+            ("or-expand", _clause_cuentas(*cols, per)),
+            ("scope-join", _clause_scope(*cols, per, user_id)),
+        ):
+            sql = text(f"SELECT COUNT(*) FROM ({base} {where.format(cta=extra)}) q {outer}")
+            ms, total = _timed(sql, {"start": start, "end": end, **p}, runs)
+            click.echo(f"  {name:<17} {label:<11} median={ms:9.1f} ms  filas={total}  binds={len(p)}")
+
+
+@bench_cli.command("scope-predicate")
+@click.option("--sizes", default="10,50,100,250,500", show_default=True,
+              help="Tamaños de alcance (pares recinto-cuenta) a medir.")
+@click.option("--start", default=None, help="YYYY-MM-DD (por defecto: hace 30 días).")
+@click.option("--end", default=None, help="YYYY-MM-DD (por defecto: hoy).")
+@click.option("--runs", type=int, default=5, show_default=True)
+def bench_scope_predicate(sizes, start, end, runs):
+    """OR expandido vs tuple-IN vs tabla temporaria, por tamaño de alcance."""
+    from app.blueprints.dashboard.routes import (
+        SQL_INASISTENCIAS_BASE, _clause_cuentas, _clause_tuple_in, _clause_tmp_scope,
+    )
+
+    start, end = _default_range(start, end)
+    sizes = sorted({int(x) for x in sizes.split(",") if x.strip()})
+
+    # pares reales del rango; si no alcanzan, se rellenan con cuentas inexistentes
+    # (igual que un usuario con cuentas sin movimiento)
+    real = db.session.execute(text("""
+        SELECT DISTINCT a.id_recinto, a.cuenta_area
+        FROM asistencia a
+        WHERE a.fecha_base >= :start AND a.fecha_base < :end + INTERVAL 1 DAY
+          AND a.id_recinto IS NOT NULL AND a.cuenta_area IS NOT NULL
+        ORDER BY a.id_recinto, a.cuenta_area
+        LIMIT :n
+    """), {"start": start, "end": end, "n": max(sizes)}).all()
+    if not real:
+        raise click.ClickException("No hay asistencia en el rango para armar alcances.")
+    pairs = [(int(r), c) for r, c in real]
+    while len(pairs) < max(sizes):
+        pairs.append((pairs[len(pairs) % len(real)][0], f"ZZ_BENCH_{len(pairs)}"))
+
+    cases = [
+        ("asistencia", "SELECT COUNT(*) FROM asistencia a "
+                       "WHERE a.fecha_base >= :start AND a.fecha_base < :end + INTERVAL 1 DAY {cta}",
+         ("a.id_recinto", "a.cuenta_area")),
+        ("inasistencias", f"SELECT COUNT(*) FROM ({SQL_INASISTENCIAS_BASE} "
+                          "AND i.fecha_inasistencia >= :start AND i.fecha_inasistencia < :end + INTERVAL 1 DAY "
+                          "{cta}) q",
+         ("i.obra_id", "at.cuenta_area")),
+    ]
+    click.echo(f"rango={start}..{end} pares reales={len(real)}")
+    for n in sizes:
+        subset = pairs[:n]
+        per: dict[int, set[str]] = {}
+        for rid, cta in subset:
+            per.setdefault(rid, set()).add(cta)
+        for name, tpl, cols in cases:
+            for label, build in (
+                ("or-expand", lambda: _clause_cuentas(*cols, per)),
+                ("tuple-in", lambda: _clause_tuple_in(*cols, subset)),
+                ("tmp-table", lambda: _clause_tmp_scope(*cols, subset)),
+            ):
+                t0 = time.perf_counter()
+                extra, p = build()
+                setup_ms = (time.perf_counter() - t0) * 1000.0
+                sql = text(tpl.replace("{cta}", extra))
+                ms, total = _timed(sql, {"start": start, "end": end, **p}, runs)
+                click.echo(f"  n={n:<5} {name:<14} {label:<10} median={ms:9.1f} ms  "
+                           f"setup={setup_ms:6.1f} ms  filas={total}  sql_len={len(str(sql))}")
+    db.session.rollback()
+
+
+# (nombre, predicado antiguo con función sobre la columna, predicado sargable)
+_EXPLAIN_CASES = [
+    ("asistencia rango",
+     "SELECT COUNT(*) FROM asistencia a WHERE DATE(a.fecha_base) BETWEEN :start AND :end "
+     "AND a.entrada IS NOT NULL",
+     "SELECT COUNT(*) FROM asistencia a WHERE a.fecha_base >= :start "
+     "AND a.fecha_base < :end + INTERVAL 1 DAY AND a.entrada IS NOT NULL"),
+    ("inasistencias rango",
+     "SELECT i.obra_id, COUNT(*) FROM inasistencias i "
+     "WHERE DATE(i.fecha_inasistencia) BETWEEN :start AND :end GROUP BY i.obra_id",
+     "SELECT i.obra_id, COUNT(*) FROM inasistencias i WHERE i.fecha_inasistencia >= :start "
+     "AND i.fecha_inasistencia < :end + INTERVAL 1 DAY GROUP BY i.obra_id"),
+    ("horas_extras rango",
+     "SELECT COUNT(*) FROM horas_extras_diario he WHERE DATE(he.fecha) BETWEEN :start AND :end",
+     "SELECT COUNT(*) FROM horas_extras_diario he WHERE he.fecha >= :start "
+     "AND he.fecha < :end + INTERVAL 1 DAY"),
+    ("presentismo año",
+     "SELECT MONTH(a.fecha_base), COUNT(*) FROM asistencia a "
+     "WHERE YEAR(a.fecha_base) = :y AND a.entrada IS NOT NULL GROUP BY MONTH(a.fecha_base)",
+     "SELECT MONTH(a.fecha_base), COUNT(*) FROM asistencia a WHERE a.fecha_base >= MAKEDATE(:y, 1) "
+     "AND a.fecha_base < MAKEDATE(:y + 1, 1) AND a.entrada IS NOT NULL GROUP BY MONTH(a.fecha_base)"),
+]
+
+
+@bench_cli.command("explain")
+@click.option("--start", default=None, help="YYYY-MM-DD (por defecto: hace 30 días).")
+@click.option("--end", default=None, help="YYYY-MM-DD (por defecto: hoy).")
+@click.option("--analyze", is_flag=True, help="EXPLAIN ANALYZE (ejecuta la consulta; MySQL >= 8.0.18).")
+@click.option("--runs", type=int, default=3, show_default=True)
+def bench_explain(start, end, analyze, runs):
+    """EXPLAIN antes/después: DATE()/YEAR() sobre la columna vs rango semiabierto."""
+    start, end = _default_range(start, end)
+    params = {"start": start, "end": end, "y": int(end[:4])}
+    click.echo(f"rango={start}..{end} año={params['y']}")
+
+    for name, before, after in _EXPLAIN_CASES:
+        for label, sql in (("antes", before), ("después", after)):
+            click.echo(f"\n== {name} · {label}")
+            click.echo(f"   {sql}")
+            if analyze:
+                for (line,) in db.session.execute(text("EXPLAIN ANALYZE " + sql), params).all():
+                    click.echo("   " + line.replace("\n", "\n   "))
+            else:
+                for r in db.session.execute(text("EXPLAIN " + sql), params).mappings().all():
+                    click.echo(f"   table={r['table']:<20} type={r['type']:<6} key={r['key']!s:<28} "
+                               f"rows={r['rows']!s:<10} extra={r['Extra']}")
+            samples = []
+            for _ in range(runs):
+                t0 = time.perf_counter()
+                db.session.execute(text(sql), params).all()
+                samples.append((time.perf_counter() - t0) * 1000.0)
+            click.echo(f"   median={statistics.median(samples):9.1f} ms ({runs} corridas)")
+
+
+def _percentiles(samples: list[float]) -> str:
+    if not samples:
+        return "sin muestras"
+    xs = sorted(samples)
+    p = lambda q: xs[min(len(xs) - 1, int(q * len(xs)))]
+    return f"n={len(xs)} p50={p(0.50):7.1f} ms  p95={p(0.95):7.1f} ms  max={xs[-1]:7.1f} ms"
+
+
+@bench_cli.command("login-storm")
+@click.option("--email", required=True, help="Usuario real (se usa para los logins y la sonda).")
+@click.option("--password", required=True, prompt=True, hide_input=True)
+@click.option("--storm", type=int, default=40, show_default=True, help="Logins concurrentes.")
+@click.option("--probes", type=int, default=4, show_default=True, help="Threads midiendo reportes.")
+@click.option("--probe-path", default=None,
+              help="Ruta de reporte a medir (por defecto /api/horas-trabajadas de la última semana).")
+@click.option("--workers", type=int, default=None, help="Workers del pool en la corrida 'después'.")
+def bench_login_storm(email, password, storm, probes, probe_path, workers):
+    """Latencia de reportes durante una ráfaga de logins: PBKDF2 inline vs pool de procesos."""
+    from app.security import shutdown_password_pool
+
+    app = current_app._get_current_object()
+    app.config["WTF_CSRF_ENABLED"] = False
+    if not probe_path:
+        end = date.today()
+        probe_path = (f"/api/horas-trabajadas?start={(end - timedelta(days=6)).isoformat()}"
+                      f"&end={end.isoformat()}&per_page=30")
+    after_workers = workers or app.config.get("PASSWORD_POOL_WORKERS", 2) or 2
+    # sin topes por IP/cuenta: se mide el costo de CPU, no el rate limit
+    app.config["PASSWORD_MAX_PER_IP"] = app.config["PASSWORD_MAX_PER_ACCOUNT"] = storm + 1
+
+    def _login(client):
+        return client.post("/auth/login", data={"email": email, "password": password})
+
+    def _run(label: str, pool_workers: int):
+        shutdown_password_pool()
+        app.config["PASSWORD_POOL_WORKERS"] = pool_workers
+
+        prober = app.test_client()
+        if _login(prober).status_code not in (302, 303):
+            raise click.ClickException("No se pudo iniciar sesión con las credenciales dadas.")
+
+        # línea base sin ráfaga
+        base = []
+        for _ in range(5):
+            t0 = time.perf_counter(); prober.get(probe_path); base.append((time.perf_counter() - t0) * 1000)
+
+        stop = threading.Event()
+        lat: list[float] = []
+        login_ms: list[float] = []
+        lock = threading.Lock()
+
+        def probe():
+            while not stop.is_set():
+                t0 = time.perf_counter(); prober.get(probe_path)
+                with lock:
+                    lat.append((time.perf_counter() - t0) * 1000)
+
+        def storm_one():
+            t0 = time.perf_counter(); _login(app.test_client())
+            with lock:
+                login_ms.append((time.perf_counter() - t0) * 1000)
+
+        probe_threads = [threading.Thread(target=probe, daemon=True) for _ in range(probes)]
+        storm_threads = [threading.Thread(target=storm_one) for _ in range(storm)]
+        for t in probe_threads:
+            t.start()
+        for t in storm_threads:
+            t.start()
+        for t in storm_threads:
+            t.join()
+        stop.set()
+        for t in probe_threads:
+            t.join()
+
+        click.echo(f"[{label}] sonda sin ráfaga : {_percentiles(base)}")
+        click.echo(f"[{label}] sonda con ráfaga : {_percentiles(lat)}")
+        click.echo(f"[{label}] logins           : {_percentiles(login_ms)}")
+
+    click.echo(f"sonda={probe_path} ráfaga={storm} logins, {probes} threads de sonda")
+    _run("antes: inline", 0)
+    _run(f"después: pool x{after_workers}", after_workers)
+    shutdown_password_pool()
+
+
+def register_cli(app) -> None:
+    app.cli.add_command(scope_cli)
+    app.cli.add_command(users_cli)
+    app.cli.add_command(rollup_cli)
+    app.cli.add_command(tokens_cli)
+    app.cli.add_command(cache_cli)
+    app.cli.add_command(bench_cli)
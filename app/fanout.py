@@ -0,0 +1,123 @@
+# app/fanout.py
+"""
+Fan-out de consultas independientes en paralelo.
+
+La BD está en otra máquina (10.62.115.242): con N consultas en serie la
+latencia de la página es la SUMA de los round-trips; en paralelo es la
+más lenta.
+
+    res = fetch_many({
+        "kpis":   (sql_kpis, params, "first"),
+        "obras":  (sql_obras, p_combo),            # "all" por defecto
+    })
+    res["kpis"], res["obras"]
+
+- Un ThreadPoolExecutor por proceso (FANOUT_WORKERS threads); cada consulta
+  toma su propia conexión del pool de SQLAlchemy (db.engine) y la devuelve.
+- Tope por consulta con MAX_EXECUTION_TIME (lado MySQL, solo SELECT) y tope
+  total de espera FANOUT_TIMEOUT_MS (lado Python).
+- FANOUT_WORKERS=0 => en serie, en el thread del request.
+- Cada consulta pasa por app.singleflight: pedidos idénticos concurrentes
+  comparten una sola ejecución. Los resultados son dicts / listas de dicts.
+
+Ojo: cada consulta corre en una conexión distinta, así que NO sirve para
+sentencias que dependen de estado de sesión (tablas TEMPORARY de
+_clause_tmp_scope, variables de usuario, etc.).
+"""
+from __future__ import annotations
+
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_EXCEPTION
+from functools import partial
+
+from flask import current_app
+from sqlalchemy import text
+
+from app import singleflight
+from app.extensions import db
+from app.permissions import current_scope
+
+
+class FanoutTimeout(Exception):
+    """Alguna consulta no terminó dentro de FANOUT_TIMEOUT_MS."""
+
+
+_executor: ThreadPoolExecutor | None = None
+_executor_lock = threading.Lock()
+
+
+def _get_executor(workers: int) -> ThreadPoolExecutor:
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="fanout")
+        return _executor
+
+
+def _shape(result, shape: str):
+    # valores planos: se comparten entre requests (app.singleflight)
+    if shape == "first":
+        row = result.mappings().first()
+        return dict(row) if row is not None else None
+    if shape == "scalar":
+        return result.scalar()
+    return [dict(r) for r in result.mappings().all()]
+
+
+def _run_one(engine, sql, params, shape: str, max_ms: int):
+    with engine.connect() as conn:
+        if max_ms:
+            conn.execute(text("SET SESSION MAX_EXECUTION_TIME = :ms"), {"ms": int(max_ms)})
+        try:
+            return _shape(conn.execute(sql, params or {}), shape)
+        finally:
+            if max_ms:
+                conn.execute(text("SET SESSION MAX_EXECUTION_TIME = 0"))
+            conn.rollback()
+
+
+def fetch_many(queries: dict[str, tuple], timeout_ms: int | None = None,
+               max_execution_ms: int | None = None) -> dict:
+    """
+    queries: {nombre: (sql, params[, "all"|"first"|"scalar"])}.
+    Retorna {nombre: resultado}. Propaga la primera excepción (y cancela lo pendiente).
+    """
+    cfg = current_app.config
+    workers = int(cfg.get("FANOUT_WORKERS", 8))
+    timeout_ms = cfg.get("FANOUT_TIMEOUT_MS", 30000) if timeout_ms is None else timeout_ms
+    max_ms = cfg.get("FANOUT_MAX_EXECUTION_MS", 25000) if max_execution_ms is None else max_execution_ms
+    engine = db.engine  # se captura acá: los threads del pool no tienen app context
+    sf = singleflight.settings()
+    scope_fp = current_scope().fingerprint if sf else ""
+
+    jobs = {}
+    for name, q in queries.items():
+        sql, params, *rest = q
+        run = partial(_run_one, engine, sql, params, rest[0] if rest else "all", max_ms)
+        if sf:
+            # consultas idénticas concurrentes (mismo SQL, params y alcance): una sola ejecución
+            run = partial(singleflight.coalesce, singleflight.query_key(sql, params, scope_fp), run, **sf)
+        jobs[name] = run
+
+    if workers <= 0 or len(jobs) <= 1:
+        return {name: run() for name, run in jobs.items()}
+
+    pool = _get_executor(workers)
+    t0 = time.monotonic()
+    futures = {pool.submit(run): name for name, run in jobs.items()}
+    done, pending = wait(futures, timeout=(timeout_ms / 1000.0) if timeout_ms else None,
+                         return_when=FIRST_EXCEPTION)
+
+    for f in done:
+        if f.exception() is not None:
+            for p in pending:
+                p.cancel()
+            raise f.exception()
+    if pending:
+        for p in pending:
+            p.cancel()
+        names = ", ".join(sorted(futures[p] for p in pending))
+        raise FanoutTimeout(f"consultas sin terminar tras {time.monotonic() - t0:.1f} s: {names}")
+
+    return {futures[f]: f.result() for f in done}
@@ -0,0 +1,158 @@
+# app/live.py
+"""
+Server-Sent Events: deltas de KPIs tras cada ingesta.
+
+Los supervisores dejan /dashboard abierto y apretan F5 todo el día. Con
+EventSource la página se suscribe a /api/dashboard/stream (mismos filtros) y:
+
+- cada LIVE_POLL_SECONDS el stream mira la marca de agua de datos
+  (app.watermark, cacheada por worker: casi gratis aunque haya muchos streams);
+- si avanzó, recalcula el snapshot UNA vez por alcance y filtros (app.cache +
+  single-flight: los streams con la misma huella comparten el cálculo) y
+  envía solo lo que cambió (KPIs y filas por recinto);
+- entre medio, un comentario de keepalive.
+
+Capacidad: cada stream ocupa un thread de gunicorn (3 workers x 8 gthreads)
+durante toda la conexión, aunque solo duerma. Esos threads son los mismos que
+atienden los reportes: con LIVE_MAX_STREAMS por worker, a lo sumo
+3 x LIVE_MAX_STREAMS de los 24 threads quedan tomados por dashboards abiertos.
+Por eso el tope por defecto es 1 (3 de 24); subirlo cambia latencia de
+reportes por más pantallas en vivo. Para muchos espectadores, servir los
+streams desde un gunicorn aparte (p.ej. worker gevent) en vez de subir el tope.
+
+Sin cupo, un EventSource recibe un stream de un solo evento "busy" con
+`retry: LIVE_BUSY_RETRY_SECONDS`: EventSource no reintenta tras un no-200, así
+que un 503 lo dejaría sin actualizaciones para siempre; con "busy" vuelve a
+probar más tarde. Otros clientes reciben 503. Cada conexión dura
+LIVE_STREAM_SECONDS (y libera el thread); EventSource reconecta solo y manda
+Last-Event-ID, así no se reenvía lo que el navegador ya tiene.
+"""
+from __future__ import annotations
+
+import json
+import threading
+import time
+
+from flask import Response, current_app, jsonify, request, stream_with_context
+
+from app.extensions import db
+from app.watermark import data_watermark
+
+_slots_lock = threading.Lock()
+_open_streams = 0
+
+
+def acquire_slot() -> bool:
+    global _open_streams
+    with _slots_lock:
+        if _open_streams >= int(current_app.config.get("LIVE_MAX_STREAMS", 1)):
+            return False
+        _open_streams += 1
+        return True
+
+
+def release_slot() -> None:
+    global _open_streams
+    with _slots_lock:
+        _open_streams = max(0, _open_streams - 1)
+
+
+def sse(event: str | None, data, event_id: str | None = None, retry_ms: int | None = None) -> str:
+    """Un mensaje SSE (data en JSON)."""
+    out = []
+    if retry_ms:
+        out.append(f"retry: {int(retry_ms)}")
+    if event_id:
+        out.append(f"id: {event_id}")
+    if event:
+        out.append(f"event: {event}")
+    out.append("data: " + json.dumps(data, ensure_ascii=False, default=str, separators=(",", ":")))
+    return "\n".join(out) + "\n\n"
+
+
+def _by_rid(rows) -> dict:
+    return {r["rid"]: r for r in rows or ()}
+
+
+def diff_snapshot(prev: dict | None, cur: dict) -> dict:
+    """
+    Cambios de cur respecto a prev. snapshot = {"kpis": {...}, "motivos": [...],
+    "<lista por recinto>": [{"rid": ..., ...}]}; vacío si no cambió nada.
+    """
+    if prev is None:
+        return dict(cur)
+    delta: dict = {}
+    old_kpis = prev.get("kpis") or {}
+    kp = {k: v for k, v in (cur.get("kpis") or {}).items() if old_kpis.get(k) != v}
+    if kp:
+        delta["kpis"] = kp
+    if cur.get("motivos") != prev.get("motivos"):
+        delta["motivos"] = cur.get("motivos")  # lista corta: se manda completa
+    for name, rows in cur.items():
+        if name in ("kpis", "motivos"):
+            continue
+        old, new = _by_rid(prev.get(name)), _by_rid(rows)
+        changed = [r for rid, r in new.items() if old.get(rid) != r]
+        removed = [rid for rid in old if rid not in new]
+        if changed or removed:
+            delta[name] = {"upsert": changed, "remove": removed}
+    return delta
+
+
+def watermark_stream(snapshot=None, tables=("asistencia", "inasistencias")):
+    """
+    Generador SSE (usar con stream_with_context). snapshot() -> dict del alcance
+    y filtros del request; sin snapshot solo avisa "ingest".
+    """
+    snapshot = snapshot or dict
+    cfg = current_app.config
+    poll = max(1, int(cfg.get("LIVE_POLL_SECONDS", 15)))
+    deadline = time.monotonic() + int(cfg.get("LIVE_STREAM_SECONDS", 300))
+    last_id = request.headers.get("Last-Event-ID")
+    prev = None
+
+    try:
+        wm = "|".join(data_watermark(*tables))
+        prev = snapshot()
+        db.session.close()  # no retener una conexión del pool mientras se espera
+        if last_id and last_id != wm:
+            # el navegador tiene datos de una ingesta anterior: snapshot completo
+            yield sse("snapshot", prev, wm, retry_ms=poll * 1000)
+        elif not last_id:
+            yield sse("hello", {"watermark": wm}, wm, retry_ms=poll * 1000)
+
+        while time.monotonic() < deadline:
+            time.sleep(poll)
+            cur_wm = "|".join(data_watermark(*tables))
+            if cur_wm == wm:
+                db.session.close()
+                yield ": keepalive\n\n"
+                continue
+            cur = snapshot()
+            db.session.close()
+            delta = diff_snapshot(prev, cur)
+            wm, prev = cur_wm, cur
+            yield sse("delta", delta, wm) if delta else sse("ingest", {"watermark": wm}, wm)
+    except GeneratorExit:
+        pass
+
+
+def stream_response(snapshot=None, tables=("asistencia", "inasistencias")):
+    """
+    Response text/event-stream con cupo por worker. Sin cupo: "busy" + retry
+    para EventSource, 503 JSON para el resto.
+    """
+    if not acquire_slot():
+        if request.accept_mimetypes.best == "text/event-stream":
+            retry = int(current_app.config.get("LIVE_BUSY_RETRY_SECONDS", 120))
+            resp = Response(sse("busy", {"retry_seconds": retry}, retry_ms=retry * 1000),
+                            mimetype="text/event-stream")
+            resp.headers["Cache-Control"] = "no-cache"
+            return resp
+        return jsonify(error="Demasiados streams abiertos; la página sigue sin actualización en vivo"), 503
+    resp = Response(stream_with_context(watermark_stream(snapshot, tables)), mimetype="text/event-stream")
+    resp.headers["Cache-Control"] = "no-cache"
+    resp.headers["X-Accel-Buffering"] = "no"  # nginx: no bufferizar
+    # el cupo se libera al cerrar la respuesta (aunque el generador no haya arrancado)
+    resp.call_on_close(release_slot)
+    return resp
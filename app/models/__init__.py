@@ -88,7 +88,7 @@ class User(db.Model):
         foreign_keys=lambda: [UserRecinto.user_id],
         back_populates="user",
         cascade="all, delete-orphan",
-        lazy="selectin",
+        lazy="select",   # carga bajo demanda: load_user ya no usa el ORM (ver app/principal.py)
     )
 
     recintos = db.relationship(
@@ -101,7 +101,7 @@ class User(db.Model):
         ),
         secondaryjoin=lambda: UserRecinto.recinto_id == Recinto.id,
         viewonly=True,
-        lazy="selectin",
+        lazy="select",
     )
 
     def __repr__(self):
@@ -499,3 +499,122 @@ class UserCuenta(db.Model):
         db.Index("ix_user_cuenta_active", "user_id", "is_active"),
         db.Index("ix_cuenta_active", "cuenta_id", "is_active"),
     )
+
+
+
+# =======================================
+#  Alcance efectivo materializado (user_effective_scope)
+#  user_cuentas -> recinto_cuentas -> recintos, aplanado a (obra_id, cuenta_code)
+#  Lo reconstruye app.permissions.rebuild_effective_scope() en cada cambio de permisos.
+# =======================================
+class UserEffectiveScope(db.Model):
+    __tablename__ = "user_effective_scope"
+
+    user_id     = db.Column(BIGINT(unsigned=True), primary_key=True)
+    obra_id     = db.Column(db.Integer, primary_key=True)        # = asistencia.id_recinto / inasistencias.obra_id
+    cuenta_code = db.Column(db.String(120), primary_key=True)    # = asistencia.cuenta_area / asignacion_turnos.cuenta_area
+
+    __table_args__ = (
+        db.Index("ix_ues_obra_cuenta", "obra_id", "cuenta_code"),
+        {"mysql_charset": "utf8mb4", "mysql_collate": "utf8mb4_unicode_ci"},
+    )
+
+    def __repr__(self):
+        return f"<UserEffectiveScope user={self.user_id} obra={self.obra_id} cuenta={self.cuenta_code}>"
+
+
+# =======================================
+#  Rollup diario de asistencia (attendance_daily)
+#  Una fila por (fecha, recinto, cuenta, cargo) con presentes y ausencias por motivo.
+#  Lo mantiene app.rollup.refresh_rollup() (`flask rollup refresh`); el dashboard lee de acá.
+#  - id_recinto = 0        -> asistencia/inasistencia sin recinto (NULL en origen)
+#  - cargo_resumido = ''   -> filas de inasistencias (no tienen cargo)
+# =======================================
+class AttendanceDaily(db.Model):
+    __tablename__ = "attendance_daily"
+
+    fecha          = db.Column(db.Date, primary_key=True)
+    id_recinto     = db.Column(db.Integer, primary_key=True)           # = asistencia.id_recinto / inasistencias.obra_id
+    cuenta_area    = db.Column(db.String(120), primary_key=True)
+    cargo_resumido = db.Column(db.String(120), primary_key=True)
+
+    registros       = db.Column(INTEGER(unsigned=True), nullable=False, default=0)  # filas de asistencia
+    presentes       = db.Column(INTEGER(unsigned=True), nullable=False, default=0)  # asistencia con entrada
+    ausentes        = db.Column(INTEGER(unsigned=True), nullable=False, default=0)  # filas de inasistencias
+    aus_ausente     = db.Column(INTEGER(unsigned=True), nullable=False, default=0)  # motivo '-'
+    aus_vacaciones  = db.Column(INTEGER(unsigned=True), nullable=False, default=0)  # V
+    aus_licencia    = db.Column(INTEGER(unsigned=True), nullable=False, default=0)  # L
+    aus_permiso     = db.Column(INTEGER(unsigned=True), nullable=False, default=0)  # P
+    aus_compensado  = db.Column(INTEGER(unsigned=True), nullable=False, default=0)  # C
+    aus_sin_registro = db.Column(INTEGER(unsigned=True), nullable=False, default=0)  # motivo NULL
+    aus_otros       = db.Column(INTEGER(unsigned=True), nullable=False, default=0)
+
+    __table_args__ = (
+        db.Index("ix_ad_recinto_fecha", "id_recinto", "fecha"),
+        {"mysql_charset": "utf8mb4", "mysql_collate": "utf8mb4_unicode_ci"},
+    )
+
+    def __repr__(self):
+        return f"<AttendanceDaily {self.fecha} recinto={self.id_recinto} cuenta={self.cuenta_area} cargo={self.cargo_resumido}>"
+
+
+# =======================================
+#  Sketches HyperLogLog de trabajadores presentes (attendance_hll)
+#  Uno por (fecha, recinto, cuenta): 2^12 registros uint8 comprimidos con zlib.
+#  Los mantiene app.hll junto con attendance_daily (`flask rollup refresh`).
+# =======================================
+class AttendanceHll(db.Model):
+    __tablename__ = "attendance_hll"
+
+    fecha       = db.Column(db.Date, primary_key=True)
+    id_recinto  = db.Column(db.Integer, primary_key=True)         # 0 = sin recinto
+    cuenta_area = db.Column(db.String(120), primary_key=True)     # '' = sin cuenta
+    sketch      = db.Column(db.LargeBinary, nullable=False)
+
+    __table_args__ = (
+        db.Index("ix_ahll_recinto_fecha", "id_recinto", "fecha"),
+        {"mysql_charset": "utf8mb4", "mysql_collate": "utf8mb4_unicode_ci"},
+    )
+
+    def __repr__(self):
+        return f"<AttendanceHll {self.fecha} recinto={self.id_recinto} cuenta={self.cuenta_area}>"
+
+
+# Marca de agua de los rollups: último id procesado por tabla de origen
+class RollupState(db.Model):
+    __tablename__ = "rollup_state"
+
+    source       = db.Column(db.String(64), primary_key=True)     # tabla de origen (app.rollup.SOURCES)
+    last_id      = db.Column(db.BigInteger, nullable=False, default=0)
+    refreshed_at = db.Column(db.DateTime, nullable=True)
+
+    def __repr__(self):
+        return f"<RollupState {self.source} last_id={self.last_id}>"
+
+
+# =======================================
+#  Uso observado de los reportes (access_stats), para precalentar la caché
+#  Una fila por (vista, params con fechas relativas, huella del alcance, hora, cierre de mes).
+#  La escribe app.warmup.flush(); la lee `flask cache warm`.
+# =======================================
+class AccessStat(db.Model):
+    __tablename__ = "access_stats"
+
+    endpoint  = db.Column(db.String(120), primary_key=True)
+    args_hash = db.Column(db.CHAR(40), primary_key=True)            # sha1(args)
+    scope_fp  = db.Column(db.CHAR(16), primary_key=True)            # AccessScope.fingerprint
+    hour      = db.Column(TINYINT(unsigned=True), primary_key=True)  # 0..23
+    cierre    = db.Column(db.Boolean, primary_key=True)             # ventana de cierre de mes
+
+    args     = db.Column(db.String(1000), nullable=False)            # query string, fechas "@d0", "@m-1"...
+    user_id  = db.Column(BIGINT(unsigned=True), nullable=True)       # último usuario visto con ese alcance
+    hits     = db.Column(INTEGER(unsigned=True), nullable=False, default=0)
+    last_hit = db.Column(db.DateTime, nullable=False)
+
+    __table_args__ = (
+        db.Index("ix_as_hour_cierre", "hour", "cierre", "last_hit"),
+        {"mysql_charset": "utf8mb4", "mysql_collate": "utf8mb4_unicode_ci"},
+    )
+
+    def __repr__(self):
+        return f"<AccessStat {self.endpoint} {self.args} h={self.hour} hits={self.hits}>"
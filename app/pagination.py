@@ -0,0 +1,307 @@
+# app/pagination.py
+"""
+Paginación por keyset (cursor) para las APIs de reportes.
+
+Con LIMIT :limit OFFSET :offset la página 200 obliga a MySQL a generar y
+descartar todas las filas anteriores. Con keyset cada página arranca donde
+terminó la anterior (WHERE clave > última clave) y no se descarta nada.
+Cuánto cuesta cada página depende de la consulta: si el ORDER BY sigue un
+índice, la página 200 cuesta lo mismo que la 1; en los reportes sobre una tabla
+derivada con DISTINCT y claves calculadas (horas trabajadas, inasistencias)
+MySQL igual materializa y ordena el conjunto filtrado en cada página, y lo que
+se ahorra es el descarte del OFFSET. Window.inner() empuja además la primera
+columna de la clave al WHERE interno cuando es una columna indexada de la base
+(inasistencias: la fecha): se materializa solo lo que queda desde el cursor.
+
+    KS = Keyset(("t.fecha_real", True), ("COALESCE(t.recinto, 0)", False), ...)
+    w = window(KS, per_page, tables=(...))        # lee ?cursor= / ?page= / ?include_total=
+    sql = f"SELECT t.*, {w.select()} FROM (...) t WHERE ... {w.where} ORDER BY {w.order_by} LIMIT :limit OFFSET :offset"
+    items, meta = w.finish(db.session.execute(text(sql), {**params, **w.params}).mappings().all())
+    total = w.total(SET_SQL, params)              # SET_SQL: el conjunto sin paginar
+
+- Keyset: columnas de orden (expresión SQL, desc). Deben formar un orden total
+  (todas las columnas del DISTINCT / GROUP BY) y no ser NULL: textos con
+  text_key(), el resto con COALESCE a un centinela (el mismo valor se usa en
+  ORDER BY y en el WHERE).
+- Cursores opacos: valores de la clave de la primera/última fila, firmados
+  (itsdangerous) y atados al reporte + filtros + alcance: un cursor no sirve
+  para otro reporte ni para otros filtros (400).
+- ?page= sigue funcionando (OFFSET) para clientes antiguos; sus respuestas
+  también traen next_cursor / prev_cursor para pasarse a cursores.
+- Total (?include_total=): se cuenta una vez por (reporte, filtros, alcance,
+  marca de agua) y se guarda en app.cache; las páginas siguientes no vuelven a
+  contar. Si hay que contar en modo página, va en la misma consulta
+  (COUNT(*) OVER()). include_total=false no cuenta (scroll infinito) y
+  include_total=estimate usa el total guardado o la estimación del planificador.
+"""
+from __future__ import annotations
+
+import hashlib
+import re
+from dataclasses import dataclass, field
+from datetime import date, datetime
+from decimal import Decimal
+
+from flask import abort, current_app, jsonify, make_response, request
+from itsdangerous import BadSignature, URLSafeSerializer
+from sqlalchemy import text
+
+from app.cache import peek, remember
+from app.extensions import db
+from app.permissions import current_scope
+from app.watermark import normalized_args
+
+_SALT = "report-cursor"
+# parámetros que no definen el conjunto de resultados
+_PAGING_ARGS = ("cursor", "page", "per_page", "include_total")
+_TOTAL_MODES = {"true": "exact", "1": "exact", "false": "none", "0": "none", "estimate": "estimate"}
+_EXPLAIN_ROWS = re.compile(r"rows=([0-9.e+]+)")
+
+
+def text_key(expr: str) -> str:
+    """
+    Texto anulable como columna de clave. COALESCE(x, '') empataría NULL con '';
+    con el prefijo, NULL -> '' queda antes que '' -> '~' (como NULL en ASC) y el
+    orden entre valores no cambia.
+    """
+    return f"COALESCE(CONCAT('~', {expr}), '')"
+
+
+class Keyset:
+    """Orden total de un reporte: columnas (expresión SQL, desc)."""
+
+    def __init__(self, *cols: tuple[str, bool]):
+        self.cols = cols
+
+    def select(self) -> str:
+        """Columnas de la clave para el SELECT (alias _k0, _k1, ...)."""
+        return ", ".join(f"{expr} AS _k{i}" for i, (expr, _) in enumerate(self.cols))
+
+    def order_by(self, reverse: bool = False) -> str:
+        return ", ".join(f"{expr} {'DESC' if desc != reverse else 'ASC'}" for expr, desc in self.cols)
+
+    def after(self, values: list, reverse: bool = False) -> tuple[str, dict]:
+        """
+        ' AND (...)' con las filas estrictamente posteriores a `values` en el orden
+        (anteriores con reverse=True). Forma expandida: admite ASC y DESC mezclados.
+        """
+        ors, params = [], {}
+        for i, (expr, desc) in enumerate(self.cols):
+            op = "<" if desc != reverse else ">"
+            ands = [f"{self.cols[j][0]} = :ks_{j}" for j in range(i)]
+            ands.append(f"{expr} {op} :ks_{i}")
+            ors.append("(" + " AND ".join(ands) + ")")
+            params[f"ks_{i}"] = values[i]
+        return " AND (" + " OR ".join(ors) + ") ", params
+
+    def key_of(self, row) -> list:
+        return [row[f"_k{i}"] for i in range(len(self.cols))]
+
+    def strip(self, row) -> dict:
+        # columnas técnicas: _k* (clave) y _total (COUNT(*) OVER())
+        return {k: v for k, v in dict(row).items() if not k.startswith("_")}
+
+
+# ------------------------------ cursores ------------------------------
+def _serializer() -> URLSafeSerializer:
+    return URLSafeSerializer(current_app.config["SECRET_KEY"], salt=_SALT)
+
+
+def _dump(v):
+    # JSON con tipo: las fechas / decimales deben volver como el mismo tipo para el WHERE
+    if isinstance(v, datetime):
+        return {"t": v.isoformat()}
+    if isinstance(v, date):
+        return {"d": v.isoformat()}
+    if isinstance(v, Decimal):
+        return {"n": str(v)}
+    return v
+
+
+def _load(v):
+    if isinstance(v, dict):
+        if "t" in v:
+            return datetime.fromisoformat(v["t"])
+        if "d" in v:
+            return date.fromisoformat(v["d"])
+        if "n" in v:
+            return Decimal(v["n"])
+    return v
+
+
+def _query_fp() -> str:
+    """Huella de reporte + filtros + alcance (sin los parámetros de paginación)."""
+    raw = "\x1f".join((request.endpoint or request.path, normalized_args(_PAGING_ARGS),
+                       current_scope().fingerprint))
+    return hashlib.sha1(raw.encode("utf-8")).hexdigest()[:16]
+
+
+def encode_cursor(values: list, direction: str) -> str:
+    return _serializer().dumps({"k": [_dump(v) for v in values], "d": direction, "q": _query_fp()})
+
+
+def decode_cursor(token: str, size: int) -> tuple[list, str]:
+    """(valores, 'n'|'p'); aborta con 400 si el cursor es inválido o de otra consulta."""
+    def bad(msg):
+        abort(make_response(jsonify({"error": msg}), 400))
+
+    try:
+        data = _serializer().loads(token)
+    except BadSignature:
+        bad("Cursor inválido.")
+    if not isinstance(data, dict) or data.get("d") not in ("n", "p") or len(data.get("k") or ()) != size:
+        bad("Cursor inválido.")
+    if data.get("q") != _query_fp():
+        bad("El cursor corresponde a otro reporte o a otros filtros.")
+    return [_load(v) for v in data["k"]], data["d"]
+
+
+# ------------------------------ total ------------------------------
+def _total_namespace() -> str:
+    return f"total:{request.endpoint}"
+
+
+def count_rows(set_sql: str, params: dict) -> int:
+    return int(db.session.execute(text(f"SELECT COUNT(*) FROM ({set_sql}) q"), params).scalar() or 0)
+
+
+def estimate_rows(set_sql: str, params: dict) -> int | None:
+    """Filas estimadas por el planificador (EXPLAIN FORMAT=TREE, no ejecuta la consulta)."""
+    try:
+        plan = db.session.execute(text(f"EXPLAIN FORMAT=TREE {set_sql}"), params).scalar() or ""
+    except Exception:
+        current_app.logger.exception("EXPLAIN para estimar el total falló")
+        return None
+    m = _EXPLAIN_ROWS.search(plan)
+    return int(float(m.group(1))) if m else None
+
+
+# ------------------------------ ventana ------------------------------
+@dataclass
+class Window:
+    keyset: Keyset
+    per_page: int
+    page: int | None                 # None en modo cursor
+    direction: str | None = None     # 'n' (siguiente) | 'p' (anterior) en modo cursor
+    where: str = ""
+    params: dict = field(default_factory=dict)
+    tables: tuple = ()               # fuentes del reporte (marca de agua del total)
+    total_mode: str = "exact"        # exact | none | estimate
+    known_total: int | None = None   # total ya guardado en app.cache
+    estimated: bool = False
+    _rows: list = field(default_factory=list)
+
+    @property
+    def cursor_mode(self) -> bool:
+        return self.page is None
+
+    @property
+    def order_by(self) -> str:
+        # hacia atrás se recorre en orden inverso y luego se da vuelta la página
+        return self.keyset.order_by(reverse=self.direction == "p")
+
+    @property
+    def count_inline(self) -> bool:
+        """True si el total sale de la misma consulta de la página (modo página, sin total guardado)."""
+        return self.total_mode == "exact" and self.known_total is None and not self.cursor_mode
+
+    def select(self) -> str:
+        """Columnas de la clave para el SELECT, más COUNT(*) OVER() AS _total cuando corresponde."""
+        cols = self.keyset.select()
+        return cols + ", COUNT(*) OVER() AS _total" if self.count_inline else cols
+
+    def inner(self, col: str) -> str:
+        """
+        ' AND col <= :ks_0' (o >=) para el WHERE de la consulta interna, en modo
+        cursor. Solo si la primera columna del keyset ES `col` (mismo valor, sin
+        COALESCE): es un filtro más amplio que w.where (incluye los empates), que
+        acota lo que se materializa con el índice de `col`. El total no lo lleva.
+        """
+        if not self.cursor_mode:
+            return ""
+        op = "<=" if self.keyset.cols[0][1] != (self.direction == "p") else ">="
+        return f" AND {col} {op} :ks_0 "
+
+    def finish(self, rows) -> tuple[list[dict], dict]:
+        """Filas (LIMIT per_page + 1) -> (items sin columnas técnicas, meta de navegación)."""
+        rows = self._rows = list(rows)
+        more = len(rows) > self.per_page
+        rows = rows[:self.per_page]
+        if self.direction == "p":
+            rows.reverse()
+
+        if self.cursor_mode:
+            has_next = more if self.direction == "n" else True
+            has_prev = more if self.direction == "p" else True
+        else:
+            has_next, has_prev = more, self.page > 1
+
+        ks = self.keyset
+        meta = {
+            "has_next": has_next and bool(rows),
+            "has_prev": has_prev and (bool(rows) or not self.cursor_mode),
+            "next_cursor": encode_cursor(ks.key_of(rows[-1]), "n") if has_next and rows else None,
+            "prev_cursor": encode_cursor(ks.key_of(rows[0]), "p") if has_prev and rows else None,
+        }
+        return [ks.strip(r) for r in rows], meta
+
+    def total(self, set_sql: str, params: dict) -> int | None:
+        """
+        Total del reporte según include_total. set_sql: el conjunto completo sin
+        paginar (sin ORDER BY / LIMIT), para contar o estimar si hace falta. Debe
+        ser exactamente el FROM / WHERE / GROUP BY de la página: el COUNT(*) OVER()
+        de la página y este COUNT se guardan en la misma clave.
+        """
+        if self.total_mode == "none":
+            return None
+        if self.known_total is not None:
+            return self.known_total
+        if self.count_inline and (self._rows or self.page == 1):
+            n = int(self._rows[0]["_total"]) if self._rows else 0
+        elif self.total_mode == "estimate":
+            self.estimated = True
+            return estimate_rows(set_sql, params)
+        else:
+            # con cursor, o página fuera de rango: COUNT aparte (también queda guardado)
+            return remember(_total_namespace(), lambda: count_rows(set_sql, params),
+                            tables=self.tables, exclude_args=_PAGING_ARGS)
+        return remember(_total_namespace(), lambda: n, tables=self.tables, exclude_args=_PAGING_ARGS)
+
+    def paging(self, total: int | None) -> dict:
+        """
+        per_page / total, y page / pages en modo página con total exacto
+        (con cursor no hay número de página). total_estimated si es una estimación.
+        """
+        out = {"per_page": self.per_page, "total": total}
+        if self.estimated:
+            out["total_estimated"] = True
+        if not self.cursor_mode:
+            out["page"] = self.page
+            if total is not None and not self.estimated:
+                out["pages"] = (total + self.per_page - 1) // self.per_page
+        return out
+
+
+def window(keyset: Keyset, per_page: int, tables=()) -> Window:
+    """
+    Ventana del request: con ?cursor= keyset (OFFSET 0); si no, ?page= (OFFSET clásico).
+    params trae limit (per_page + 1, para saber si hay más) y offset.
+    tables: fuentes del reporte, para guardar el total con su marca de agua.
+    """
+    mode = _TOTAL_MODES.get((request.args.get("include_total") or "true").strip().lower(), "exact")
+    known = None if mode == "none" else peek(_total_namespace(), tables=tables, exclude_args=_PAGING_ARGS)
+    common = {"tables": tuple(tables), "total_mode": mode, "known_total": known}
+
+    token = (request.args.get("cursor") or "").strip()
+    if token:
+        values, direction = decode_cursor(token, len(keyset.cols))
+        where, params = keyset.after(values, reverse=direction == "p")
+        return Window(keyset, per_page, None, direction, where,
+                      {**params, "limit": per_page + 1, "offset": 0}, **common)
+
+    try:
+        page = max(int(request.args.get("page", 1)), 1)
+    except (TypeError, ValueError):
+        page = 1
+    return Window(keyset, per_page, page, None, "",
+                  {"limit": per_page + 1, "offset": (page - 1) * per_page}, **common)
@@ -0,0 +1,256 @@
+# app/permissions.py
+"""
+Snapshot de permisos por usuario (recintos y cuentas) con caché entre requests.
+
+- Una sola consulta arma todo lo que necesitan los helpers de acceso de
+  dashboard y desvinculaciones.
+- Cada snapshot vive PERM_CACHE_TTL segundos en memoria del worker.
+- Las escrituras de admin/scopes llaman a grants_changed(): eso sube una
+  versión compartida (archivo en disco) y los 3 workers de gunicorn dejan
+  de servir snapshots anteriores al cambio.
+- current_scope() expone un AccessScope por request (memoizado en flask.g)
+  que consumen todos los blueprints. Con token de API (app.api_tokens) el
+  AccessScope lo arma el token (mismo snapshot, acotado a sus recintos).
+- Además, rebuild_effective_scope() mantiene la tabla materializada
+  user_effective_scope (user_id, obra_id, cuenta_code) que usan los reportes
+  para filtrar con un join indexado.
+"""
+from __future__ import annotations
+
+import hashlib
+import os
+import threading
+import time
+from dataclasses import dataclass, field
+from typing import Iterable
+
+from flask import current_app, g
+from flask_login import current_user
+from sqlalchemy import text
+
+from app.extensions import db
+
+
+@dataclass(frozen=True)
+class PermissionSnapshot:
+    user_id: int
+    # OBRA_ID visibles (user_cuentas -> recinto_cuentas -> recintos.code)
+    recinto_ids: frozenset = field(default_factory=frozenset)
+    # {obra_id: frozenset(cuenta_code)} solo con cuentas activas
+    cuentas_por_recinto: dict = field(default_factory=dict)
+    # códigos de cuenta asignados (user_cuentas), tengan o no recinto vinculado
+    area_codes: frozenset = field(default_factory=frozenset)
+
+
+_SQL_SNAPSHOT = text("""
+    SELECT
+      c.code                   AS cuenta_code,
+      c.is_active              AS cuenta_activa,
+      CAST(r.code AS UNSIGNED) AS obra_id
+    FROM user_cuentas uc
+    JOIN cuentas c               ON c.id = uc.cuenta_id
+    LEFT JOIN recinto_cuentas rc ON rc.cuenta_id = uc.cuenta_id AND rc.is_active = 1
+    LEFT JOIN recintos r         ON r.id = rc.recinto_id
+    WHERE uc.user_id = :uid AND uc.is_active = 1
+""")
+
+_lock = threading.Lock()
+_cache: dict[int, tuple[int, float, PermissionSnapshot]] = {}
+
+
+# ------------------------- versión compartida -------------------------
+def _version_path() -> str:
+    return current_app.config["PERM_CACHE_VERSION_FILE"]
+
+
+def grants_version() -> int:
+    """Versión global de permisos (mtime del archivo compartido, en ns)."""
+    try:
+        return os.stat(_version_path()).st_mtime_ns
+    except OSError:
+        return 0
+
+
+def _bump_version() -> None:
+    path = _version_path()
+    # utime con ns explícitos: evita que dos bumps caigan en el mismo tick del FS
+    new = max(time.time_ns(), grants_version() + 1)
+    try:
+        with open(path, "a"):
+            pass
+        os.utime(path, ns=(new, new))
+    except OSError:
+        current_app.logger.exception("No se pudo actualizar la versión de permisos (%s)", path)
+
+
+# ------------------------------ carga ------------------------------
+def _load_snapshot(uid: int) -> PermissionSnapshot:
+    rows = db.session.execute(_SQL_SNAPSHOT, {"uid": uid}).mappings().all()
+
+    recintos: set[int] = set()
+    per: dict[int, set[str]] = {}
+    codes: set[str] = set()
+    for r in rows:
+        codes.add(r["cuenta_code"])
+        if r["obra_id"] is None:
+            continue
+        rid = int(r["obra_id"])
+        recintos.add(rid)
+        if r["cuenta_activa"]:
+            per.setdefault(rid, set()).add(r["cuenta_code"])
+
+    return PermissionSnapshot(
+        user_id=uid,
+        recinto_ids=frozenset(recintos),
+        cuentas_por_recinto={rid: frozenset(ctas) for rid, ctas in per.items()},
+        area_codes=frozenset(codes),
+    )
+
+
+def get_snapshot(uid: int) -> PermissionSnapshot:
+    """Snapshot de permisos del usuario (desde caché si sigue vigente)."""
+    uid = int(uid)
+    version = grants_version()
+    now = time.monotonic()
+
+    with _lock:
+        hit = _cache.get(uid)
+    if hit and hit[0] == version and hit[1] > now:
+        return hit[2]
+
+    snap = _load_snapshot(uid)
+    ttl = current_app.config.get("PERM_CACHE_TTL", 60)
+    with _lock:
+        _cache[uid] = (version, now + ttl, snap)
+    return snap
+
+
+def grants_changed(uid: int | None = None) -> None:
+    """
+    Llamar DESPUÉS del commit de cualquier cambio de permisos.
+    uid=None invalida a todos los usuarios.
+    """
+    with _lock:
+        if uid is None:
+            _cache.clear()
+        else:
+            _cache.pop(int(uid), None)
+    _bump_version()
+
+
+# ------------------------- alcance por request -------------------------
+@dataclass(frozen=True)
+class AccessScope:
+    """
+    Alcance del usuario actual, resuelto una vez por request.
+      - recinto_ids / cuentas_por_recinto / cuentas_flat = None  => sin restricción (admin / nivel 1)
+      - vacíos                                                  => sin acceso
+    area_codes: cuentas de user_cuentas (desvinculaciones), siempre restringe.
+    """
+    user_id: int | None
+    recinto_ids: frozenset | None
+    cuentas_por_recinto: dict | None
+    cuentas_flat: frozenset | None
+    area_codes: frozenset
+    # "db": resuelto desde user_cuentas (coincide con user_effective_scope)
+    # "token": resuelto para un token de API firmado (puede ser más acotado)
+    source: str = "db"
+
+    @property
+    def unrestricted(self) -> bool:
+        return self.recinto_ids is None
+
+    @property
+    def materialized_uid(self) -> int | None:
+        """uid para filtrar contra user_effective_scope; None si el alcance no vive en esa tabla."""
+        return self.user_id if self.source == "db" else None
+
+    @property
+    def fingerprint(self) -> str:
+        """
+        Huella estable del alcance (no del usuario): dos usuarios con los mismos
+        recintos/cuentas comparten huella. Sirve para ETags y claves de caché.
+        """
+        if self.unrestricted:
+            body = "*|" + ",".join(sorted(self.area_codes))
+        else:
+            pairs = sorted((rid, c) for rid, ctas in (self.cuentas_por_recinto or {}).items() for c in ctas)
+            body = "|".join((
+                ",".join(str(r) for r in sorted(self.recinto_ids)),
+                ",".join(f"{r}:{c}" for r, c in pairs),
+                ",".join(sorted(self.area_codes)),
+            ))
+        return hashlib.sha1(body.encode("utf-8")).hexdigest()[:16]
+
+
+_NO_ACCESS = AccessScope(None, frozenset(), {}, frozenset(), frozenset())
+
+
+def _is_unrestricted(user) -> bool:
+    """Admin o nivel 1 (puede ver todo)."""
+    try:
+        return bool(user.is_admin_or_level1())
+    except Exception:
+        return False
+
+
+def _build_scope(user) -> AccessScope:
+    if not getattr(user, "is_authenticated", False):
+        return _NO_ACCESS
+
+    # token de API: alcance ya resuelto (y validada su huella) al verificar el token
+    embedded = getattr(user, "access_scope", None)
+    if embedded is not None:
+        return embedded
+
+    snap = get_snapshot(user.id)
+    if _is_unrestricted(user):
+        return AccessScope(snap.user_id, None, None, None, snap.area_codes)
+
+    per = {rid: ctas for rid, ctas in snap.cuentas_por_recinto.items()
+           if rid in snap.recinto_ids and ctas}
+    flat = frozenset(c for ctas in per.values() for c in ctas)
+    return AccessScope(snap.user_id, snap.recinto_ids, per, flat, snap.area_codes)
+
+
+def current_scope() -> AccessScope:
+    """AccessScope del request actual (una sola resolución por request)."""
+    scope = g.get("_access_scope")
+    if scope is None:
+        scope = g._access_scope = _build_scope(current_user)
+    return scope
+
+
+# ------------------- alcance efectivo materializado -------------------
+_SQL_SCOPE_INSERT = """
+    INSERT IGNORE INTO user_effective_scope (user_id, obra_id, cuenta_code)
+    SELECT DISTINCT uc.user_id, CAST(r.code AS UNSIGNED), c.code
+    FROM user_cuentas uc
+    JOIN cuentas c          ON c.id = uc.cuenta_id AND c.is_active = 1
+    JOIN recinto_cuentas rc ON rc.cuenta_id = uc.cuenta_id AND rc.is_active = 1
+    JOIN recintos r         ON r.id = rc.recinto_id
+    WHERE uc.is_active = 1
+"""
+
+
+def rebuild_effective_scope(uid: int | Iterable[int] | None = None) -> int:
+    """
+    Reconstruye user_effective_scope para un usuario, una lista de usuarios
+    (aprovisionamiento masivo) o para todos si uid=None.
+    Corre dentro de la transacción actual: llamar ANTES del commit del cambio
+    de permisos para que ambos queden atómicos. Retorna filas insertadas.
+    """
+    if uid is None:
+        db.session.execute(text("DELETE FROM user_effective_scope"))
+        res = db.session.execute(text(_SQL_SCOPE_INSERT))
+    elif isinstance(uid, int):
+        params = {"uid": int(uid)}
+        db.session.execute(text("DELETE FROM user_effective_scope WHERE user_id = :uid"), params)
+        res = db.session.execute(text(_SQL_SCOPE_INSERT + " AND uc.user_id = :uid"), params)
+    else:
+        params = {"uids": tuple(sorted({int(u) for u in uid}))}
+        if not params["uids"]:
+            return 0
+        db.session.execute(text("DELETE FROM user_effective_scope WHERE user_id IN :uids"), params)
+        res = db.session.execute(text(_SQL_SCOPE_INSERT + " AND uc.user_id IN :uids"), params)
+    return res.rowcount or 0
@@ -0,0 +1,100 @@
+# app/principal.py
+"""
+Principal liviano para Flask-Login.
+
+load_user ya no materializa el modelo User completo (role joined + recintos
+selectin + UserRecinto/Recinto en cascada) en cada request: solo carga
+id, email, nombre, rol, must_change_password y el flag de superadmin,
+con UNA consulta. El resultado se guarda en la sesión firmada y se
+revalida cada PRINCIPAL_REVALIDATE_SECONDS.
+
+Las páginas que necesitan el ORM completo llaman a principal.load_model().
+"""
+from __future__ import annotations
+
+import time
+
+from flask import current_app, session
+from sqlalchemy import text
+
+from app.extensions import db
+
+_SESSION_KEY = "_principal"
+
+_SQL_PRINCIPAL = text("""
+    SELECT
+      u.id, u.email, u.name, u.is_active, u.must_change_password,
+      r.code  AS role_code,
+      r.level AS role_level,
+      (sa.user_id IS NOT NULL) AS is_superadmin
+    FROM users u
+    JOIN roles r            ON r.id = u.role_id
+    LEFT JOIN superadmins sa ON sa.user_id = u.id
+    WHERE u.id = :uid
+""")
+
+
+class Principal:
+    """Usuario autenticado con lo mínimo que usan los decoradores y templates."""
+
+    is_authenticated = True
+    is_anonymous = False
+
+    def __init__(self, id, email, name, is_active, must_change_password,
+                 role_code, role_level, is_superadmin):
+        self.id = int(id)
+        self.email = email
+        self.name = name
+        self.is_active = bool(is_active)
+        self.must_change_password = bool(must_change_password)
+        self.role_code = role_code
+        self.role_level = role_level
+        self.is_superadmin = bool(is_superadmin)
+
+    def get_id(self) -> str:
+        return str(self.id)
+
+    def load_model(self):
+        """Modelo User completo (solo para las páginas que lo editan)."""
+        from app.models import User
+        return db.session.get(User, self.id)
+
+    def to_session(self) -> dict:
+        return {
+            "id": self.id, "email": self.email, "name": self.name,
+            "is_active": self.is_active, "must_change_password": self.must_change_password,
+            "role_code": self.role_code, "role_level": self.role_level,
+            "is_superadmin": self.is_superadmin,
+        }
+
+    def __repr__(self):
+        return f"<Principal {self.email}>"
+
+
+def load_principal(user_id) -> Principal | None:
+    """Principal desde la sesión firmada si está fresco; si no, desde la BD (1 consulta)."""
+    uid = int(user_id)
+    ttl = current_app.config.get("PRINCIPAL_REVALIDATE_SECONDS", 60)
+
+    cached = session.get(_SESSION_KEY)
+    if cached and cached.get("data", {}).get("id") == uid and time.time() - cached.get("ts", 0) < ttl:
+        return Principal(**cached["data"])
+
+    p = fetch_principal(uid)
+    if p is None:
+        session.pop(_SESSION_KEY, None)
+        return None
+
+    session[_SESSION_KEY] = {"data": p.to_session(), "ts": time.time()}
+    return p
+
+
+def fetch_principal(user_id) -> Principal | None:
+    """Principal directo desde la BD, sin tocar la sesión (emisión de tokens, CLI)."""
+    row = db.session.execute(_SQL_PRINCIPAL, {"uid": int(user_id)}).mappings().first()
+    return Principal(**row) if row else None
+
+
+def forget_principal() -> None:
+    """Fuerza revalidación en el próximo request (login/logout/cambio de datos propios)."""
+    session.pop(_SESSION_KEY, None)
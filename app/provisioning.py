@@ -0,0 +1,333 @@
+# app/provisioning.py
+"""
+Aprovisionamiento masivo de usuarios (CSV / JSON).
+
+Columnas reconocidas (CSV con encabezado, separador ',' o ';'; o JSON
+lista de objetos):
+    email*, name, password, role (code) | role_id, rut, cargo, is_active,
+    recintos (codes separados por ';' o '|'), nivel, cuentas (codes)
+
+- Las contraseñas se hashean en paralelo en un pool de procesos
+  (PBKDF2 600k: ~cientos de ms c/u; 500 usuarios ≈ minutos en serie).
+- users, user_recintos y user_cuentas se escriben con INSERT ... ON DUPLICATE
+  KEY UPDATE multi-fila, en UNA transacción junto al rebuild de
+  user_effective_scope. Si algo falla en la BD no queda nada a medias.
+- Los permisos son aditivos: recintos/cuentas que no vienen en el archivo
+  no se revocan.
+- Usuario nuevo sin password -> se genera una temporal (se muestra solo en
+  el reporte) y must_change_password=1. Usuario existente sin password ->
+  conserva su hash.
+"""
+from __future__ import annotations
+
+import csv
+import io
+import json
+import re
+import secrets
+from dataclasses import dataclass, field
+from datetime import date
+
+from flask import current_app
+from sqlalchemy import text
+
+from app.extensions import db
+from app.permissions import grants_changed, rebuild_effective_scope
+from app.security import hash_passwords_many
+
+_EMAIL_RE = re.compile(r"^[^@\s]+@[^@\s]+\.[^@\s]+$")
+_LIST_SPLIT_RE = re.compile(r"[;|,]")
+_TRUE = {"1", "true", "si", "sí", "s", "yes", "y", "x", "activo"}
+_FALSE = {"0", "false", "no", "n", "inactivo"}
+
+
+class ProvisioningError(Exception):
+    """Archivo ilegible o sin filas (no se procesa nada)."""
+
+
+@dataclass
+class RowResult:
+    line: int                          # fila de datos (1 = primera, sin contar encabezado)
+    email: str
+    status: str = "pending"            # created | updated | error | pending (dry-run)
+    user_id: int | None = None
+    recintos: int = 0
+    cuentas: int = 0
+    temp_password: str | None = None
+    errors: list[str] = field(default_factory=list)
+
+    def to_dict(self) -> dict:
+        return {
+            "line": self.line, "email": self.email, "status": self.status,
+            "user_id": self.user_id, "recintos": self.recintos, "cuentas": self.cuentas,
+            "temp_password": self.temp_password, "errors": self.errors,
+        }
+
+
+# ------------------------------ lectura ------------------------------
+def parse_payload(raw: bytes | str, filename: str | None = None) -> list[dict]:
+    """CSV o JSON -> lista de dicts (claves en minúscula)."""
+    if isinstance(raw, bytes):
+        raw = raw.decode("utf-8-sig", errors="replace")
+    body = raw.strip()
+    if not body:
+        raise ProvisioningError("El archivo está vacío.")
+
+    is_json = (filename or "").lower().endswith(".json") or body[0] in "[{"
+    if is_json:
+        try:
+            data = json.loads(body)
+        except ValueError as e:
+            raise ProvisioningError(f"JSON inválido: {e}") from e
+        if isinstance(data, dict):
+            data = data.get("users") or data.get("rows") or []
+        if not isinstance(data, list) or not all(isinstance(r, dict) for r in data):
+            raise ProvisioningError("El JSON debe ser una lista de objetos (o {\"users\": [...]}).")
+        rows = data
+    else:
+        first = body.splitlines()[0]
+        delim = ";" if first.count(";") > first.count(",") else ","
+        rows = list(csv.DictReader(io.StringIO(body), delimiter=delim))
+
+    out = [{(k or "").strip().lower(): v for k, v in r.items()} for r in rows]
+    if not out:
+        raise ProvisioningError("No hay filas para procesar.")
+    return out
+
+
+def _s(v) -> str:
+    return "" if v is None else str(v).strip()
+
+
+def _codes(v) -> list[str]:
+    if isinstance(v, (list, tuple)):
+        items = v
+    else:
+        items = _LIST_SPLIT_RE.split(_s(v))
+    return list(dict.fromkeys(_s(x) for x in items if _s(x)))
+
+
+def _flag(v, default: bool) -> bool | None:
+    if isinstance(v, bool):
+        return v
+    s = _s(v).lower()
+    if not s:
+        return default
+    if s in _TRUE:
+        return True
+    if s in _FALSE:
+        return False
+    return None
+
+
+# ------------------------------ catálogos ------------------------------
+def _catalogs() -> dict:
+    roles = db.session.execute(text("SELECT id, code FROM roles")).all()
+    recintos = db.session.execute(text("SELECT id, code FROM recintos WHERE is_active = 1")).all()
+    cuentas = db.session.execute(text("SELECT id, code FROM cuentas WHERE is_active = 1")).all()
+    return {
+        "role_by_code": {c.lower(): int(i) for i, c in roles},
+        "role_ids": {int(i) for i, _ in roles},
+        "recinto_by_code": {str(c).upper(): int(i) for i, c in recintos},
+        "cuenta_by_code": {str(c).upper(): int(i) for i, c in cuentas},
+    }
+
+
+# ------------------------------ proceso ------------------------------
+def provision_users(rows: list[dict], default_role: str | None = None,
+                    granted_by: int | None = None, dry_run: bool = False,
+                    workers: int | None = None) -> list[RowResult]:
+    """
+    Valida, hashea y escribe. Las filas con error se reportan y se omiten;
+    las válidas se escriben todas juntas (una transacción).
+    """
+    max_rows = int(current_app.config.get("PROVISION_MAX_ROWS", 5000))
+    if len(rows) > max_rows:
+        raise ProvisioningError(f"Máximo {max_rows} filas por carga (vienen {len(rows)}).")
+
+    cat = _catalogs()
+    results: list[RowResult] = []
+    valid: list[tuple[RowResult, dict]] = []
+    seen: set[str] = set()
+
+    for n, r in enumerate(rows, start=1):
+        email = _s(r.get("email")).lower()
+        res = RowResult(line=n, email=email)
+        results.append(res)
+
+        if not _EMAIL_RE.match(email):
+            res.errors.append("email inválido")
+        elif email in seen:
+            res.errors.append("email repetido en el archivo")
+        seen.add(email)
+
+        role_id = None
+        raw_role_id = _s(r.get("role_id"))
+        raw_role = _s(r.get("role")) or (default_role or "")
+        if raw_role_id:
+            role_id = int(raw_role_id) if raw_role_id.isdigit() and int(raw_role_id) in cat["role_ids"] else None
+            if role_id is None:
+                res.errors.append(f"role_id desconocido: {raw_role_id}")
+        elif raw_role:
+            role_id = cat["role_by_code"].get(raw_role.lower())
+            if role_id is None:
+                res.errors.append(f"rol desconocido: {raw_role}")
+        else:
+            res.errors.append("falta rol (columna role/role_id o rol por defecto)")
+
+        is_active = _flag(r.get("is_active"), True)
+        if is_active is None:
+            res.errors.append(f"is_active inválido: {_s(r.get('is_active'))}")
+
+        nivel = _s(r.get("nivel")) or "1"
+        if nivel not in ("1", "2", "3"):
+            res.errors.append(f"nivel inválido: {nivel}")
+
+        recinto_ids, cuenta_ids = [], []
+        for code in _codes(r.get("recintos")):
+            rid = cat["recinto_by_code"].get(code.upper())
+            if rid is None:
+                res.errors.append(f"recinto desconocido: {code}")
+            else:
+                recinto_ids.append(rid)
+        for code in _codes(r.get("cuentas")):
+            cid = cat["cuenta_by_code"].get(code.upper())
+            if cid is None:
+                res.errors.append(f"cuenta desconocida: {code}")
+            else:
+                cuenta_ids.append(cid)
+
+        if res.errors:
+            res.status = "error"
+            continue
+
+        valid.append((res, {
+            "email": email,
+            "name": _s(r.get("name")) or email,
+            "rut": _s(r.get("rut")) or None,
+            "cargo": _s(r.get("cargo")) or None,
+            "password": _s(r.get("password")),
+            "role_id": role_id,
+            "is_active": int(is_active),
+            "nivel": int(nivel),
+            "recinto_ids": recinto_ids,
+            "cuenta_ids": cuenta_ids,
+        }))
+
+    if not valid:
+        return results
+
+    emails = tuple(v["email"] for _, v in valid)
+    existing = {
+        e.lower(): int(i) for i, e in db.session.execute(
+            text("SELECT id, email FROM users WHERE email IN :emails"), {"emails": emails}
+        ).all()
+    }
+
+    # contraseñas: explícitas, temporales (nuevos sin password) o se conserva el hash
+    to_hash: list[tuple[int, str]] = []
+    for idx, (res, v) in enumerate(valid):
+        v["must_change"] = 0
+        if not v["password"] and v["email"] not in existing:
+            v["password"] = res.temp_password = secrets.token_urlsafe(9)
+            v["must_change"] = 1
+        if v["password"]:
+            to_hash.append((idx, v["password"]))
+        res.status = "updated" if v["email"] in existing else "created"
+        res.recintos, res.cuentas = len(v["recinto_ids"]), len(v["cuenta_ids"])
+
+    if dry_run:
+        for res, _ in valid:
+            res.status = "pending:" + res.status
+        return results
+
+    hashes = hash_passwords_many([p for _, p in to_hash], workers=workers)
+    hash_by_idx = {idx: h for (idx, _), h in zip(to_hash, hashes)}
+
+    try:
+        _write(valid, hash_by_idx, granted_by)
+        db.session.commit()
+    except Exception:
+        db.session.rollback()
+        raise
+    grants_changed()
+
+    ids = _ids_by_email(emails)
+    for res, v in valid:
+        res.user_id = ids.get(v["email"])
+    return results
+
+
+def _ids_by_email(emails: tuple[str, ...]) -> dict[str, int]:
+    return {
+        e.lower(): int(i) for i, e in db.session.execute(
+            text("SELECT id, email FROM users WHERE email IN :emails"), {"emails": emails}
+        ).all()
+    }
+
+
+# Ojo: los VALUES solo llevan placeholders para que PyMySQL reescriba el
+# executemany como un único INSERT multi-fila.
+_SQL_USERS_UPSERT = text("""
+    INSERT INTO users (email, name, rut, cargo, password_hash, role_id, is_active, must_change_password)
+    VALUES (:email, :name, :rut, :cargo, :password_hash, :role_id, :is_active, :must_change)
+    ON DUPLICATE KEY UPDATE
+        name = VALUES(name),
+        rut = COALESCE(VALUES(rut), users.rut),
+        cargo = COALESCE(VALUES(cargo), users.cargo),
+        role_id = VALUES(role_id),
+        is_active = VALUES(is_active),
+        must_change_password = IF(VALUES(password_hash) = '', users.must_change_password,
+                                  VALUES(must_change_password)),
+        password_changed_at = IF(VALUES(password_hash) = '', users.password_changed_at, NOW()),
+        password_hash = IF(VALUES(password_hash) = '', users.password_hash, VALUES(password_hash))
+""")
+
+_SQL_USER_RECINTOS_UPSERT = text("""
+    INSERT INTO user_recintos (user_id, recinto_id, nivel, desde, is_active, granted_by)
+    VALUES (:uid, :rid, :nivel, :desde, 1, :admin_id)
+    ON DUPLICATE KEY UPDATE
+        nivel = VALUES(nivel),
+        desde = LEAST(COALESCE(user_recintos.desde, VALUES(desde)), VALUES(desde)),
+        is_active = 1,
+        updated_at = NOW()
+""")
+
+_SQL_USER_CUENTAS_UPSERT = text("""
+    INSERT INTO user_cuentas (user_id, cuenta_id, is_active, granted_by)
+    VALUES (:uid, :cid, 1, :admin_id)
+    ON DUPLICATE KEY UPDATE
+        is_active = 1,
+        updated_at = NOW()
+""")
+
+
+def _write(valid: list[tuple[RowResult, dict]], hash_by_idx: dict[int, str],
+           granted_by: int | None) -> None:
+    db.session.execute(_SQL_USERS_UPSERT, [
+        {**{k: v[k] for k in ("email", "name", "rut", "cargo", "role_id", "is_active", "must_change")},
+         "password_hash": hash_by_idx.get(idx, "")}
+        for idx, (_, v) in enumerate(valid)
+    ])
+
+    ids = _ids_by_email(tuple(v["email"] for _, v in valid))
+    today = date.today()
+    ur_rows, uc_rows = [], []
+    for _, v in valid:
+        uid = ids[v["email"]]
+        ur_rows += [{"uid": uid, "rid": rid, "nivel": v["nivel"], "desde": today, "admin_id": granted_by}
+                    for rid in v["recinto_ids"]]
+        uc_rows += [{"uid": uid, "cid": cid, "admin_id": granted_by} for cid in v["cuenta_ids"]]
+
+    if ur_rows:
+        db.session.execute(_SQL_USER_RECINTOS_UPSERT, ur_rows)
+    if uc_rows:
+        db.session.execute(_SQL_USER_CUENTAS_UPSERT, uc_rows)
+    rebuild_effective_scope(ids.values())
+
+
+def summarize(results: list[RowResult]) -> dict[str, int]:
+    out: dict[str, int] = {}
+    for r in results:
+        out[r.status] = out.get(r.status, 0) + 1
+    return out
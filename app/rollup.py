@@ -0,0 +1,190 @@
+# app/rollup.py
+"""
+Rollup diario de asistencia (attendance_daily), mantenido de forma incremental.
+
+Clave: (fecha, id_recinto, cuenta_area, cargo_resumido). Por fila:
+registros / presentes (asistencia) y ausentes + desglose por motivo
+('-', V, L, P, C, NULL, otros) desde inasistencias.
+
+refresh_rollup() re-agrega SOLO los días tocados desde la última corrida:
+  - días con ids nuevos en asistencia / inasistencias / asignacion_turnos (marca de
+    agua en rollup_state; asignacion_turnos aporta la cuenta de las inasistencias),
+  - más los últimos ROLLUP_RECENT_DAYS días (la ingesta de Buk corrige el día en curso
+    en el lugar, sin ids nuevos).
+Cada tramo de días contiguos se borra y se vuelve a insertar en la misma transacción,
+así el dashboard nunca ve un día a medio recalcular. También alimenta los combos
+de filtros (app.catalogs) y, en los mismos tramos, los sketches de trabajadores
+únicos (attendance_hll, app.hll).
+"""
+from __future__ import annotations
+
+from datetime import date, datetime, timedelta
+
+from flask import current_app
+from sqlalchemy import text
+
+from app import hll
+from app.catalogs import catalogs_changed
+from app.extensions import db
+from app.watermark import forget_watermarks
+
+SOURCES = {
+    # tabla -> columna de fecha
+    "asistencia": "fecha_base",
+    "inasistencias": "fecha_inasistencia",
+    # la cuenta de las inasistencias sale de la asignación del mismo rut/día/obra
+    "asignacion_turnos": "diaTurno",
+}
+
+_SQL_INSERT_RANGE = """
+    INSERT INTO attendance_daily (
+      fecha, id_recinto, cuenta_area, cargo_resumido,
+      registros, presentes, ausentes,
+      aus_ausente, aus_vacaciones, aus_licencia, aus_permiso, aus_compensado,
+      aus_sin_registro, aus_otros
+    )
+    SELECT fecha, id_recinto, cuenta_area, cargo_resumido,
+           SUM(registros), SUM(presentes), SUM(ausentes),
+           SUM(aus_ausente), SUM(aus_vacaciones), SUM(aus_licencia), SUM(aus_permiso),
+           SUM(aus_compensado), SUM(aus_sin_registro), SUM(aus_otros)
+    FROM (
+      SELECT DATE(a.fecha_base)              AS fecha,
+             COALESCE(a.id_recinto, 0)       AS id_recinto,
+             COALESCE(a.cuenta_area, '')     AS cuenta_area,
+             COALESCE(a.cargo_resumido, '')  AS cargo_resumido,
+             COUNT(*)                                          AS registros,
+             SUM(CASE WHEN a.entrada IS NOT NULL THEN 1 ELSE 0 END) AS presentes,
+             0 AS ausentes, 0 AS aus_ausente, 0 AS aus_vacaciones, 0 AS aus_licencia,
+             0 AS aus_permiso, 0 AS aus_compensado, 0 AS aus_sin_registro, 0 AS aus_otros
+      FROM asistencia a
+      WHERE a.fecha_base >= :d0 AND a.fecha_base < :d1
+      GROUP BY 1, 2, 3, 4
+
+      UNION ALL
+
+      SELECT DATE(i.fecha_inasistencia)      AS fecha,
+             COALESCE(i.obra_id, 0)          AS id_recinto,
+             -- MIN: determinista si hay más de una asignación para el mismo rut/día/obra
+             COALESCE((SELECT MIN(at.cuenta_area)
+                         FROM asignacion_turnos at
+                        WHERE at.join_key = i.join_key
+                          AND at.uid_rut_dia_obra = i.uid_inasistencia), '') AS cuenta_area,
+             ''                              AS cargo_resumido,
+             0 AS registros, 0 AS presentes,
+             COUNT(*) AS ausentes,
+             SUM(CASE WHEN i.motivo = '-'        THEN 1 ELSE 0 END) AS aus_ausente,
+             SUM(CASE WHEN UPPER(i.motivo) = 'V' THEN 1 ELSE 0 END) AS aus_vacaciones,
+             SUM(CASE WHEN UPPER(i.motivo) = 'L' THEN 1 ELSE 0 END) AS aus_licencia,
+             SUM(CASE WHEN UPPER(i.motivo) = 'P' THEN 1 ELSE 0 END) AS aus_permiso,
+             SUM(CASE WHEN UPPER(i.motivo) = 'C' THEN 1 ELSE 0 END) AS aus_compensado,
+             SUM(CASE WHEN i.motivo IS NULL      THEN 1 ELSE 0 END) AS aus_sin_registro,
+             SUM(CASE WHEN i.motivo IS NOT NULL AND i.motivo <> '-'
+                       AND UPPER(i.motivo) NOT IN ('V', 'L', 'P', 'C') THEN 1 ELSE 0 END) AS aus_otros
+      FROM inasistencias i
+      WHERE i.fecha_inasistencia >= :d0 AND i.fecha_inasistencia < :d1
+      GROUP BY 1, 2, 3, 4
+    ) x
+    GROUP BY fecha, id_recinto, cuenta_area, cargo_resumido
+"""
+
+
+def ensure_tables() -> None:
+    from app.models import AttendanceDaily, AttendanceHll, RollupState
+    AttendanceDaily.__table__.create(bind=db.engine, checkfirst=True)
+    AttendanceHll.__table__.create(bind=db.engine, checkfirst=True)
+    RollupState.__table__.create(bind=db.engine, checkfirst=True)
+
+
+def _watermarks() -> dict[str, int]:
+    rows = db.session.execute(text("SELECT source, last_id FROM rollup_state")).all()
+    return {s: int(i) for s, i in rows}
+
+
+def _touched_days(since_ids: dict[str, int]) -> tuple[set[date], dict[str, int]]:
+    """Días con filas nuevas (id > marca) en cada origen, y las nuevas marcas."""
+    days: set[date] = set()
+    new_marks: dict[str, int] = {}
+    for table, col in SOURCES.items():
+        top = db.session.execute(text(f"SELECT COALESCE(MAX(id), 0) FROM {table}")).scalar() or 0
+        new_marks[table] = int(top)
+        if table not in since_ids and since_ids:
+            continue  # origen recién agregado a SOURCES: solo se fija su marca, sin re-agregar la historia
+        last = since_ids.get(table, 0)
+        if top <= last:
+            continue
+        rows = db.session.execute(text(f"""
+            SELECT DISTINCT DATE({col}) FROM {table}
+            WHERE id > :last AND id <= :top AND {col} IS NOT NULL
+        """), {"last": last, "top": top}).scalars().all()
+        days.update(d if isinstance(d, date) else date.fromisoformat(str(d)) for d in rows)
+    return days, new_marks
+
+
+def _ranges(days: set[date]) -> list[tuple[date, date]]:
+    """Agrupa días en tramos contiguos [inicio, fin] (inclusive)."""
+    out: list[tuple[date, date]] = []
+    for d in sorted(days):
+        if out and d == out[-1][1] + timedelta(days=1):
+            out[-1] = (out[-1][0], d)
+        else:
+            out.append((d, d))
+    return out
+
+
+def refresh_days(days: set[date]) -> tuple[int, int]:
+    """
+    Re-agrega los días dados (dentro de la transacción actual).
+    Retorna (filas de attendance_daily, sketches de attendance_hll).
+    """
+    inserted = sketches = 0
+    for d0, d1 in _ranges(days):
+        end = d1 + timedelta(days=1)
+        db.session.execute(text("DELETE FROM attendance_daily WHERE fecha >= :d0 AND fecha < :d1"),
+                           {"d0": d0, "d1": end})
+        res = db.session.execute(text(_SQL_INSERT_RANGE), {"d0": d0, "d1": end})
+        inserted += res.rowcount or 0
+        sketches += hll.refresh_range(d0, end)
+    return inserted, sketches
+
+
+def refresh_rollup(full: bool = False, since: date | None = None,
+                   recent_days: int | None = None) -> dict:
+    """
+    Refresco incremental (o completo con full=True / desde una fecha con since).
+    Commit al final; retorna un resumen para la CLI.
+    """
+    ensure_tables()
+    recent = current_app.config.get("ROLLUP_RECENT_DAYS", 2) if recent_days is None else recent_days
+    marks = _watermarks()
+    touched, new_marks = _touched_days({} if full else marks)
+
+    if full or since:
+        first = since or db.session.execute(text(
+            "SELECT MIN(d) FROM (SELECT DATE(MIN(fecha_base)) AS d FROM asistencia "
+            "UNION ALL SELECT DATE(MIN(fecha_inasistencia)) FROM inasistencias) x"
+        )).scalar()
+        if first:
+            first = first if isinstance(first, date) else date.fromisoformat(str(first))
+            touched.update(first + timedelta(days=n) for n in range((date.today() - first).days + 1))
+
+    today = date.today()
+    touched.update(today - timedelta(days=n) for n in range(max(0, int(recent))))
+
+    inserted, sketches = refresh_days(touched)
+    now = datetime.now()
+    for table, top in new_marks.items():
+        db.session.execute(text("""
+            INSERT INTO rollup_state (source, last_id, refreshed_at) VALUES (:s, :i, :t)
+            ON DUPLICATE KEY UPDATE last_id = VALUES(last_id), refreshed_at = VALUES(refreshed_at)
+        """), {"s": table, "i": top, "t": now})
+    db.session.commit()
+    catalogs_changed()  # combos de obras/cargos/cuentas salen del rollup
+    forget_watermarks()
+
+    return {
+        "days": len(touched),
+        "ranges": _ranges(touched),
+        "rows": inserted,
+        "sketches": sketches,
+        "watermarks": new_marks,
+    }
@@ -0,0 +1,54 @@
+# app/schema.py
+"""
+Revisión de esquema que necesita el código.
+
+Los reportes y el rollup unen por join_key, la columna generada de la migración
+0005_join_keys: con una BD sin esa migración fallan con "Unknown column". Orden
+de despliegue: `flask --app wsgi db upgrade` ANTES de reiniciar gunicorn o
+correr `flask rollup refresh` con el código nuevo.
+
+- require_schema(): compara alembic_version con el head de migrations/ y lanza
+  SchemaOutdated con un mensaje claro si la BD está atrás (o adelante).
+- wsgi.py lo llama al arrancar (gunicorn no levanta con un esquema viejo) y
+  también `flask rollup refresh`. SCHEMA_CHECK=0 lo desactiva.
+- Si la BD no responde al arrancar no se bloquea el arranque (solo se avisa):
+  el chequeo es de versión, no de disponibilidad.
+"""
+from __future__ import annotations
+
+from alembic.runtime.migration import MigrationContext
+from alembic.script import ScriptDirectory
+from flask import current_app
+from sqlalchemy.exc import OperationalError
+
+from app.extensions import db
+
+
+class SchemaOutdated(RuntimeError):
+    """La revisión de la BD no es el head de migrations/."""
+
+
+def expected_head() -> str | None:
+    return ScriptDirectory(current_app.extensions["migrate"].directory).get_current_head()
+
+
+def current_revision() -> str | None:
+    with db.engine.connect() as conn:
+        return MigrationContext.configure(conn).get_current_revision()
+
+
+def require_schema() -> None:
+    """Lanza SchemaOutdated si la BD no está en el head de las migraciones."""
+    if not current_app.config.get("SCHEMA_CHECK", True):
+        return
+    head = expected_head()
+    try:
+        rev = current_revision()
+    except OperationalError:
+        current_app.logger.warning("No se pudo leer alembic_version; se omite el chequeo de esquema")
+        return
+    if rev != head:
+        raise SchemaOutdated(
+            f"La BD está en la revisión {rev or '(ninguna)'} y el código requiere {head}: "
+            "correr `flask --app wsgi db upgrade` antes de desplegar (o SCHEMA_CHECK=0)."
+        )
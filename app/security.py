@@ -1,6 +1,11 @@
 # app/security.py
 from __future__ import annotations
+import multiprocessing
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor, TimeoutError as _FutureTimeout
 from typing import Optional
+from flask import current_app
 from werkzeug.security import generate_password_hash, check_password_hash
 
 _PBKDF2_SPEC = "pbkdf2:sha256:600000"
@@ -51,6 +56,123 @@ def verify_password(stored: Optional[str], plain: str) -> bool:
     return False
 
 
+# ======================================================================
+#  Pool de procesos acotado para PBKDF2
+#  (600k iteraciones = cientos de ms de CPU; no deben correr en los
+#   threads de gthread que atienden reportes)
+# ======================================================================
+class PasswordPoolBusy(Exception):
+    """Sin cupo (cola global, IP o cuenta) dentro de PASSWORD_POOL_WAIT segundos."""
+
+
+_pool: ProcessPoolExecutor | None = None
+_pool_lock = threading.Lock()
+_queue_slots: threading.BoundedSemaphore | None = None
+_inflight: dict[str, int] = {}
+_inflight_cond = threading.Condition()
+
+
+def _get_pool(cfg) -> ProcessPoolExecutor | None:
+    global _pool, _queue_slots
+    workers = int(cfg.get("PASSWORD_POOL_WORKERS", 2))
+    if workers <= 0:
+        return None
+    with _pool_lock:
+        if _pool is None:
+            # forkserver: no hace fork de un proceso con threads (gthread)
+            methods = multiprocessing.get_all_start_methods()
+            ctx = multiprocessing.get_context("forkserver" if "forkserver" in methods else "spawn")
+            _pool = ProcessPoolExecutor(max_workers=workers, mp_context=ctx)
+            _queue_slots = threading.BoundedSemaphore(workers + int(cfg.get("PASSWORD_POOL_QUEUE", 16)))
+        return _pool
+
+
+def shutdown_password_pool() -> None:
+    global _pool, _queue_slots
+    with _pool_lock:
+        if _pool is not None:
+            _pool.shutdown(wait=True, cancel_futures=True)
+        _pool, _queue_slots = None, None
+
+
+def _acquire_keys(keys: list[str], cfg, deadline: float) -> None:
+    """
+    Toma un cupo por IP y por cuenta; si alguno está lleno espera turno hasta
+    `deadline` (oficinas enteras salen por una misma IP a la entrada de turno, y
+    un doble envío del formulario repite la cuenta: no deben recibir 429 por eso).
+    """
+    limits = {"ip": int(cfg.get("PASSWORD_MAX_PER_IP", 4)),
+              "acct": int(cfg.get("PASSWORD_MAX_PER_ACCOUNT", 1))}
+    with _inflight_cond:
+        ok = _inflight_cond.wait_for(
+            lambda: all(_inflight.get(k, 0) < limits[k.split(":", 1)[0]] for k in keys),
+            timeout=max(deadline - time.monotonic(), 0),
+        )
+        if not ok:
+            raise PasswordPoolBusy("queue")
+        for k in keys:
+            _inflight[k] = _inflight.get(k, 0) + 1
+
+
+def _release_keys(keys: list[str]) -> None:
+    with _inflight_cond:
+        for k in keys:
+            n = _inflight.get(k, 0) - 1
+            if n > 0:
+                _inflight[k] = n
+            else:
+                _inflight.pop(k, None)
+        _inflight_cond.notify_all()
+
+
+def _run_bounded(fn, *args, ip: str | None = None, account: str | None = None):
+    """
+    Ejecuta fn(*args) en el pool respetando:
+      - tope por IP, por cuenta y cola global (esperan, en total, hasta
+        PASSWORD_POOL_WAIT s por un cupo; después PasswordPoolBusy).
+    Con PASSWORD_POOL_WORKERS=0 corre inline (mismo comportamiento de antes).
+    """
+    cfg = current_app.config
+    pool = _get_pool(cfg)
+    if pool is None:
+        return fn(*args)
+
+    keys = []
+    if ip:
+        keys.append(f"ip:{ip}")
+    if account:
+        keys.append(f"acct:{account.lower()}")
+    wait = float(cfg.get("PASSWORD_POOL_WAIT", 10))
+    deadline = time.monotonic() + wait
+    _acquire_keys(keys, cfg, deadline)
+    try:
+        if not _queue_slots.acquire(timeout=max(deadline - time.monotonic(), 0)):
+            raise PasswordPoolBusy("queue")
+        try:
+            return pool.submit(fn, *args).result(timeout=wait + 30)
+        except _FutureTimeout as e:
+            raise PasswordPoolBusy("timeout") from e
+        finally:
+            _queue_slots.release()
+    finally:
+        _release_keys(keys)
+
+
+def check_password(stored: Optional[str], plain: str) -> bool:
+    """check_password_hash() de Werkzeug (todos sus formatos), como siempre hizo el login."""
+    if not stored:
+        return False
+    return check_password_hash(stored, plain)
+
+
+def check_password_bounded(stored: Optional[str], plain: str,
+                           ip: str | None = None, account: str | None = None) -> bool:
+    """check_password() en el pool de procesos. Lanza PasswordPoolBusy si no hay cupo."""
+    if not stored:
+        return False
+    return bool(_run_bounded(check_password, stored, plain, ip=ip, account=account))
+
+
 def verify_and_maybe_rehash(user, plain: str, db=None, commit=True) -> bool:
     """
     Verifica la contraseña y, si el hash no es pbkdf2:sha256, lo migra automáticamente.
@@ -66,4 +188,18 @@ def verify_and_maybe_rehash(user, plain: str, db=None, commit=True) -> bool:
         if db is not None and commit:
             db.session.commit()
 
-    return True
\ No newline at end of file
+    return True
+
+
+def hash_passwords_many(plains: list[str], workers: int | None = None) -> list[str]:
+    """
+    Hashea muchas contraseñas en paralelo (aprovisionamiento masivo).
+    Usa un pool propio y temporal para no ocupar el pool acotado de logins.
+    """
+    if not plains:
+        return []
+    methods = multiprocessing.get_all_start_methods()
+    ctx = multiprocessing.get_context("forkserver" if "forkserver" in methods else "spawn")
+    n = workers or max(1, (multiprocessing.cpu_count() or 2) - 1)
+    with ProcessPoolExecutor(max_workers=min(n, len(plains)), mp_context=ctx) as pool:
+        return list(pool.map(hash_password, plains, chunksize=max(1, len(plains) // (n * 4))))
@@ -0,0 +1,267 @@
+# app/singleflight.py
+"""
+Single-flight: consultas idénticas y concurrentes se ejecutan UNA vez.
+
+A las 08:00 decenas de supervisores abren /dashboard y /presentismo con el
+mismo rango por defecto; sin esto cada uno lanza las mismas consultas pesadas.
+
+- Clave: hash(forma del SQL, parámetros, huella del alcance) -> query_key().
+- Dentro del worker: el primero ejecuta, los demás esperan su resultado
+  (threading.Event) y lo comparten.
+- Entre los 3 workers de gunicorn: flock sobre <SINGLEFLIGHT_DIR>/<clave>.lock.
+  Quien tuvo que esperar el lock reutiliza el resultado que dejó el otro worker
+  (<clave>.res, pickle) si tiene menos de SINGLEFLIGHT_SHARE_TTL segundos;
+  si no, ejecuta él.
+  El directorio debe ser del uid del proceso y modo 0700 (private_dir()): los
+  .res se leen con pickle. Si no lo es, solo hay coalescencia dentro del worker.
+- Contadores por worker (executed / coalesced / coalesced_remote / errors)
+  en stats(), expuestos en /admin/singleflight.
+
+Los resultados deben ser valores planos (dicts, listas, escalares): se
+comparten entre threads y se serializan entre procesos.
+"""
+from __future__ import annotations
+
+import hashlib
+import os
+import pickle
+import stat
+import threading
+import time
+from collections import Counter
+
+from flask import current_app
+
+try:  # no existe en Windows (desarrollo local): solo coalescencia dentro del worker
+    import fcntl
+except ImportError:  # pragma: no cover
+    fcntl = None
+
+
+class SingleflightTimeout(Exception):
+    """La ejecución compartida no terminó dentro de SINGLEFLIGHT_WAIT."""
+
+
+class _Call:
+    __slots__ = ("event", "result", "error")
+
+    def __init__(self):
+        self.event = threading.Event()
+        self.result = None
+        self.error = None
+
+
+_lock = threading.Lock()
+_calls: dict[str, _Call] = {}
+_stats: Counter = Counter()
+_started = time.time()
+
+
+def _bump(name: str, n: int = 1) -> None:
+    with _lock:
+        _stats[name] += n
+
+
+def query_key(sql, params: dict | None, scope_fp: str = "") -> str:
+    items = sorted((params or {}).items())
+    raw = "\x1f".join((str(sql), repr(items), scope_fp))
+    return hashlib.sha1(raw.encode("utf-8")).hexdigest()
+
+
+# ------------------------- directorio compartido -------------------------
+def private_dir(path: str) -> bool:
+    """
+    Crea `path` (0700) si no existe y verifica que sea un directorio real (no
+    symlink) del uid del proceso, sin permisos para grupo ni otros. Lo que se
+    lee de ahí se deserializa con pickle: nadie más debe poder escribir.
+    """
+    if not hasattr(os, "geteuid"):  # pragma: no cover - Windows
+        return False
+    try:
+        os.makedirs(path, mode=0o700, exist_ok=True)
+        st = os.lstat(path)
+    except OSError:
+        return False
+    return stat.S_ISDIR(st.st_mode) and st.st_uid == os.geteuid() and not st.st_mode & 0o077
+
+
+_checked: dict[str, bool] = {}
+
+
+def _shared_ok(shared_dir: str) -> bool:
+    """private_dir() una vez por directorio y proceso (avisa si no sirve)."""
+    ok = _checked.get(shared_dir)
+    if ok is None:
+        ok = _checked[shared_dir] = private_dir(shared_dir)
+        if not ok:
+            current_app.logger.warning(
+                "SINGLEFLIGHT_DIR %s no es un directorio 0700 de este usuario: "
+                "solo coalescencia dentro del worker", shared_dir)
+    return ok
+
+
+def settings() -> dict | None:
+    """Config para coalesce() leída en el request (los threads del fan-out no tienen app context)."""
+    cfg = current_app.config
+    if not cfg.get("SINGLEFLIGHT_ENABLED", True):
+        return None
+    shared_dir = cfg.get("SINGLEFLIGHT_DIR")
+    if shared_dir and fcntl is not None and not _shared_ok(shared_dir):
+        shared_dir = None
+    return {
+        "wait": float(cfg.get("SINGLEFLIGHT_WAIT", 30)),
+        "shared_dir": shared_dir,
+        "share_ttl": float(cfg.get("SINGLEFLIGHT_SHARE_TTL", 5)),
+    }
+
+
+# ------------------------- entre workers (flock) -------------------------
+def _flock(fh, wait: float) -> tuple[bool, bool]:
+    """Intenta el lock exclusivo hasta `wait` s. Retorna (obtenido, tuvo_que_esperar)."""
+    deadline = time.monotonic() + wait
+    waited = False
+    while True:
+        try:
+            fcntl.flock(fh.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+            return True, waited
+        except BlockingIOError:
+            waited = True
+            if time.monotonic() >= deadline:
+                return False, waited
+            time.sleep(0.05)
+
+
+def _read_shared(path: str, max_age: float):
+    try:
+        if time.time() - os.stat(path).st_mtime > max_age:
+            return None
+        with open(path, "rb") as fh:
+            return (pickle.load(fh),)
+    except (OSError, EOFError, pickle.UnpicklingError):
+        return None
+
+
+def _write_shared(path: str, value) -> None:
+    tmp = f"{path}.{os.getpid()}.{threading.get_ident()}"
+    try:
+        with open(tmp, "wb") as fh:
+            pickle.dump(value, fh, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(tmp, path)
+    except (OSError, pickle.PicklingError):
+        try:
+            os.unlink(tmp)
+        except OSError:
+            pass
+
+
+def _prune(shared_dir: str, older_than: float = 600) -> None:
+    """Borra .lock/.res viejos (una clave por combinación de filtros)."""
+    limit = time.time() - older_than
+    try:
+        with os.scandir(shared_dir) as it:
+            for e in it:
+                try:
+                    if e.stat().st_mtime < limit:
+                        os.unlink(e.path)
+                except OSError:
+                    pass
+    except OSError:
+        pass
+
+
+def _execute(fn):
+    try:
+        result = fn()
+    except Exception:
+        _bump("errors")
+        raise
+    _bump("executed")
+    return result
+
+
+def _run_leader(key: str, fn, wait: float, shared_dir: str | None, share_ttl: float):
+    if fcntl is None or not shared_dir:
+        return _execute(fn)
+    lock_path = os.path.join(shared_dir, key + ".lock")
+    try:
+        fh = open(lock_path, "a+b")
+    except OSError:
+        return _execute(fn)
+
+    with fh:
+        got, waited = _flock(fh, wait)
+        try:
+            if got:
+                try:
+                    os.utime(lock_path)  # en uso: que _prune no lo borre
+                except OSError:
+                    pass
+            res_path = os.path.join(shared_dir, key + ".res")
+            if waited:
+                hit = _read_shared(res_path, share_ttl)
+                if hit is not None:
+                    _bump("coalesced_remote")
+                    return hit[0]
+            result = _execute(fn)
+            if got:
+                _write_shared(res_path, result)
+        finally:
+            if got:
+                fcntl.flock(fh.fileno(), fcntl.LOCK_UN)
+
+    if _stats["executed"] % 500 == 0:  # limpieza ocasional
+        _prune(shared_dir)
+    return result
+
+
+# ------------------------------ API ------------------------------
+def coalesce(key: str, fn, *, wait: float = 30.0, shared_dir: str | None = None,
+             share_ttl: float = 5.0):
+    """
+    Ejecuta fn() una sola vez por `key` entre llamadas concurrentes
+    (threads del worker y, con shared_dir, los otros workers).
+    """
+    with _lock:
+        call = _calls.get(key)
+        leader = call is None
+        if leader:
+            call = _calls[key] = _Call()
+
+    if not leader:
+        if not call.event.wait(wait):
+            raise SingleflightTimeout(f"consulta compartida sin terminar tras {wait:.0f} s")
+        _bump("coalesced")
+        if call.error is not None:
+            raise call.error
+        return call.result
+
+    try:
+        call.result = _run_leader(key, fn, wait, shared_dir, share_ttl)
+    except Exception as e:
+        call.error = e
+        raise
+    finally:
+        with _lock:
+            _calls.pop(key, None)
+        call.event.set()
+    return call.result
+
+
+def stats() -> dict:
+    """Contadores de este worker."""
+    with _lock:
+        s = dict(_stats)
+        inflight = len(_calls)
+    executed = s.get("executed", 0)
+    shared = s.get("coalesced", 0) + s.get("coalesced_remote", 0)
+    return {
+        "pid": os.getpid(),
+        "since": int(_started),
+        "executed": executed,
+        "coalesced": s.get("coalesced", 0),
+        "coalesced_remote": s.get("coalesced_remote", 0),
+        "errors": s.get("errors", 0),
+        "in_flight": inflight,
+        "saved_ratio": round(shared / (executed + shared), 3) if (executed + shared) else 0.0,
+        "cross_worker": fcntl is not None,
+    }
@@ -0,0 +1,281 @@
+# app/warmup.py
+"""
+Precalentamiento de la caché según el uso observado.
+
+El uso es muy regular: a la entrada de turno todos abren /dashboard con el
+rango de hoy; a fin de mes, /nomina/export y /rotacion. Aquí:
+
+- @tracked registra los hits de una vista por (endpoint, params normalizados,
+  huella del alcance, hora del día, cierre de mes) en access_stats.
+  Las fechas de los params se guardan RELATIVAS a hoy ("@d0" = hoy,
+  "@d-1" = ayer, "@m0" = 1° del mes en curso, "@M-1" = fin del mes anterior):
+  "el rango de hoy" de ayer y el de hoy son la misma combinación.
+  Los hits se acumulan en memoria del worker y se vuelcan cada
+  WARMUP_FLUSH_SECONDS con un solo INSERT ... ON DUPLICATE KEY UPDATE.
+- warm() re-ejecuta las top-N combinaciones de la hora que viene (o del resto
+  del día, tras una ingesta) como un usuario con ese alcance
+  (test_request_context + login_user). Eso llena app.cache y el buffer pool de
+  MySQL antes de que llegue el primer usuario.
+
+    flask --app wsgi cache warm --if-peak        # cron cada 15 min
+    flask --app wsgi rollup refresh --warm       # tras cada ingesta
+
+Con CACHE_BACKEND=lru la caché es por proceso: el CLI solo calienta su propia
+memoria (y el buffer pool). Usar sqlite o redis para que lo aprovechen los workers.
+"""
+from __future__ import annotations
+
+import hashlib
+import re
+import threading
+import time
+from calendar import monthrange
+from collections import Counter
+from datetime import date, datetime, timedelta
+from functools import wraps
+from urllib.parse import parse_qsl, urlencode
+
+from flask import current_app, g, make_response, request, url_for
+from flask_login import login_user
+from sqlalchemy import bindparam, text
+from werkzeug.routing import BuildError
+
+from app.extensions import db
+from app.permissions import current_scope
+
+_ISO_DATE = re.compile(r"^\d{4}-\d{2}-\d{2}$")
+_RELATIVE = re.compile(r"^@([dmM])(-?\d+)$")
+
+_lock = threading.Lock()
+_pending: Counter = Counter()       # (endpoint, args, huella, hora, cierre) -> hits
+_users: dict[tuple, int] = {}       # misma clave -> último user_id visto
+_last_flush = time.monotonic()
+
+_SQL_UPSERT = text("""
+    INSERT INTO access_stats (endpoint, args_hash, scope_fp, hour, cierre, args, user_id, hits, last_hit)
+    VALUES (:endpoint, :args_hash, :scope_fp, :hour, :cierre, :args, :user_id, :hits, :last_hit)
+    ON DUPLICATE KEY UPDATE hits = hits + VALUES(hits),
+                            user_id = VALUES(user_id),
+                            last_hit = VALUES(last_hit)
+""")
+
+_SQL_TOP = text("""
+    SELECT endpoint, args, scope_fp, MAX(user_id) AS user_id, SUM(hits) AS hits
+    FROM access_stats
+    WHERE hour IN :hours AND cierre = :cierre AND last_hit >= :since
+    GROUP BY endpoint, args_hash, args, scope_fp
+    ORDER BY hits DESC
+    LIMIT :top
+""").bindparams(bindparam("hours", expanding=True))
+
+_SQL_PEAKS = text("""
+    SELECT hour
+    FROM access_stats
+    WHERE cierre = :cierre AND last_hit >= :since
+    GROUP BY hour
+    ORDER BY SUM(hits) DESC
+    LIMIT :n
+""")
+
+
+# ------------------------- fechas relativas -------------------------
+def _month_start(today: date, months: int) -> date:
+    y, m = divmod(today.year * 12 + today.month - 1 + months, 12)
+    return date(y, m + 1, 1)
+
+
+def relative_value(value: str, today: date) -> str:
+    """'2026-10-17' -> '@d0' (si hoy es 17-10); otros valores quedan igual."""
+    if not _ISO_DATE.match(value):
+        return value
+    try:
+        d = date.fromisoformat(value)
+    except ValueError:
+        return value
+    if d == today:
+        return "@d0"
+    months = (d.year - today.year) * 12 + d.month - today.month
+    if d.day == 1:
+        return f"@m{months}"
+    if d.day == monthrange(d.year, d.month)[1]:
+        return f"@M{months}"
+    return f"@d{(d - today).days}"
+
+
+def absolute_value(value: str, today: date) -> str:
+    """Inversa de relative_value() para el día `today`."""
+    m = _RELATIVE.match(value)
+    if not m:
+        return value
+    kind, n = m.group(1), int(m.group(2))
+    if kind == "d":
+        return (today + timedelta(days=n)).isoformat()
+    if kind == "m":
+        return _month_start(today, n).isoformat()
+    return (_month_start(today, n + 1) - timedelta(days=1)).isoformat()
+
+
+def relative_args(today: date) -> str:
+    # mismo criterio que watermark.normalized_args (orden estable, sin vacíos)
+    items = sorted((k, v.strip()) for k, vs in request.args.lists() for v in vs if v.strip())
+    return urlencode([(k, relative_value(v, today)) for k, v in items])
+
+
+def is_closing(d: date) -> bool:
+    """Ventana de cierre de mes: los últimos y primeros WARMUP_CLOSE_DAYS días."""
+    n = int(current_app.config.get("WARMUP_CLOSE_DAYS", 3))
+    return d.day > monthrange(d.year, d.month)[1] - n or d.day <= n
+
+
+# ------------------------------ registro ------------------------------
+def record() -> None:
+    """Cuenta un hit del request actual (se vuelca a access_stats cada WARMUP_FLUSH_SECONDS)."""
+    cfg = current_app.config
+    if not cfg.get("WARMUP_ENABLED", True) or g.get("_warmup"):
+        return
+    # las páginas por cursor (app.pagination) son de un solo uso: no vale la pena precalentarlas
+    if request.args.get("cursor"):
+        return
+    scope = current_scope()
+    # los tokens de API traen su propio alcance: no se pueden reproducir con login_user
+    if scope.source != "db" or not scope.user_id:
+        return
+    now = datetime.now()
+    key = (request.endpoint, relative_args(now.date()), scope.fingerprint, now.hour,
+           int(is_closing(now.date())))
+    with _lock:
+        _pending[key] += 1
+        _users[key] = scope.user_id
+        due = time.monotonic() - _last_flush >= cfg.get("WARMUP_FLUSH_SECONDS", 60)
+    if due:
+        flush()
+
+
+def flush() -> int:
+    """Vuelca los hits acumulados en el worker; retorna las filas escritas."""
+    global _last_flush
+    with _lock:
+        batch = [(k, n, _users.get(k)) for k, n in _pending.items()]
+        _pending.clear()
+        _users.clear()
+        _last_flush = time.monotonic()
+    if not batch:
+        return 0
+
+    now = datetime.now().replace(microsecond=0)
+    rows = [{
+        "endpoint": endpoint,
+        "args_hash": hashlib.sha1(args.encode("utf-8")).hexdigest(),
+        "scope_fp": fp, "hour": hour, "cierre": cierre, "args": args,
+        "user_id": uid, "hits": n, "last_hit": now,
+    } for (endpoint, args, fp, hour, cierre), n, uid in batch]
+    try:
+        # conexión propia: no se mezcla con la transacción del request
+        with db.engine.begin() as conn:
+            conn.execute(_SQL_UPSERT, rows)
+    except Exception:
+        current_app.logger.exception("No se pudieron guardar las estadísticas de acceso")
+        return 0
+    return len(rows)
+
+
+def tracked(view):
+    """
+    Decorador: registra los hits (200 o 304) de la vista para el precalentamiento.
+    Va DEBAJO de @login_required y ENCIMA de @conditional (cuenta también los 304).
+    """
+    @wraps(view)
+    def wrapper(*args, **kwargs):
+        resp = make_response(view(*args, **kwargs))
+        if request.method == "GET" and resp.status_code in (200, 304):
+            try:
+                record()
+            except Exception:
+                current_app.logger.exception("Falló el registro de acceso")
+        return resp
+    return wrapper
+
+
+# ------------------------------ precalentamiento ------------------------------
+def _since() -> datetime:
+    return datetime.now() - timedelta(days=int(current_app.config.get("WARMUP_LOOKBACK_DAYS", 14)))
+
+
+def peak_hours(cierre: bool, n: int | None = None) -> list[int]:
+    """Las n horas del día con más hits (dentro o fuera del cierre de mes)."""
+    n = n or int(current_app.config.get("WARMUP_PEAK_HOURS", 3))
+    rows = db.session.execute(_SQL_PEAKS, {"cierre": int(cierre), "since": _since(), "n": n}).all()
+    return [r.hour for r in rows]
+
+
+def top_combinations(hours, cierre: bool, top: int) -> list[dict]:
+    rows = db.session.execute(_SQL_TOP, {
+        "hours": list(hours), "cierre": int(cierre), "since": _since(), "top": int(top),
+    }).mappings().all()
+    return [dict(r) for r in rows]
+
+
+def _replay(app, combo: dict, today: date) -> str:
+    """Ejecuta la vista como un usuario con ese alcance. Retorna ok | skipped | error."""
+    from app.principal import fetch_principal
+
+    query = [(k, absolute_value(v, today)) for k, v in parse_qsl(combo["args"])]
+    with app.test_request_context():
+        try:
+            path = url_for(combo["endpoint"])
+        except BuildError:
+            return "skipped"  # endpoint que ya no existe
+
+    with app.test_request_context(path, query_string=query):
+        g._warmup = True  # no contar el hit; recalcular entradas vencidas en línea
+        principal = fetch_principal(combo["user_id"]) if combo["user_id"] else None
+        if principal is None or not login_user(principal):
+            return "skipped"
+        # los permisos pudieron cambiar desde que se registró la combinación
+        if current_scope().fingerprint != combo["scope_fp"]:
+            return "skipped"
+        try:
+            resp = app.full_dispatch_request()
+        except Exception:
+            app.logger.exception("Precalentamiento falló: %s?%s", combo["endpoint"], combo["args"])
+            return "error"
+        finally:
+            db.session.rollback()
+        resp.close()
+        return "ok" if resp.status_code == 200 else "skipped"
+
+
+def warm(*, top: int | None = None, ahead_minutes: int | None = None,
+         after_ingest: bool = False, only_peaks: bool = False) -> dict:
+    """
+    Precalcula las top-N combinaciones:
+    - por defecto, las de la hora que empieza en `ahead_minutes` (con only_peaks,
+      solo si esa hora es una de las más concurridas);
+    - con after_ingest, las del resto del día (los datos acaban de cambiar).
+    """
+    app = current_app._get_current_object()
+    cfg = app.config
+    top = int(top or cfg.get("WARMUP_TOP", 20))
+    ahead = int(cfg.get("WARMUP_AHEAD_MINUTES", 15) if ahead_minutes is None else ahead_minutes)
+    flush()  # los hits de este proceso también cuentan
+
+    now = datetime.now()
+    today = now.date()  # las claves de app.cache son por día: siempre se calienta hoy
+    target = min(now + timedelta(minutes=ahead), datetime.combine(today, datetime.max.time()))
+    cierre = is_closing(today)
+
+    if after_ingest:
+        hours = list(range(now.hour, 24))
+    else:
+        hours = [target.hour]
+        if only_peaks and target.hour not in peak_hours(cierre):
+            return {"hours": hours, "cierre": cierre, "peak": False, "combinations": 0}
+
+    combos = top_combinations(hours, cierre, top)
+    t0 = time.perf_counter()
+    result = Counter(_replay(app, c, today) for c in combos)
+    return {
+        "hours": hours, "cierre": cierre, "combinations": len(combos),
+        **{k: result.get(k, 0) for k in ("ok", "skipped", "error")},
+        "seconds": round(time.perf_counter() - t0, 1),
+    }
@@ -0,0 +1,158 @@
+# app/watermark.py
+"""
+Marca de agua de datos + GET condicional (ETag / 304) para reportes.
+
+Los datos de asistencia solo cambian cuando corre la ingesta de Buk (seguida de
+`flask rollup refresh`). La marca de agua de una fuente es:
+  - MAX(id) de cada tabla con id autoincremental (filas nuevas),
+  - COUNT + suma de CRC32 de las tablas chicas editables (desvinculaciones),
+  - MAX de una columna indexada en las tablas grandes sin id (horas_extras_diario), y
+  - MAX(rollup_state.refreshed_at): la hora de la última ingesta+refresh, que
+    cubre las correcciones en el lugar (sin ids nuevos).
+Se lee en UNA consulta y se guarda WATERMARK_TTL segundos en el worker.
+
+    @bp.get("/api/inasistencias")
+    @login_required
+    @conditional("inasistencias", "asignacion_turnos", "nomina_colaborador")
+    def api_inasistencias(): ...
+
+ETag = hash(endpoint, marca de agua, query string normalizada, huella del alcance, usuario, día).
+Si coincide con If-None-Match => 304 sin ejecutar la vista (ni el SQL pesado).
+Períodos cerrados (fin del rango anterior a hoy - CACHE_CLOSED_AFTER_DAYS) se
+sirven con Cache-Control private, max-age=CACHE_CLOSED_MAX_AGE.
+"""
+from __future__ import annotations
+
+import hashlib
+import threading
+import time
+from datetime import date, timedelta
+from functools import wraps
+
+from flask import current_app, make_response, request
+from flask_login import current_user
+from sqlalchemy import text
+
+from app.extensions import db
+from app.permissions import current_scope
+
+# tablas de la ingesta con PK id autoincremental
+ID_TABLES = frozenset({"asistencia", "inasistencias", "asignacion_turnos", "nomina_colaborador"})
+
+# tablas chicas que se editan a mano (no solo reciben filas nuevas): huella de
+# las columnas que leen los reportes, para que una edición o un borrado también cuente
+CHECKSUM_TABLES = {
+    "desvinculaciones": "COUNT(*), SUM(CRC32(CONCAT_WS('|', id, FECHA_CTTO, FECHA_TERMINO, "
+                        "CARGO, centro_costo_area)))",
+}
+
+# tablas grandes sin id autoincremental: MAX de una columna indexada (una lectura
+# del extremo del índice, no un recorrido). Las filas nuevas de días ya cargados y
+# las correcciones las cubre rollup_state.refreshed_at (la ingesta termina con
+# `flask rollup refresh`).
+MAX_TABLES = {
+    "horas_extras_diario": "fecha",     # ix_hed_fecha_key
+}
+
+# parámetros que definen el período consultado (el primero que venga)
+_END_PARAMS = ("end", "hasta")
+
+_lock = threading.Lock()
+_cache: dict[tuple, tuple[float, tuple]] = {}
+
+
+def data_watermark(*tables: str) -> tuple:
+    """(ingesta, max_id por tabla...) de las fuentes dadas; cacheado WATERMARK_TTL segundos."""
+    key = tuple(sorted(set(tables)))
+    now = time.monotonic()
+    with _lock:
+        hit = _cache.get(key)
+    if hit and hit[0] > now:
+        return hit[1]
+
+    cols = ["(SELECT MAX(refreshed_at) FROM rollup_state) AS ingest"]
+    cols += [f"(SELECT MAX(id) FROM {t}) AS {t}" for t in key if t in ID_TABLES]
+    cols += [f"(SELECT CONCAT_WS(':', {CHECKSUM_TABLES[t]}) FROM {t}) AS {t}"
+             for t in key if t in CHECKSUM_TABLES]
+    cols += [f"(SELECT MAX({MAX_TABLES[t]}) FROM {t}) AS {t}" for t in key if t in MAX_TABLES]
+    row = db.session.execute(text("SELECT " + ", ".join(cols))).one()
+    wm = tuple(str(v) for v in row)
+
+    ttl = current_app.config.get("WATERMARK_TTL", 10)
+    with _lock:
+        _cache[key] = (now + ttl, wm)
+    return wm
+
+
+def forget_watermarks() -> None:
+    """Descarta las marcas cacheadas (p.ej. tras `flask rollup refresh` en este proceso)."""
+    with _lock:
+        _cache.clear()
+
+
+def normalized_args(exclude=()) -> str:
+    # orden estable y sin vacíos: ?a=1&b= y ?b=&a=1 dan el mismo ETag
+    items = sorted((k, v.strip()) for k, vs in request.args.lists()
+                   if k not in exclude for v in vs if v.strip())
+    return "&".join(f"{k}={v}" for k, v in items)
+
+
+def compute_etag(*tables: str) -> str:
+    parts = (
+        request.endpoint or request.path,
+        "|".join(data_watermark(*tables)),
+        normalized_args(),
+        current_scope().fingerprint,
+        # las páginas HTML muestran el usuario en la barra: un 304 no debe cruzar sesiones
+        str(getattr(current_user, "id", "")),
+        # sin parámetros de fecha el rango por defecto es "hoy": cambia a medianoche
+        date.today().isoformat(),
+    )
+    return hashlib.sha1("\x1f".join(parts).encode("utf-8")).hexdigest()
+
+
+def _closed_period() -> bool:
+    """True si el rango pedido termina antes del tramo que la ingesta todavía corrige."""
+    end = next((request.args.get(p) for p in _END_PARAMS if request.args.get(p)), None)
+    if not end:
+        return False
+    try:
+        end_d = date.fromisoformat(end.strip()[:10])
+    except ValueError:
+        return False
+    days = current_app.config.get("CACHE_CLOSED_AFTER_DAYS", 7)
+    return end_d < date.today() - timedelta(days=days)
+
+
+def _cache_control(resp) -> None:
+    # private: la respuesta depende del alcance del usuario
+    if _closed_period():
+        resp.headers["Cache-Control"] = f"private, max-age={current_app.config.get('CACHE_CLOSED_MAX_AGE', 86400)}"
+    else:
+        resp.headers["Cache-Control"] = "private, no-cache"
+    resp.vary.update(("Cookie", "Authorization"))
+
+
+def conditional(*tables: str):
+    """
+    Decorador de vistas GET: ETag por (marca de agua de tables, params, alcance)
+    y 304 si el cliente ya tiene esa versión. Va DEBAJO de @login_required.
+    """
+    def deco(view):
+        @wraps(view)
+        def wrapper(*args, **kwargs):
+            if request.method != "GET" or not current_app.config.get("ETAG_ENABLED", True):
+                return view(*args, **kwargs)
+
+            etag = compute_etag(*tables)
+            if request.if_none_match.contains(etag):
+                resp = make_response("", 304)
+            else:
+                resp = make_response(view(*args, **kwargs))
+                if resp.status_code != 200:
+                    return resp
+            resp.set_etag(etag)
+            _cache_control(resp)
+            return resp
+        return wrapper
+    return deco
@@ -1,4 +1,5 @@
 import os
+import tempfile
 
 class Config:
     SECRET_KEY = os.getenv("SECRET_KEY", "change-me-in-prod")
@@ -21,6 +22,113 @@ class Config:
 
     LOG_LEVEL = os.getenv("LOG_LEVEL", "INFO")
 
+    # Caché de permisos (snapshot por usuario, compartido entre requests)
+    PERM_CACHE_TTL = int(os.getenv("PERM_CACHE_TTL", "60"))
+    PERM_CACHE_VERSION_FILE = os.getenv(
+        "PERM_CACHE_VERSION_FILE",
+        os.path.join(tempfile.gettempdir(), "intranet_perm_version"),
+    )
+    # Principal liviano en la sesión: cada cuántos segundos se revalida contra la BD
+    PRINCIPAL_REVALIDATE_SECONDS = int(os.getenv("PRINCIPAL_REVALIDATE_SECONDS", "60"))
+
+    # Verificación de contraseñas (PBKDF2) en pool de procesos acotado; 0 = inline
+    PASSWORD_POOL_WORKERS = int(os.getenv("PASSWORD_POOL_WORKERS", "2"))
+    PASSWORD_POOL_QUEUE = int(os.getenv("PASSWORD_POOL_QUEUE", "16"))      # en espera, además de los workers
+    PASSWORD_POOL_WAIT = float(os.getenv("PASSWORD_POOL_WAIT", "10"))      # segundos máx. esperando cupo
+    # verificaciones en paralelo por IP / por cuenta; las demás esperan turno (PASSWORD_POOL_WAIT)
+    PASSWORD_MAX_PER_IP = int(os.getenv("PASSWORD_MAX_PER_IP", "4"))
+    PASSWORD_MAX_PER_ACCOUNT = int(os.getenv("PASSWORD_MAX_PER_ACCOUNT", "1"))
+
+    # Hasta cuántos pares (recinto, cuenta) se filtra con tuple-IN; sobre eso, join a tabla
+    SCOPE_INLINE_MAX = int(os.getenv("SCOPE_INLINE_MAX", "64"))
+
+    # Aprovisionamiento masivo (admin/users/bulk y `flask users import`)
+    PROVISION_MAX_ROWS = int(os.getenv("PROVISION_MAX_ROWS", "5000"))
+
+    # Tokens de API firmados para /api/* (Authorization: Bearer)
+    API_TOKEN_SECRET = os.getenv("API_TOKEN_SECRET")                         # None => SECRET_KEY
+    API_TOKEN_TTL = int(os.getenv("API_TOKEN_TTL", "3600"))                  # segundos
+    API_TOKEN_MAX_TTL = int(os.getenv("API_TOKEN_MAX_TTL", str(30 * 86400)))
+    API_TOKEN_RATE_PER_MIN = int(os.getenv("API_TOKEN_RATE_PER_MIN", "120"))  # por token y worker
+    API_TOKEN_NOT_BEFORE = int(os.getenv("API_TOKEN_NOT_BEFORE", "0"))        # epoch: revoca lo emitido antes
+
+    # wsgi y `flask rollup refresh` exigen que la BD esté en el head de migrations/ (app.schema)
+    SCHEMA_CHECK = os.getenv("SCHEMA_CHECK", "1") not in ("0", "false", "False")
+
+    # Rollup diario (attendance_daily): días recientes que se re-agregan siempre
+    # (la ingesta corrige el día en curso sin generar ids nuevos)
+    ROLLUP_RECENT_DAYS = int(os.getenv("ROLLUP_RECENT_DAYS", "2"))
+    # Heatmap recinto x día (/api/presentismo/heatmap): tope del rango pedido
+    HEATMAP_MAX_DAYS = int(os.getenv("HEATMAP_MAX_DAYS", "366"))
+
+    # Catálogos de filtros y nombres de recinto (app.catalogs), en memoria del worker
+    CATALOG_TTL = int(os.getenv("CATALOG_TTL", "300"))
+    CATALOG_VERSION_FILE = os.getenv(
+        "CATALOG_VERSION_FILE",
+        os.path.join(tempfile.gettempdir(), "intranet_catalog_version"),
+    )
+
+    # GET condicional de reportes (app.watermark): ETag por marca de agua de datos
+    ETAG_ENABLED = os.getenv("ETAG_ENABLED", "1") not in ("0", "false", "False")
+    WATERMARK_TTL = int(os.getenv("WATERMARK_TTL", "10"))                    # segundos entre lecturas de la marca
+    CACHE_CLOSED_AFTER_DAYS = int(os.getenv("CACHE_CLOSED_AFTER_DAYS", "7"))  # rango que termina antes => cerrado
+    CACHE_CLOSED_MAX_AGE = int(os.getenv("CACHE_CLOSED_MAX_AGE", "86400"))
+
+    # Caché de resultados por alcance (app.cache): lru | sqlite | redis | none
+    CACHE_BACKEND = os.getenv("CACHE_BACKEND", "lru")
+    CACHE_TTL = int(os.getenv("CACHE_TTL", "300"))              # fresca
+    CACHE_STALE_TTL = int(os.getenv("CACHE_STALE_TTL", "600"))  # vencida: se sirve y se recalcula en 2º plano
+    CACHE_MAX_ENTRIES = int(os.getenv("CACHE_MAX_ENTRIES", "512"))                     # lru
+    CACHE_LRU_MAX_BYTES = int(os.getenv("CACHE_LRU_MAX_BYTES", str(64 * 1024 * 1024)))  # lru, por worker
+    # filas crudas de exportaciones (nomina/export): solo sqlite / redis y hasta este tamaño
+    CACHE_EXPORT_MAX_BYTES = int(os.getenv("CACHE_EXPORT_MAX_BYTES", str(32 * 1024 * 1024)))
+    CACHE_MAX_BYTES = int(os.getenv("CACHE_MAX_BYTES", str(256 * 1024 * 1024)))        # sqlite
+    # el directorio debe ser 0700 y del usuario del proceso (se lee con pickle); si no, lru
+    CACHE_SQLITE_PATH = os.getenv(
+        "CACHE_SQLITE_PATH",
+        os.path.join(tempfile.gettempdir(), "intranet_cache", "cache.sqlite3"),
+    )
+    CACHE_REDIS_URL = os.getenv("CACHE_REDIS_URL", "redis://localhost:6379/0")
+    CACHE_REDIS_PREFIX = os.getenv("CACHE_REDIS_PREFIX", "intranet:cache:")
+
+    # Precalentamiento según uso observado (app.warmup, access_stats, `flask cache warm`)
+    WARMUP_ENABLED = os.getenv("WARMUP_ENABLED", "1") not in ("0", "false", "False")  # registro de hits
+    WARMUP_FLUSH_SECONDS = int(os.getenv("WARMUP_FLUSH_SECONDS", "60"))     # volcado del buffer por worker
+    WARMUP_TOP = int(os.getenv("WARMUP_TOP", "20"))                         # combinaciones por corrida
+    WARMUP_AHEAD_MINUTES = int(os.getenv("WARMUP_AHEAD_MINUTES", "15"))     # cuánto antes de la hora peak
+    WARMUP_PEAK_HOURS = int(os.getenv("WARMUP_PEAK_HOURS", "3"))            # horas más concurridas (--if-peak)
+    WARMUP_LOOKBACK_DAYS = int(os.getenv("WARMUP_LOOKBACK_DAYS", "14"))
+    WARMUP_CLOSE_DAYS = int(os.getenv("WARMUP_CLOSE_DAYS", "3"))            # cierre: últimos/primeros N días del mes
+
+    # Single-flight (app.singleflight): consultas idénticas concurrentes se ejecutan una vez
+    SINGLEFLIGHT_ENABLED = os.getenv("SINGLEFLIGHT_ENABLED", "1") not in ("0", "false", "False")
+    SINGLEFLIGHT_WAIT = float(os.getenv("SINGLEFLIGHT_WAIT", "30"))            # segundos máx. esperando al líder
+    SINGLEFLIGHT_SHARE_TTL = float(os.getenv("SINGLEFLIGHT_SHARE_TTL", "5"))   # resultado entre workers
+    # debe ser 0700 y del usuario del proceso (se lee con pickle); si no, solo coalescencia por worker
+    SINGLEFLIGHT_DIR = os.getenv(
+        "SINGLEFLIGHT_DIR",
+        os.path.join(tempfile.gettempdir(), "intranet_singleflight"),
+    )
+
+    # SSE de deltas tras cada ingesta (app.live). Cada stream ocupa un thread de
+    # gunicorn (de los que atienden reportes) mientras dure: ver capacidad en app.live
+    LIVE_MAX_STREAMS = int(os.getenv("LIVE_MAX_STREAMS", "1"))          # por worker
+    LIVE_BUSY_RETRY_SECONDS = int(os.getenv("LIVE_BUSY_RETRY_SECONDS", "120"))  # sin cupo: EventSource reintenta
+    LIVE_POLL_SECONDS = int(os.getenv("LIVE_POLL_SECONDS", "15"))
+    LIVE_STREAM_SECONDS = int(os.getenv("LIVE_STREAM_SECONDS", "300"))  # luego EventSource reconecta
+
+    # Fan-out de consultas independientes (dashboard / presentismo); 0 = en serie
+    FANOUT_WORKERS = int(os.getenv("FANOUT_WORKERS", "8"))
+    FANOUT_TIMEOUT_MS = int(os.getenv("FANOUT_TIMEOUT_MS", "30000"))              # espera total por página
+    FANOUT_MAX_EXECUTION_MS = int(os.getenv("FANOUT_MAX_EXECUTION_MS", "25000"))  # MAX_EXECUTION_TIME por SELECT
+    # Pool de conexiones: cada request puede tomar hasta FANOUT_WORKERS conexiones a la vez
+    SQLALCHEMY_ENGINE_OPTIONS = {
+        "pool_size": int(os.getenv("DB_POOL_SIZE", "10")),
+        "max_overflow": int(os.getenv("DB_POOL_MAX_OVERFLOW", "10")),
+        "pool_pre_ping": True,
+        "pool_recycle": int(os.getenv("DB_POOL_RECYCLE", "1800")),
+    }
+
 
 class DevConfig(Config):
     DEBUG = True
@@ -1,4 +1,4 @@
-# manage.py (sin Flask-Migrate)
+# manage.py
 from flask import Flask
 from app import create_app
 
@@ -6,6 +6,7 @@ app: Flask = create_app()
 
 # Ejemplos:
 #   flask --app manage.py run --debug
+#   flask --app manage.py db upgrade      (migraciones en migrations/)
 
 if __name__ == "__main__":
     app.run(debug=True)
@@ -0,0 +1,66 @@
+"""tablas propias de la app: user_effective_scope, attendance_daily, rollup_state
+
+Revision ID: 0001_app_tables
+Revises:
+Create Date: 2026-10-17 09:00:00
+
+Hasta ahora las creaban `flask scope rebuild` / `flask rollup refresh` con
+checkfirst; en una BD donde ya existen esta revisión no hace nada.
+"""
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects.mysql import BIGINT, INTEGER
+
+
+# revision identifiers, used by Alembic.
+revision = '0001_app_tables'
+down_revision = None
+branch_labels = None
+depends_on = None
+
+_TABLE_OPTS = {"mysql_charset": "utf8mb4", "mysql_collate": "utf8mb4_unicode_ci"}
+
+
+def _has_table(name):
+    return sa.inspect(op.get_bind()).has_table(name)
+
+
+def upgrade():
+    if not _has_table("user_effective_scope"):
+        op.create_table(
+            "user_effective_scope",
+            sa.Column("user_id", BIGINT(unsigned=True), primary_key=True),
+            sa.Column("obra_id", sa.Integer, primary_key=True),
+            sa.Column("cuenta_code", sa.String(120), primary_key=True),
+            **_TABLE_OPTS,
+        )
+        op.create_index("ix_ues_obra_cuenta", "user_effective_scope", ["obra_id", "cuenta_code"])
+
+    if not _has_table("attendance_daily"):
+        counters = ["registros", "presentes", "ausentes", "aus_ausente", "aus_vacaciones",
+                    "aus_licencia", "aus_permiso", "aus_compensado", "aus_sin_registro", "aus_otros"]
+        op.create_table(
+            "attendance_daily",
+            sa.Column("fecha", sa.Date, primary_key=True),
+            sa.Column("id_recinto", sa.Integer, primary_key=True),
+            sa.Column("cuenta_area", sa.String(120), primary_key=True),
+            sa.Column("cargo_resumido", sa.String(120), primary_key=True),
+            *[sa.Column(c, INTEGER(unsigned=True), nullable=False, server_default="0") for c in counters],
+            **_TABLE_OPTS,
+        )
+        op.create_index("ix_ad_recinto_fecha", "attendance_daily", ["id_recinto", "fecha"])
+
+    if not _has_table("rollup_state"):
+        op.create_table(
+            "rollup_state",
+            sa.Column("source", sa.String(64), primary_key=True),
+            sa.Column("last_id", sa.BigInteger, nullable=False, server_default="0"),
+            sa.Column("refreshed_at", sa.DateTime, nullable=True),
+            **_TABLE_OPTS,
+        )
+
+
+def downgrade():
+    op.drop_table("rollup_state")
+    op.drop_table("attendance_daily")
+    op.drop_table("user_effective_scope")
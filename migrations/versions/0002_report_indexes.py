@@ -0,0 +1,59 @@
+"""índices compuestos para los reportes (rangos de fecha sargables)
+
+Revision ID: 0002_report_indexes
+Revises: 0001_app_tables
+Create Date: 2026-10-17 09:30:00
+
+Los reportes filtran con rangos semiabiertos (col >= :start AND col < :end + 1 día)
+sobre la columna cruda, así que un índice que empieza por la fecha permite range
+scan; el resto de columnas cubre recinto/cuenta/entrada sin ir a la fila.
+
+Tablas grandes de la ingesta: ALGORITHM=INPLACE, LOCK=NONE (DDL en línea, sin
+bloquear lecturas/escrituras). Cada índice se crea solo si no existe.
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '0002_report_indexes'
+down_revision = '0001_app_tables'
+branch_labels = None
+depends_on = None
+
+# (tabla, índice, columnas)
+INDEXES = [
+    # horas trabajadas / presentismo / rollup: rango por fecha_base + scope + presentes
+    ("asistencia", "ix_asis_fecha_rec_cta_ent", ["fecha_base", "id_recinto", "cuenta_area", "entrada"]),
+    # inasistencias / presentismo / rollup: rango por fecha + recinto + motivo
+    ("inasistencias", "ix_inas_fecha_obra_motivo", ["fecha_inasistencia", "obra_id", "motivo"]),
+    # horas extras: rango por fecha y join por la llave compuesta
+    ("horas_extras_diario", "ix_hed_fecha_key", ["fecha", "dni_fecha_recinto"]),
+    ("horas_extras_diario", "ix_hed_key", ["dni_fecha_recinto"]),
+    # joins hacia asignacion_turnos (horas trabajadas, inasistencias, rollup)
+    ("asignacion_turnos", "ix_at_uid_rut_dia_obra", ["uid_rut_dia_obra"]),
+    # SQL_INASISTENCIAS_BASE: i.DNI = nc.DNI AND i.obra_id = nc.obra_id
+    ("nomina_colaborador", "ix_nc_dni_obra", ["dni", "obra_id"]),
+]
+
+
+def _index_exists(table, name):
+    return op.get_bind().execute(sa.text("""
+        SELECT 1 FROM information_schema.statistics
+        WHERE table_schema = DATABASE() AND table_name = :t AND index_name = :i
+        LIMIT 1
+    """), {"t": table, "i": name}).first() is not None
+
+
+def upgrade():
+    for table, name, cols in INDEXES:
+        if _index_exists(table, name):
+            continue
+        col_sql = ", ".join(f"`{c}`" for c in cols)
+        op.execute(f"ALTER TABLE `{table}` ADD INDEX `{name}` ({col_sql}), ALGORITHM=INPLACE, LOCK=NONE")
+
+
+def downgrade():
+    for table, name, _ in reversed(INDEXES):
+        if _index_exists(table, name):
+            op.execute(f"ALTER TABLE `{table}` DROP INDEX `{name}`, ALGORITHM=INPLACE, LOCK=NONE")
@@ -0,0 +1,43 @@
+"""access_stats: hits por vista/params/alcance/hora para precalentar la caché
+
+Revision ID: 0003_access_stats
+Revises: 0002_report_indexes
+Create Date: 2026-10-17 10:00:00
+
+La escribe app.warmup (buffer por worker, un upsert por minuto) y la lee
+`flask cache warm`.
+"""
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects.mysql import BIGINT, INTEGER, TINYINT
+
+
+# revision identifiers, used by Alembic.
+revision = '0003_access_stats'
+down_revision = '0002_report_indexes'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    if sa.inspect(op.get_bind()).has_table("access_stats"):
+        return
+    op.create_table(
+        "access_stats",
+        sa.Column("endpoint", sa.String(120), primary_key=True),
+        sa.Column("args_hash", sa.CHAR(40), primary_key=True),
+        sa.Column("scope_fp", sa.CHAR(16), primary_key=True),
+        sa.Column("hour", TINYINT(unsigned=True), primary_key=True),
+        sa.Column("cierre", sa.Boolean, primary_key=True),
+        sa.Column("args", sa.String(1000), nullable=False),
+        sa.Column("user_id", BIGINT(unsigned=True), nullable=True),
+        sa.Column("hits", INTEGER(unsigned=True), nullable=False, server_default="0"),
+        sa.Column("last_hit", sa.DateTime, nullable=False),
+        mysql_charset="utf8mb4",
+        mysql_collate="utf8mb4_unicode_ci",
+    )
+    op.create_index("ix_as_hour_cierre", "access_stats", ["hour", "cierre", "last_hit"])
+
+
+def downgrade():
+    op.drop_table("access_stats")
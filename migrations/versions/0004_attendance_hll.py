@@ -0,0 +1,37 @@
+"""attendance_hll: sketches HyperLogLog diarios de trabajadores presentes
+
+Revision ID: 0004_attendance_hll
+Revises: 0003_access_stats
+Create Date: 2026-10-17 10:30:00
+
+La llena `flask rollup refresh` (app.hll); para la historia existente correr
+una vez `flask rollup refresh --full`.
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '0004_attendance_hll'
+down_revision = '0003_access_stats'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    if sa.inspect(op.get_bind()).has_table("attendance_hll"):
+        return
+    op.create_table(
+        "attendance_hll",
+        sa.Column("fecha", sa.Date, primary_key=True),
+        sa.Column("id_recinto", sa.Integer, primary_key=True),
+        sa.Column("cuenta_area", sa.String(120), primary_key=True),
+        sa.Column("sketch", sa.LargeBinary, nullable=False),
+        mysql_charset="utf8mb4",
+        mysql_collate="utf8mb4_unicode_ci",
+    )
+    op.create_index("ix_ahll_recinto_fecha", "attendance_hll", ["id_recinto", "fecha"])
+
+
+def downgrade():
+    op.drop_table("attendance_hll")
@@ -0,0 +1,72 @@
+"""llaves enteras (join_key) para los joins por llave compuesta de texto
+
+Revision ID: 0005_join_keys
+Revises: 0004_attendance_hll
+Create Date: 2026-10-17 11:30:00
+
+Los reportes unen asistencia / horas_extras_diario / asignacion_turnos /
+inasistencias por llaves de texto largas (rut_fecha_recinto, dni_fecha_recinto,
+uid_rut_dia_obra, uid_inasistencia). join_key = 64 bits del MD5 de esa llave
+normalizada (UPPER + TRIM, como compara la collation _ci), BIGINT UNSIGNED.
+
+Columna generada VIRTUAL + índice: MySQL calcula el valor al insertar (la ingesta
+no cambia) y lo guarda en el índice, de 8 bytes por fila en vez de la cadena.
+Agregar una columna VIRTUAL es instantáneo y el índice se crea INPLACE, LOCK=NONE;
+una STORED obligaría a reconstruir las tablas con bloqueo.
+
+Las consultas unen por join_key y mantienen la igualdad de texto como filtro
+residual, así una colisión de hash no puede unir filas distintas.
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '0005_join_keys'
+down_revision = '0004_attendance_hll'
+branch_labels = None
+depends_on = None
+
+# (tabla, llave de texto, índice)
+KEYS = [
+    ("asistencia", "rut_fecha_recinto", "ix_asis_join_key"),
+    ("horas_extras_diario", "dni_fecha_recinto", "ix_hed_join_key"),
+    ("asignacion_turnos", "uid_rut_dia_obra", "ix_at_join_key"),
+    ("inasistencias", "uid_inasistencia", "ix_inas_join_key"),
+]
+
+
+def _column_exists(table, name):
+    return op.get_bind().execute(sa.text("""
+        SELECT 1 FROM information_schema.columns
+        WHERE table_schema = DATABASE() AND table_name = :t AND column_name = :c
+        LIMIT 1
+    """), {"t": table, "c": name}).first() is not None
+
+
+def _index_exists(table, name):
+    return op.get_bind().execute(sa.text("""
+        SELECT 1 FROM information_schema.statistics
+        WHERE table_schema = DATABASE() AND table_name = :t AND index_name = :i
+        LIMIT 1
+    """), {"t": table, "i": name}).first() is not None
+
+
+def upgrade():
+    for table, key, index in KEYS:
+        if not _column_exists(table, "join_key"):
+            op.execute(
+                f"ALTER TABLE `{table}` ADD COLUMN `join_key` BIGINT UNSIGNED "
+                f"AS (CAST(CONV(LEFT(MD5(UPPER(TRIM(`{key}`))), 16), 16, 10) AS UNSIGNED)) VIRTUAL, "
+                f"ALGORITHM=INSTANT"
+            )
+        if not _index_exists(table, index):
+            op.execute(f"ALTER TABLE `{table}` ADD INDEX `{index}` (`join_key`), ALGORITHM=INPLACE, LOCK=NONE")
+
+
+def downgrade():
+    for table, _, index in reversed(KEYS):
+        if _index_exists(table, index):
+            op.execute(f"ALTER TABLE `{table}` DROP INDEX `{index}`, ALGORITHM=INPLACE, LOCK=NONE")
+        if _column_exists(table, "join_key"):
+            op.execute(f"ALTER TABLE `{table}` DROP COLUMN `join_key`, ALGORITHM=INSTANT")
@@ -0,0 +1,102 @@
+"""Tokens de API (app.api_tokens): emisión, expiración, revocación y límite por token (sin MySQL)."""
+from types import SimpleNamespace
+
+import pytest
+
+pytest.importorskip("flask")
+pytest.importorskip("flask_sqlalchemy")
+pytest.importorskip("flask_login")
+
+from flask import Flask  # noqa: E402
+from werkzeug.exceptions import HTTPException  # noqa: E402
+
+from app import api_tokens  # noqa: E402
+from app.api_tokens import issue_token, load_user_from_bearer, verify_token  # noqa: E402
+from app.permissions import PermissionSnapshot  # noqa: E402
+
+
+def _snapshot(n_recintos: int) -> PermissionSnapshot:
+    per = {rid: frozenset({f"C{rid}A", f"C{rid}B"}) for rid in range(1, n_recintos + 1)}
+    return PermissionSnapshot(7, frozenset(per), per, frozenset({"C1A"}))
+
+
+@pytest.fixture
+def env(monkeypatch):
+    state = SimpleNamespace(snap=_snapshot(3), now=1_000_000.0, clock=0.0)
+    principal = SimpleNamespace(id=7, email="bi@x.cl", role_code="BI", is_active=True)
+    monkeypatch.setattr(api_tokens, "fetch_principal", lambda uid: principal)
+    monkeypatch.setattr(api_tokens, "get_snapshot", lambda uid: state.snap)
+    monkeypatch.setattr(api_tokens, "_is_unrestricted", lambda p: False)
+    monkeypatch.setattr(api_tokens.time, "time", lambda: state.now)
+    monkeypatch.setattr(api_tokens.time, "monotonic", lambda: state.clock)
+    monkeypatch.setattr(api_tokens, "_buckets", {})
+    app = Flask(__name__)
+    app.config.update(SECRET_KEY="test", API_TOKEN_TTL=3600, API_TOKEN_MAX_TTL=7200,
+                      API_TOKEN_RATE_PER_MIN=120, API_TOKEN_NOT_BEFORE=0)
+    state.app = app
+    with app.app_context():
+        yield state
+
+
+def _status(fn, *a):
+    with pytest.raises(HTTPException) as e:
+        fn(*a)
+    return e.value.response.status_code, e.value.response.get_json()["error"]
+
+
+def test_issue_carries_fingerprint_not_the_scope(env):
+    small, payload = issue_token(7)
+    assert payload["uid"] == 7 and payload["exp"] == env.now + 3600
+    assert "s" not in payload and "r" not in payload
+    p = verify_token(small)
+    assert p.id == 7 and p.access_scope.recinto_ids == {1, 2, 3}
+    assert p.access_scope.fingerprint == payload["fp"]
+
+    env.snap = _snapshot(500)
+    big, _ = issue_token(7)
+    assert len(big) < 256 and abs(len(big) - len(small)) < 16   # el tamaño no depende del alcance
+
+
+def test_issue_caps_recintos_and_ttl(env):
+    token, payload = issue_token(7, ttl=10**9, recintos={2, 99})
+    assert payload["exp"] == env.now + 7200 and payload["r"] == [2, 99]
+    scope = verify_token(token).access_scope
+    assert scope.recinto_ids == {2} and set(scope.cuentas_por_recinto) == {2}  # nunca amplía
+
+
+def test_expired_revoked_and_tampered_tokens_are_rejected(env):
+    token, payload = issue_token(7, ttl=60)
+    env.now += 61
+    assert _status(verify_token, token) == (401, "token expirado")
+
+    env.now -= 61
+    env.app.config["API_TOKEN_NOT_BEFORE"] = int(payload["iat"]) + 1
+    assert _status(verify_token, token) == (401, "token revocado")
+    env.app.config["API_TOKEN_NOT_BEFORE"] = int(payload["iat"])
+    assert verify_token(token).id == 7      # emitido en el corte: sigue valiendo
+
+    assert _status(verify_token, token[:-2] + "xx")[0] == 401
+
+
+def test_permission_change_revokes_the_token(env):
+    token, _ = issue_token(7)
+    env.snap = _snapshot(2)                # le quitaron un recinto
+    assert _status(verify_token, token) == (401, "token revocado: cambiaron los permisos del usuario")
+
+
+def test_rate_bucket_per_token(env):
+    token, _ = issue_token(7, rate_per_min=2)
+    other, _ = issue_token(7, rate_per_min=2)
+    headers = {"Authorization": f"Bearer {token}"}
+    with env.app.test_request_context("/api/x", headers=headers) as ctx:
+        assert load_user_from_bearer(ctx.request).id == 7
+        assert load_user_from_bearer(ctx.request).id == 7
+        resp = pytest.raises(HTTPException, load_user_from_bearer, ctx.request).value.response
+        assert resp.status_code == 429 and resp.headers["Retry-After"] == "31"
+
+        env.clock += 30                    # 2/min: a los 30 s vuelve una ficha
+        assert load_user_from_bearer(ctx.request).id == 7
+    with env.app.test_request_context("/api/x", headers={"Authorization": f"Bearer {other}"}) as ctx:
+        assert load_user_from_bearer(ctx.request).id == 7   # otro token, otro balde
+    with env.app.test_request_context("/dashboard", headers=headers) as ctx:
+        assert load_user_from_bearer(ctx.request) is None   # fuera de /api/* no aplica
@@ -0,0 +1,180 @@
+"""app.cache: backends, clave por alcance/día/marca de agua, SWR y NoStore (sin MySQL)."""
+import os
+import pickle
+import time
+from datetime import date
+from types import SimpleNamespace
+
+import pytest
+
+pytest.importorskip("flask")
+pytest.importorskip("flask_sqlalchemy")
+
+from flask import Flask  # noqa: E402
+
+from app import cache  # noqa: E402
+from app.cache import LRUBackend, NoStore, SQLiteBackend, cache_key, remember, shareable  # noqa: E402
+
+
+def _size(value) -> int:
+    return len(pickle.dumps(value, protocol=pickle.HIGHEST_PROTOCOL))
+
+
+# ------------------------------ LRUBackend ------------------------------
+def test_lru_evicts_least_recently_used_by_bytes():
+    entry = ("x" * 1000,)
+    lru = LRUBackend(max_bytes=_size(entry) * 3, max_entries=100)
+    for k in "abc":
+        lru.set(k, entry, 60)
+    assert lru.get("a") == entry          # "a" pasa a ser la más reciente
+    lru.set("d", entry, 60)               # no cabe: sale "b"
+    assert lru.get("b") is None
+    assert all(lru.get(k) == entry for k in "acd")
+    assert lru.info()["bytes"] <= lru.max_bytes
+
+
+def test_lru_entry_cap_oversize_and_expiry():
+    lru = LRUBackend(max_bytes=10_000, max_entries=2)
+    for k in "abc":
+        lru.set(k, (k,), 60)
+    assert lru.get("a") is None and lru.info()["entries"] == 2
+
+    lru.set("big", ("x" * 20_000,), 60)  # más grande que todo el tope: no se guarda
+    assert lru.get("big") is None and lru.get("c") == ("c",)
+
+    lru.set("old", (1,), -1)              # ya vencida
+    assert lru.get("old") is None
+    assert lru.info()["bytes"] == sum(len(v[1]) for v in lru._data.values())
+
+
+def test_lru_returns_copies():
+    lru = LRUBackend()
+    lru.set("k", ([1, 2],), 60)
+    lru.get("k")[0].append(3)
+    assert lru.get("k") == ([1, 2],)
+
+
+# ------------------------------ SQLiteBackend ------------------------------
+def test_sqlite_backend_requires_a_private_directory(tmp_path):
+    good = tmp_path / "cache"
+    b = SQLiteBackend(str(good / "c.sqlite3"))
+    b.set("k", (1, "wm", {"a": 1}), 60)
+    assert b.get("k") == (1, "wm", {"a": 1})
+
+    shared = tmp_path / "shared"
+    shared.mkdir()
+    os.chmod(shared, 0o777)
+    with pytest.raises(PermissionError):
+        SQLiteBackend(str(shared / "c.sqlite3"))
+
+
+# ------------------------------ remember / clave ------------------------------
+@pytest.fixture
+def env(monkeypatch):
+    """App con LRU, alcance y marca de agua controlados por el test."""
+    state = SimpleNamespace(fp="scope-a", wm=("ingesta-1",))
+    monkeypatch.setattr(cache, "current_scope", lambda: SimpleNamespace(fingerprint=state.fp))
+    monkeypatch.setattr(cache, "data_watermark", lambda *t: state.wm)
+    monkeypatch.setattr(cache, "_backend", LRUBackend())
+    monkeypatch.setattr(cache, "_refreshing", set())
+    app = Flask(__name__)
+    app.config.update(CACHE_TTL=300, CACHE_STALE_TTL=600)
+    state.app = app
+    return state
+
+
+def _counter():
+    calls = []
+
+    def compute():
+        calls.append(1)
+        return {"n": len(calls)}
+    return compute, calls
+
+
+def test_key_separates_scope_args_namespace_and_day(env, monkeypatch):
+    with env.app.test_request_context("/r?start=2024-01-01&end=2024-01-31"):
+        k = cache_key("ns")
+        env.fp = "scope-b"
+        assert cache_key("ns") != k
+        env.fp = "scope-a"
+        assert cache_key("ns") == k
+        assert cache_key("otro") != k
+        assert cache_key("ns", extra="x") != k
+
+        class _Tomorrow(date):
+            @classmethod
+            def today(cls):
+                return date(2999, 1, 1)
+        monkeypatch.setattr(cache, "date", _Tomorrow)
+        assert cache_key("ns") != k
+        monkeypatch.setattr(cache, "date", date)
+    with env.app.test_request_context("/r?end=2024-01-31&start=2024-01-01&obra="):
+        assert cache_key("ns") == k       # orden de parámetros y vacíos no importan
+    with env.app.test_request_context("/r?start=2024-01-01&end=2024-01-31&page=3"):
+        assert cache_key("ns", exclude_args=("page",)) == k
+
+
+def test_results_never_cross_scopes(env):
+    compute, calls = _counter()
+    with env.app.test_request_context("/r?start=2024-01-01"):
+        a = remember("ns", compute, tables=("asistencia",))
+        assert remember("ns", compute, tables=("asistencia",)) == a and len(calls) == 1
+        env.fp = "scope-b"
+        b = remember("ns", compute, tables=("asistencia",))
+        assert b != a and len(calls) == 2
+
+
+def test_new_watermark_is_a_miss(env):
+    compute, calls = _counter()
+    with env.app.test_request_context("/r"):
+        remember("ns", compute, tables=("asistencia",))
+        env.wm = ("ingesta-2",)
+        assert remember("ns", compute, tables=("asistencia",)) == {"n": 2}
+
+
+def test_stale_entry_is_served_and_refreshed_in_background(env):
+    compute, calls = _counter()
+    with env.app.test_request_context("/r"):
+        remember("ns", compute, ttl=300)
+        key = cache_key("ns")
+        ts, wm, value = cache._backend.get(key)
+        cache._backend.set(key, (ts - 301, wm, value), 600)   # vencida, dentro de la ventana stale
+
+        assert remember("ns", compute, ttl=300) == {"n": 1}   # se sirve la vieja
+        deadline = time.monotonic() + 2
+        while cache._backend.get(key)[2] != {"n": 2} and time.monotonic() < deadline:
+            time.sleep(0.02)
+        assert len(calls) == 2 and cache._backend.get(key)[2] == {"n": 2}
+        assert remember("ns", compute, ttl=300) == {"n": 2}   # ya fresca, sin recalcular
+        assert len(calls) == 2
+
+
+def test_nostore_is_returned_but_not_kept(env):
+    calls = []
+
+    def compute():
+        calls.append(1)
+        return NoStore("error")
+    with env.app.test_request_context("/r"):
+        assert remember("ns", compute) == "error"
+        assert remember("ns", compute) == "error" and len(calls) == 2
+
+
+def test_shareable_only_for_shared_backends_under_the_cap(env, monkeypatch, tmp_path):
+    rows = [{"rut": str(i)} for i in range(100)]
+    with env.app.test_request_context("/r"):
+        assert isinstance(shareable(rows, 10**9), NoStore)      # LRU: no se duplica por worker
+        monkeypatch.setattr(cache, "_backend", SQLiteBackend(str(tmp_path / "c" / "c.sqlite3")))
+        assert shareable(rows, 10**9) is rows
+        assert isinstance(shareable(rows, 10), NoStore)          # pasa el tope
+
+
+def test_get_backend_falls_back_to_lru_on_a_shared_directory(env, monkeypatch, tmp_path):
+    shared = tmp_path / "shared"
+    shared.mkdir()
+    os.chmod(shared, 0o777)
+    monkeypatch.setattr(cache, "_backend", None)
+    env.app.config.update(CACHE_BACKEND="sqlite", CACHE_SQLITE_PATH=str(shared / "c.sqlite3"))
+    with env.app.app_context():
+        assert isinstance(cache.get_backend(), LRUBackend)
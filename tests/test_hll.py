@@ -0,0 +1,54 @@
+"""Sketches HyperLogLog de app.hll: error de la estimación y unión (sin MySQL)."""
+import math
+
+import pytest
+
+np = pytest.importorskip("numpy")
+pytest.importorskip("flask_sqlalchemy")
+
+from app import hll  # noqa: E402
+from app.hll import M, encode, estimate, merge_counts, registers  # noqa: E402
+
+SIGMA = 1.04 / math.sqrt(M)  # error estándar relativo de HLL
+
+
+def _hashes(n: int, seed: int) -> np.ndarray:
+    rng = np.random.default_rng(seed)
+    h = np.unique(rng.integers(0, 2**64, size=n, dtype=np.uint64, endpoint=False))
+    assert h.size == n  # 64 bits: sin colisiones en la práctica
+    return h
+
+
+def sketch(hashes: np.ndarray) -> np.ndarray:
+    regs = np.zeros(M, dtype=np.uint8)
+    idx, rank = registers(hashes)
+    np.maximum.at(regs, idx, rank)
+    return regs
+
+
+@pytest.mark.parametrize("n", [10, 1_000, 100_000])
+def test_estimate_within_three_sigma(n):
+    est = estimate(sketch(_hashes(n, seed=n)))
+    assert abs(est - n) <= max(3 * SIGMA * n, 1)
+
+
+def test_bit_length_matches_python():
+    xs = np.array([0, 1, 2, 3, 255, 256, 2**32 - 1, 2**32, 2**52 + 1, 2**64 - 1], dtype=np.uint64)
+    assert hll._bit_length(xs).tolist() == [int(x).bit_length() for x in xs.tolist()]
+
+
+def test_union_of_sketches_is_sketch_of_union():
+    h = _hashes(30_000, seed=7)
+    a, b = h[:20_000], h[10_000:]            # 10k en común
+    union = np.union1d(a, b)
+
+    merged = np.maximum(sketch(a), sketch(b))
+    assert np.array_equal(merged, sketch(union))
+
+    # merge_counts: por recinto y total (un trabajador en dos recintos cuenta una vez)
+    rows = [{"id_recinto": 1, "sketch": encode(sketch(a))},
+            {"id_recinto": 2, "sketch": encode(sketch(b))}]
+    out = merge_counts(rows)
+    assert out["total"] == estimate(sketch(union))
+    assert out["por_recinto"] == {1: estimate(sketch(a)), 2: estimate(sketch(b))}
+    assert abs(out["total"] - union.size) <= 3 * SIGMA * union.size
@@ -0,0 +1,66 @@
+"""Cupo de streams SSE de app.live y respuesta sin cupo (sin MySQL)."""
+from types import SimpleNamespace
+
+import pytest
+
+pytest.importorskip("flask")
+pytest.importorskip("flask_sqlalchemy")
+
+from flask import Flask  # noqa: E402
+
+from app import live  # noqa: E402
+
+SSE = {"Accept": "text/event-stream"}
+
+
+@pytest.fixture
+def client(monkeypatch):
+    app = Flask(__name__)
+    app.config.update(LIVE_MAX_STREAMS=1, LIVE_STREAM_SECONDS=0, LIVE_BUSY_RETRY_SECONDS=90)
+    monkeypatch.setattr(live, "data_watermark", lambda *t: ("2024-01-01", "10"))
+    monkeypatch.setattr(live, "db", SimpleNamespace(session=SimpleNamespace(close=lambda: None)))
+    monkeypatch.setattr(live, "_open_streams", 0)
+
+    @app.get("/stream")
+    def stream():
+        return live.stream_response(lambda: {"kpis": {"presentes": 1}})
+
+    with app.app_context():
+        yield app.test_client()
+
+
+def test_stream_takes_and_releases_the_slot(client):
+    resp = client.get("/stream", headers=SSE)
+    assert resp.status_code == 200 and resp.mimetype == "text/event-stream"
+    assert "event: hello" in resp.get_data(as_text=True)
+    resp.close()
+    assert live._open_streams == 0
+
+
+def test_full_worker_tells_eventsource_to_retry_later(client):
+    assert live.acquire_slot()              # un dashboard ya abierto
+    assert not live.acquire_slot()          # LIVE_MAX_STREAMS = 1
+
+    resp = client.get("/stream", headers=SSE)
+    body = resp.get_data(as_text=True)
+    # 200 (EventSource no reintenta tras un no-200) con un solo evento y retry largo
+    assert resp.status_code == 200 and resp.mimetype == "text/event-stream"
+    assert "retry: 90000" in body and "event: busy" in body
+    assert live._open_streams == 1          # no tomó cupo
+
+    other = client.get("/stream", headers={"Accept": "application/json"})
+    assert other.status_code == 503
+
+    live.release_slot()
+    ok = client.get("/stream", headers=SSE)
+    assert "event: hello" in ok.get_data(as_text=True)
+    ok.close()
+
+
+def test_diff_snapshot_only_sends_changes():
+    prev = {"kpis": {"a": 1, "b": 2}, "motivos": [1], "filas": [{"rid": 1, "n": 1}, {"rid": 2, "n": 2}]}
+    cur = {"kpis": {"a": 1, "b": 3}, "motivos": [1], "filas": [{"rid": 1, "n": 5}]}
+    assert live.diff_snapshot(prev, cur) == {
+        "kpis": {"b": 3}, "filas": {"upsert": [{"rid": 1, "n": 5}], "remove": [2]},
+    }
+    assert live.diff_snapshot(cur, cur) == {}
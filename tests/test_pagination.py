@@ -0,0 +1,126 @@
+"""Keyset / cursores de app.pagination contra SQLite en memoria (sin MySQL)."""
+import sqlite3
+from datetime import date, datetime
+from decimal import Decimal
+from types import SimpleNamespace
+
+import pytest
+
+pytest.importorskip("flask")
+pytest.importorskip("flask_sqlalchemy")
+
+from flask import Flask  # noqa: E402
+from werkzeug.exceptions import HTTPException  # noqa: E402
+
+from app import pagination  # noqa: E402
+from app.pagination import Keyset, Window, _dump, _load, decode_cursor  # noqa: E402
+
+# orden mezclado: a DESC, b ASC, c ASC; muchos empates en a y b
+KS = Keyset(("a", True), ("b", False), ("c", False))
+ROWS = [(a, b, c) for a in (3, 1, 2) for b in ("y", "x") for c in (5, 1, 9)]
+
+
+@pytest.fixture
+def ctx(monkeypatch):
+    app = Flask(__name__)
+    app.config["SECRET_KEY"] = "test"
+    monkeypatch.setattr(pagination, "current_scope", lambda: SimpleNamespace(fingerprint="fp"))
+    with app.test_request_context("/reporte?start=2024-01-01&end=2024-01-31"):
+        yield
+
+
+@pytest.fixture
+def conn():
+    c = sqlite3.connect(":memory:")
+    c.row_factory = sqlite3.Row
+    c.execute("CREATE TABLE t (a INTEGER, b TEXT, c INTEGER)")
+    c.executemany("INSERT INTO t VALUES (?, ?, ?)", ROWS)
+    return c
+
+
+def _page(conn, w: Window, inner: bool = False):
+    # inner: como inasistencias, la primera columna de la clave también filtra la consulta interna
+    src = f"(SELECT a, b, c FROM t WHERE 1=1 {w.inner('a') if inner else ''})"
+    sql = (f"SELECT a, b, c, {KS.select()} FROM {src} WHERE 1=1 {w.where} "
+           f"ORDER BY {w.order_by} LIMIT :limit OFFSET :offset")
+    return w.finish(conn.execute(sql, w.params).fetchall())
+
+
+def _cursor_window(token: str, per_page: int) -> Window:
+    values, direction = decode_cursor(token, len(KS.cols))
+    where, params = KS.after(values, reverse=direction == "p")
+    return Window(KS, per_page, None, direction, where, {**params, "limit": per_page + 1, "offset": 0})
+
+
+def _expected(conn):
+    return [tuple(r) for r in conn.execute(f"SELECT a, b, c FROM t ORDER BY {KS.order_by()}")]
+
+
+@pytest.mark.parametrize("inner", [False, True])
+@pytest.mark.parametrize("per_page", [1, 4, 5, 18, 50])
+def test_cursor_walk_forward_and_back(ctx, conn, per_page, inner):
+    expected = _expected(conn)
+
+    items, nav = _page(conn, Window(KS, per_page, 1, params={"limit": per_page + 1, "offset": 0}), inner)
+    assert not nav["has_prev"] and nav["prev_cursor"] is None
+    pages = [items]
+    while nav["next_cursor"]:
+        items, nav = _page(conn, _cursor_window(nav["next_cursor"], per_page), inner)
+        pages.append(items)
+    assert [(r["a"], r["b"], r["c"]) for p in pages for r in p] == expected
+    assert not nav["has_next"]
+
+    # de vuelta desde la última página con prev_cursor: mismas páginas, al revés
+    back = [pages[-1]]
+    while nav["prev_cursor"] and len(back) < len(pages):
+        items, nav = _page(conn, _cursor_window(nav["prev_cursor"], per_page), inner)
+        back.append(items)
+    assert back[::-1] == pages
+    assert not nav["has_prev"]
+
+
+def test_inner_predicate_follows_direction():
+    assert Window(KS, 5, 1).inner("a") == ""                    # modo página: nada
+    assert Window(KS, 5, None, "n").inner("a").strip() == "AND a <= :ks_0"   # a DESC
+    assert Window(KS, 5, None, "p").inner("a").strip() == "AND a >= :ks_0"
+    asc = Keyset(("x", False), ("y", False))
+    assert Window(asc, 5, None, "n").inner("x").strip() == "AND x >= :ks_0"
+
+
+def test_page_mode_flags(ctx, conn):
+    w = Window(KS, 5, 2, params={"limit": 6, "offset": 5})
+    items, nav = _page(conn, w)
+    assert len(items) == 5 and nav["has_prev"] and nav["has_next"]
+    assert all(not k.startswith("_") for k in items[0])
+    assert w.paging(18) == {"per_page": 5, "total": 18, "page": 2, "pages": 4}
+
+
+def test_after_mixed_directions():
+    where, params = KS.after([2, "x", 5])
+    assert where.strip() == "AND ((a < :ks_0) OR (a = :ks_0 AND b > :ks_1) OR (a = :ks_0 AND b = :ks_1 AND c > :ks_2))"
+    assert params == {"ks_0": 2, "ks_1": "x", "ks_2": 5}
+    where, _ = KS.after([2, "x", 5], reverse=True)
+    assert "(a > :ks_0)" in where and "b < :ks_1" in where and "c < :ks_2" in where
+
+
+@pytest.mark.parametrize("value", [
+    datetime(2024, 3, 1, 7, 30, 15), date(2024, 3, 1), Decimal("12.50"), "abc", 0, -1, None,
+])
+def test_dump_load_round_trip(value):
+    out = _load(_dump(value))
+    assert out == value and type(out) is type(value)
+
+
+def test_cursor_rejects_tampering_and_other_filters(ctx):
+    token = pagination.encode_cursor([2, "x", 5], "n")
+    assert decode_cursor(token, 3) == ([2, "x", 5], "n")
+
+    with pytest.raises(HTTPException) as e:
+        decode_cursor(token[:-2] + "xx", 3)
+    assert e.value.response.status_code == 400
+
+    # mismo reporte, otros filtros
+    with pagination.current_app.test_request_context("/reporte?start=2024-02-01&end=2024-02-28"):
+        with pytest.raises(HTTPException) as e:
+            decode_cursor(token, 3)
+        assert e.value.response.status_code == 400
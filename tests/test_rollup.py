@@ -0,0 +1,89 @@
+"""Rollup incremental (app.rollup): tramos de días y marcas de agua por origen (sin MySQL)."""
+import re
+from datetime import date
+from types import SimpleNamespace
+
+import pytest
+
+pytest.importorskip("flask")
+pytest.importorskip("flask_sqlalchemy")
+
+from app import rollup  # noqa: E402
+from app.rollup import _ranges, _touched_days, refresh_days  # noqa: E402
+
+
+class _FakeSession:
+    """Cada origen es una lista de (id, fecha); responde MAX(id) y los días con id en (last, top]."""
+
+    def __init__(self, data):
+        self.data = data
+        self.sql = []
+
+    def execute(self, stmt, params=None):
+        sql = str(stmt)
+        self.sql.append((sql, params))
+        if sql.startswith("DELETE") or "INSERT INTO" in sql:
+            return SimpleNamespace(rowcount=1)
+        table = re.search(r"FROM (\w+)", sql).group(1)
+        rows = self.data.get(table, [])
+        if "MAX(id)" in sql:
+            return SimpleNamespace(scalar=lambda: max((i for i, _ in rows), default=0))
+        days = list({d for i, d in rows if params["last"] < i <= params["top"]})
+        return SimpleNamespace(scalars=lambda: SimpleNamespace(all=lambda: days))
+
+    def reads(self, table):
+        return [p for s, p in self.sql if f"FROM {table}" in s and p]
+
+
+@pytest.fixture
+def session(monkeypatch):
+    s = _FakeSession({
+        "asistencia": [(1, date(2024, 1, 1)), (2, date(2024, 1, 2)), (3, date(2024, 1, 5))],
+        "inasistencias": [(10, date(2024, 1, 3)), (11, "2024-01-04")],
+        "asignacion_turnos": [(100, date(2023, 6, 1)), (101, date(2024, 1, 7))],
+    })
+    monkeypatch.setattr(rollup, "db", SimpleNamespace(session=s))
+    return s
+
+
+def test_ranges_groups_contiguous_days():
+    assert _ranges(set()) == []
+    days = {date(2024, 1, 3), date(2024, 1, 1), date(2024, 1, 2), date(2024, 1, 5),
+            date(2024, 2, 29), date(2024, 3, 1)}
+    assert _ranges(days) == [
+        (date(2024, 1, 1), date(2024, 1, 3)),
+        (date(2024, 1, 5), date(2024, 1, 5)),
+        (date(2024, 2, 29), date(2024, 3, 1)),   # cruza fin de mes
+    ]
+
+
+def test_touched_days_only_reads_ids_above_the_watermark(session):
+    days, marks = _touched_days({"asistencia": 2, "inasistencias": 10, "asignacion_turnos": 101})
+    assert days == {date(2024, 1, 5), date(2024, 1, 4)}   # solo ids > marca; texto -> date
+    assert marks == {"asistencia": 3, "inasistencias": 11, "asignacion_turnos": 101}
+    assert session.reads("asistencia") == [{"last": 2, "top": 3}]
+    assert session.reads("asignacion_turnos") == []       # sin ids nuevos no se lee nada
+
+
+def test_touched_days_first_run_reads_everything(session):
+    days, marks = _touched_days({})
+    assert date(2023, 6, 1) in days and len(days) == 7
+    assert marks == {"asistencia": 3, "inasistencias": 11, "asignacion_turnos": 101}
+
+
+def test_new_source_only_records_its_mark(session):
+    # rollup_state de antes de sumar asignacion_turnos a SOURCES
+    days, marks = _touched_days({"asistencia": 3, "inasistencias": 11})
+    assert days == set()                                  # no re-agrega su historia
+    assert marks["asignacion_turnos"] == 101              # la próxima corrida parte de aquí
+    assert session.reads("asignacion_turnos") == []
+
+
+def test_refresh_days_rewrites_each_range(session, monkeypatch):
+    spans = []
+    monkeypatch.setattr(rollup.hll, "refresh_range", lambda d0, d1: spans.append((d0, d1)) or 2)
+    inserted, sketches = refresh_days({date(2024, 1, 1), date(2024, 1, 2), date(2024, 1, 5)})
+    assert (inserted, sketches) == (2, 4)
+    assert spans == [(date(2024, 1, 1), date(2024, 1, 3)), (date(2024, 1, 5), date(2024, 1, 6))]
+    deletes = [p for s, p in session.sql if s.startswith("DELETE")]
+    assert deletes == [{"d0": d0, "d1": d1} for d0, d1 in spans]   # fin exclusivo
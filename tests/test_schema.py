@@ -0,0 +1,58 @@
+"""Chequeo de revisión de esquema (app.schema) contra SQLite en memoria."""
+import os
+
+import pytest
+
+pytest.importorskip("flask_sqlalchemy")
+pytest.importorskip("flask_migrate")
+
+from flask import Flask  # noqa: E402
+from flask_migrate import Migrate  # noqa: E402
+from sqlalchemy import text  # noqa: E402
+from sqlalchemy.pool import StaticPool  # noqa: E402
+
+from app.extensions import db  # noqa: E402
+from app.schema import SchemaOutdated, expected_head, require_schema  # noqa: E402
+
+MIGRATIONS = os.path.join(os.path.dirname(os.path.dirname(__file__)), "migrations")
+
+
+@pytest.fixture
+def app():
+    app = Flask(__name__)
+    app.config.update(SQLALCHEMY_DATABASE_URI="sqlite://",
+                      SQLALCHEMY_ENGINE_OPTIONS={"poolclass": StaticPool})
+    db.init_app(app)
+    Migrate(app, db, directory=MIGRATIONS)
+    with app.app_context():
+        yield app
+
+
+def _stamp(rev):
+    with db.engine.begin() as conn:
+        conn.execute(text("CREATE TABLE IF NOT EXISTS alembic_version (version_num VARCHAR(32))"))
+        conn.execute(text("DELETE FROM alembic_version"))
+        if rev:
+            conn.execute(text("INSERT INTO alembic_version VALUES (:r)"), {"r": rev})
+
+
+def test_head_is_the_join_key_migration(app):
+    assert expected_head() == "0005_join_keys"
+
+
+def test_head_passes(app):
+    _stamp("0005_join_keys")
+    require_schema()
+
+
+@pytest.mark.parametrize("rev", ["0004_attendance_hll", None])
+def test_old_or_missing_revision_fails_clearly(app, rev):
+    _stamp(rev)
+    with pytest.raises(SchemaOutdated, match="db upgrade"):
+        require_schema()
+
+
+def test_check_can_be_disabled(app):
+    _stamp("0004_attendance_hll")
+    app.config["SCHEMA_CHECK"] = False
+    require_schema()
@@ -0,0 +1,68 @@
+"""Predicado de alcance del dashboard: tuple-IN vs. join materializado según SCOPE_INLINE_MAX (sin MySQL)."""
+import pytest
+
+pytest.importorskip("flask")
+pytest.importorskip("flask_sqlalchemy")
+pytest.importorskip("flask_login")
+pytest.importorskip("numpy")
+pytest.importorskip("pandas")
+
+from flask import Flask  # noqa: E402
+
+from app.blueprints.dashboard.routes import _scope_predicate  # noqa: E402
+
+COLS = ("a.id_recinto", "a.cuenta_area")
+
+
+class _FakeConn:
+    def __init__(self):
+        self.calls = []
+
+    def execute(self, stmt, params=None):
+        self.calls.append((" ".join(str(stmt).split()), params))
+
+
+@pytest.fixture(autouse=True)
+def app():
+    app = Flask(__name__)
+    app.config["SCOPE_INLINE_MAX"] = 4
+    with app.app_context():
+        yield app
+
+
+def _per(n):
+    """n pares repartidos en dos recintos."""
+    return {10: {f"C{i}" for i in range(0, n, 2)}, 20: {f"C{i}" for i in range(1, n, 2)}}
+
+
+def test_unrestricted_and_empty_scope():
+    assert _scope_predicate(*COLS, None) == ("", {})
+    assert _scope_predicate(*COLS, {}) == (" AND 1=0 ", {})
+    assert _scope_predicate(*COLS, {10: set(), 20: ()}, uid=7) == (" AND 1=0 ", {})  # recintos sin cuentas
+
+
+def test_up_to_the_threshold_uses_tuple_in_with_one_bind():
+    sql, params = _scope_predicate(*COLS, _per(4), uid=7)
+    assert sql == " AND (a.id_recinto, a.cuenta_area) IN :scope_pairs "
+    assert params == {"scope_pairs": [(10, "C0"), (10, "C2"), (20, "C1"), (20, "C3")]}
+    # otro alcance, mismo SQL: el plan se reutiliza entre usuarios
+    assert _scope_predicate(*COLS, {30: {"X"}})[0] == sql
+
+
+def test_above_the_threshold_joins_the_materialized_scope():
+    sql, params = _scope_predicate(*COLS, _per(5), uid=7)
+    assert "FROM user_effective_scope ues" in sql and "ues.obra_id = a.id_recinto" in sql
+    assert "ues.cuenta_code = a.cuenta_area" in sql and " IN " not in sql
+    assert params == {"scope_uid": 7}
+
+
+def test_above_the_threshold_without_uid_loads_a_temporary_table():
+    conn = _FakeConn()
+    sql, params = _scope_predicate("i.obra_id", "at.cuenta_area", _per(5), conn=conn)
+    assert "FROM tmp_scope_pairs tsp" in sql and "tsp.cuenta_code = at.cuenta_area" in sql
+    assert params == {}
+    create, delete, insert = conn.calls
+    assert create[0].startswith("CREATE TEMPORARY TABLE IF NOT EXISTS tmp_scope_pairs")
+    assert delete[0] == "DELETE FROM tmp_scope_pairs"           # sin restos de otro request
+    assert sorted((p["rid"], p["cta"]) for p in insert[1]) == [
+        (10, "C0"), (10, "C2"), (10, "C4"), (20, "C1"), (20, "C3")]
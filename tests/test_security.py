@@ -0,0 +1,59 @@
+"""Verificación de contraseñas y topes del pool de app.security (sin procesos)."""
+import threading
+import time
+
+import pytest
+
+pytest.importorskip("flask")
+
+from werkzeug.security import generate_password_hash  # noqa: E402
+
+from app import security  # noqa: E402
+from app.security import PasswordPoolBusy, _acquire_keys, _release_keys, check_password  # noqa: E402
+
+CFG = {"PASSWORD_MAX_PER_IP": 2, "PASSWORD_MAX_PER_ACCOUNT": 1}
+
+
+@pytest.mark.parametrize("method", ["pbkdf2:sha256", "pbkdf2:sha512", "scrypt"])
+def test_check_password_accepts_every_werkzeug_format(method):
+    stored = generate_password_hash("secreto", method=method)
+    assert check_password(stored, "secreto")
+    assert not check_password(stored, "otro")
+
+
+def test_check_password_without_hash():
+    assert not check_password(None, "x") and not check_password("", "x")
+
+
+@pytest.fixture(autouse=True)
+def _clean_inflight():
+    security._inflight.clear()
+    yield
+    security._inflight.clear()
+
+
+@pytest.mark.parametrize("keys", [["acct:a@b.cl"], ["ip:10.0.0.1", "ip:10.0.0.1"]])
+def test_full_key_waits_for_a_release(keys):
+    for k in keys:
+        _acquire_keys([k], CFG, time.monotonic() + 1)
+    got = threading.Event()
+
+    def second():
+        _acquire_keys(keys[:1], CFG, time.monotonic() + 5)
+        got.set()
+
+    t = threading.Thread(target=second)
+    t.start()
+    assert not got.wait(0.2)          # espera turno, no falla de inmediato
+    _release_keys(keys[:1])
+    assert got.wait(2)
+    t.join()
+
+
+def test_full_key_times_out_with_busy():
+    _acquire_keys(["acct:a@b.cl"], CFG, time.monotonic() + 1)
+    t0 = time.monotonic()
+    with pytest.raises(PasswordPoolBusy):
+        _acquire_keys(["ip:10.0.0.9", "acct:a@b.cl"], CFG, time.monotonic() + 0.2)
+    assert time.monotonic() - t0 >= 0.15
+    assert "ip:10.0.0.9" not in security._inflight   # no quedó un cupo tomado a medias
@@ -0,0 +1,154 @@
+"""Coalescencia de app.singleflight con threads y un directorio temporal."""
+import os
+import threading
+import time
+
+import pytest
+
+pytest.importorskip("flask")
+
+from flask import Flask  # noqa: E402
+
+from app import singleflight  # noqa: E402
+from app.singleflight import SingleflightTimeout, coalesce, private_dir, query_key  # noqa: E402
+
+
+@pytest.fixture(autouse=True)
+def _reset(monkeypatch):
+    monkeypatch.setattr(singleflight, "_stats", singleflight.Counter())
+    monkeypatch.setattr(singleflight, "_checked", {})
+    singleflight._calls.clear()
+    yield
+    singleflight._calls.clear()
+
+
+def _followers(n, key, fn, started: threading.Event, **kw):
+    """Lanza n threads que llaman coalesce(key, fn) cuando el líder ya arrancó."""
+    out, errors = [], []
+
+    def run():
+        started.wait(2)
+        try:
+            out.append(coalesce(key, fn, **kw))
+        except Exception as e:  # noqa: BLE001
+            errors.append(e)
+
+    threads = [threading.Thread(target=run) for _ in range(n)]
+    for t in threads:
+        t.start()
+    return threads, out, errors
+
+
+def _leader_fn(started, release, result=None, error=None, calls=None):
+    def fn():
+        if calls is not None:
+            calls.append(1)
+        started.set()
+        release.wait(2)
+        if error:
+            raise error
+        return result
+    return fn
+
+
+def test_concurrent_calls_run_once_and_share_the_result():
+    started, release, calls = threading.Event(), threading.Event(), []
+    fn = _leader_fn(started, release, result={"n": 1}, calls=calls)
+    leader = threading.Thread(target=lambda: coalesce("k", fn))
+    leader.start()
+    threads, out, errors = _followers(5, "k", fn, started)
+    time.sleep(0.1)
+    release.set()
+    for t in [leader, *threads]:
+        t.join(2)
+    assert calls == [1] and out == [{"n": 1}] * 5 and not errors
+    assert singleflight._stats["executed"] == 1 and singleflight._stats["coalesced"] == 5
+    assert "k" not in singleflight._calls
+
+
+def test_leader_error_reaches_every_follower():
+    started, release = threading.Event(), threading.Event()
+    fn = _leader_fn(started, release, error=ValueError("boom"))
+    leader_errors = []
+
+    def lead():
+        try:
+            coalesce("k", fn)
+        except ValueError as e:
+            leader_errors.append(e)
+
+    leader = threading.Thread(target=lead)
+    leader.start()
+    threads, out, errors = _followers(3, "k", fn, started)
+    time.sleep(0.1)
+    release.set()
+    for t in [leader, *threads]:
+        t.join(2)
+    assert len(leader_errors) == 1 and not out
+    assert len(errors) == 3 and all(e is leader_errors[0] for e in errors)
+    assert singleflight._stats["errors"] == 1
+    # la clave queda libre: la próxima llamada ejecuta de nuevo
+    assert coalesce("k", lambda: 2) == 2
+
+
+def test_follower_times_out():
+    started, release = threading.Event(), threading.Event()
+    leader = threading.Thread(target=lambda: coalesce("k", _leader_fn(started, release)))
+    leader.start()
+    started.wait(2)
+    with pytest.raises(SingleflightTimeout):
+        coalesce("k", lambda: "nunca", wait=0.1)
+    release.set()
+    leader.join(2)
+
+
+def test_query_key_depends_on_sql_params_and_scope():
+    k = query_key("SELECT 1", {"a": 1, "b": 2}, "fp")
+    assert k == query_key("SELECT 1", {"b": 2, "a": 1}, "fp")
+    assert k != query_key("SELECT 1", {"a": 1, "b": 3}, "fp")
+    assert k != query_key("SELECT 1", {"a": 1, "b": 2}, "otro")
+
+
+def test_private_dir_accepts_only_own_0700_directories(tmp_path):
+    d = tmp_path / "sf"
+    assert private_dir(str(d))                          # se crea 0700
+    assert (os.stat(d).st_mode & 0o777) == 0o700
+    os.chmod(d, 0o770)
+    assert not private_dir(str(d))                      # grupo puede escribir
+    os.chmod(d, 0o700)
+    link = tmp_path / "link"
+    link.symlink_to(d)
+    assert not private_dir(str(link))                   # symlink
+    f = tmp_path / "archivo"
+    f.write_text("x")
+    assert not private_dir(str(f))                      # no es directorio
+
+
+def test_settings_drop_a_shared_dir_that_is_not_private(tmp_path):
+    if singleflight.fcntl is None:
+        pytest.skip("sin fcntl no hay coalescencia entre workers")
+    shared = tmp_path / "sf"
+    shared.mkdir(mode=0o777)
+    os.chmod(shared, 0o777)
+    app = Flask(__name__)
+    app.config["SINGLEFLIGHT_DIR"] = str(shared)
+    with app.app_context():
+        assert singleflight.settings()["shared_dir"] is None
+        os.chmod(shared, 0o700)
+        singleflight._checked.clear()
+        assert singleflight.settings()["shared_dir"] == str(shared)
+
+
+def test_waiting_worker_reuses_the_shared_result(tmp_path):
+    if singleflight.fcntl is None:
+        pytest.skip("sin fcntl no hay coalescencia entre workers")
+    shared = str(tmp_path / "sf")
+    assert private_dir(shared)
+    key = query_key("SELECT 1", {}, "fp")
+    # otro worker tiene el lock y ya dejó el resultado
+    singleflight._write_shared(os.path.join(shared, key + ".res"), [1, 2, 3])
+    with open(os.path.join(shared, key + ".lock"), "a+b") as fh:
+        singleflight.fcntl.flock(fh.fileno(), singleflight.fcntl.LOCK_EX)
+        threading.Timer(0.2, singleflight.fcntl.flock, (fh.fileno(), singleflight.fcntl.LOCK_UN)).start()
+        out = coalesce(key, lambda: "recalculado", shared_dir=shared, wait=2)
+    assert out == [1, 2, 3] and singleflight._stats["coalesced_remote"] == 1
@@ -0,0 +1,110 @@
+"""Marca de agua y ETag de app.watermark (sin MySQL: la consulta se simula)."""
+from datetime import date
+from types import SimpleNamespace
+
+import pytest
+
+pytest.importorskip("flask")
+pytest.importorskip("flask_sqlalchemy")
+pytest.importorskip("flask_login")
+
+from flask import Flask  # noqa: E402
+
+from app import watermark  # noqa: E402
+from app.watermark import compute_etag, conditional, data_watermark, forget_watermarks  # noqa: E402
+
+
+class _FakeSession:
+    def __init__(self):
+        self.sql = []
+        self.row = ("2024-01-01 06:00:00", "10", "20")
+
+    def execute(self, stmt):
+        self.sql.append(str(stmt))
+        return SimpleNamespace(one=lambda: self.row)
+
+
+@pytest.fixture
+def app(monkeypatch):
+    app = Flask(__name__)
+    app.config.update(SECRET_KEY="test", WATERMARK_TTL=60)
+    session = _FakeSession()
+    monkeypatch.setattr(watermark, "db", SimpleNamespace(session=session))
+    monkeypatch.setattr(watermark, "current_scope", lambda: SimpleNamespace(fingerprint="scope-a"))
+    monkeypatch.setattr(watermark, "current_user", SimpleNamespace(id=1))
+    app.session = session
+    forget_watermarks()
+    yield app
+    forget_watermarks()
+
+
+def _etag(app, path="/r?start=2024-01-01&end=2024-01-31", *tables):
+    with app.test_request_context(path):
+        return compute_etag(*(tables or ("asistencia",)))
+
+
+def test_watermark_query_is_cheap_and_cached(app):
+    with app.app_context():
+        wm = data_watermark("horas_extras_diario", "asistencia", "asistencia")
+        assert wm == ("2024-01-01 06:00:00", "10", "20")
+        sql = app.session.sql[0]
+        assert "MAX(id) FROM asistencia" in sql
+        assert "MAX(fecha) FROM horas_extras_diario" in sql
+        assert "COUNT(" not in sql  # nada de recorridos completos en el camino caliente
+
+        # misma combinación (en otro orden): sale del caché del worker
+        data_watermark("asistencia", "horas_extras_diario")
+        assert len(app.session.sql) == 1
+        forget_watermarks()
+        data_watermark("asistencia", "horas_extras_diario")
+        assert len(app.session.sql) == 2
+
+
+def test_etag_ignores_param_order_and_empty_values(app):
+    a = _etag(app, "/r?start=2024-01-01&end=2024-01-31")
+    assert _etag(app, "/r?end=2024-01-31&start=2024-01-01&obra=") == a
+    assert _etag(app, "/r?start=2024-01-01&end=2024-02-01") != a
+
+
+def test_etag_changes_with_scope_user_watermark_and_day(app, monkeypatch):
+    base = _etag(app)
+
+    monkeypatch.setattr(watermark, "current_scope", lambda: SimpleNamespace(fingerprint="scope-b"))
+    assert _etag(app) != base
+    monkeypatch.setattr(watermark, "current_scope", lambda: SimpleNamespace(fingerprint="scope-a"))
+    assert _etag(app) == base
+
+    monkeypatch.setattr(watermark, "current_user", SimpleNamespace(id=2))
+    assert _etag(app) != base
+    monkeypatch.setattr(watermark, "current_user", SimpleNamespace(id=1))
+
+    forget_watermarks()
+    app.session.row = ("2024-01-02 06:00:00", "10", "20")  # nueva ingesta
+    assert _etag(app) != base
+
+    class _Tomorrow(date):
+        @classmethod
+        def today(cls):
+            return date(2999, 1, 1)
+
+    monkeypatch.setattr(watermark, "date", _Tomorrow)
+    app.session.row = ("2024-01-01 06:00:00", "10", "20")
+    forget_watermarks()
+    assert _etag(app) != base
+
+
+def test_conditional_returns_304_without_running_the_view(app):
+    calls = []
+
+    @app.get("/r")
+    @conditional("asistencia")
+    def view():
+        calls.append(1)
+        return {"ok": True}
+
+    client = app.test_client()
+    first = client.get("/r?start=2024-01-01")
+    assert first.status_code == 200 and first.headers["ETag"]
+    again = client.get("/r?start=2024-01-01", headers={"If-None-Match": first.headers["ETag"]})
+    assert again.status_code == 304 and calls == [1]
+    assert "private" in again.headers["Cache-Control"]
@@ -1,4 +1,9 @@
 # Entry point WSGI para Gunicorn / uWSGI
 from app import create_app
+from app.schema import require_schema
 
 app = create_app()
+
+# esquema al día (join_key de 0005): falla al arrancar, no en cada reporte
+with app.app_context():
+    require_schema()